@@ -0,0 +1,77 @@
+import bisect
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_ACHIEVEMENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "achievements.json")
+
+
+class AchievementEngine:
+    # Definitions are data. Each achievement owns a stable bit in the user's
+    # unlocked bitset, and each type keeps its thresholds sorted, with the
+    # mask of every bit up to each threshold, so the achievements a counter
+    # value has reached are found with a bisect.
+
+    def __init__(self, definitions: Iterable[Dict], counters: Dict[str, str]):
+        self.counters = dict(counters)
+        self.definitions: List[Dict] = list(definitions)
+        self.version = hashlib.blake2b(
+            json.dumps([self.definitions, self.counters], sort_keys=True).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        self.by_id: Dict[str, Dict] = {}
+        self.by_bit: Dict[int, Dict] = {}
+        self.thresholds: Dict[str, List[int]] = {}
+        self.bits: Dict[str, List[int]] = {}
+        self.reached: Dict[str, List[int]] = {}
+
+        for definition in sorted(self.definitions, key=lambda d: (d["threshold"], d["bit"])):
+            if definition["type"] not in self.counters:
+                raise ValueError(f"Achievement {definition['id']} has unknown type {definition['type']}")
+            if definition["bit"] in self.by_bit:
+                raise ValueError(f"Achievement bit {definition['bit']} is used twice")
+            self.by_id[definition["id"]] = definition
+            self.by_bit[definition["bit"]] = definition
+            self.thresholds.setdefault(definition["type"], []).append(definition["threshold"])
+            self.bits.setdefault(definition["type"], []).append(definition["bit"])
+            masks = self.reached.setdefault(definition["type"], [])
+            masks.append((masks[-1] if masks else 0) | 1 << definition["bit"])
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_ACHIEVEMENTS_PATH) -> "AchievementEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["achievements"], data["types"])
+
+    @property
+    def types(self) -> List[str]:
+        return list(self.counters)
+
+    def evaluate(self, unlocked: int, achievement_type: str, value: int) -> Tuple[int, List[str]]:
+        # Everything reached that is not unlocked yet, in threshold order.
+        # Definitions can be added below thresholds a user already passed,
+        # so the unlocked bits of a type need not form a prefix.
+        thresholds = self.thresholds.get(achievement_type)
+        if not thresholds or value < thresholds[0]:
+            return unlocked, []
+
+        reached = bisect.bisect_right(thresholds, value)
+        new = self.reached[achievement_type][reached - 1] & ~unlocked
+        if not new:
+            return unlocked, []
+
+        bits = self.bits[achievement_type]
+        newly_unlocked = [self.by_bit[bit]["id"] for bit in bits[:reached] if new >> bit & 1]
+        return unlocked | new, newly_unlocked
+
+    def is_unlocked(self, unlocked: int, achievement_id: str) -> bool:
+        definition = self.by_id.get(achievement_id)
+        return definition is not None and bool(unlocked >> definition["bit"] & 1)
+
+    def mask_for(self, achievement_ids: Iterable[str]) -> int:
+        mask = 0
+        for achievement_id in achievement_ids:
+            definition: Optional[Dict] = self.by_id.get(achievement_id)
+            if definition is not None:
+                mask |= 1 << definition["bit"]
+        return mask
@@ -0,0 +1,132 @@
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+
+def _month_masks(year: int) -> List[int]:
+    masks = []
+    start = 0
+    for month in range(1, 13):
+        length = calendar.monthrange(year, month)[1]
+        masks.append(((1 << length) - 1) << start)
+        start += length
+    return masks
+
+
+MONTH_MASKS = {False: _month_masks(2001), True: _month_masks(2000)}
+
+
+def _bit(day: date) -> int:
+    return day.timetuple().tm_yday - 1
+
+
+def _days_in_year(year: int) -> int:
+    return 366 if calendar.isleap(year) else 365
+
+
+def _popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def _longest_run(bits: int) -> int:
+    run = 0
+    while bits:
+        bits &= bits >> 1
+        run += 1
+    return run
+
+
+def _leading_run(bits: int) -> int:
+    # Consecutive set bits starting at bit 0 (January 1st).
+    return ((bits + 1) & ~bits).bit_length() - 1
+
+
+def _trailing_run(bits: int, length: int) -> int:
+    # Consecutive set bits ending at the last day of the year.
+    gaps = ~bits & ((1 << length) - 1)
+    if not gaps:
+        return length
+    return length - gaps.bit_length()
+
+
+class ActivityBitmap:
+    # One 366-bit integer per year, bit n set when the user was active on
+    # day-of-year n + 1. Streaks and monthly counts are bit operations.
+
+    __slots__ = ("years",)
+
+    def __init__(self, years: Dict[int, int] = None):
+        self.years: Dict[int, int] = dict(years or {})
+
+    def __bool__(self) -> bool:
+        return any(self.years.values())
+
+    def has(self, day: date) -> bool:
+        return bool(self.years.get(day.year, 0) >> _bit(day) & 1)
+
+    def set(self, day: date) -> bool:
+        bits = self.years.get(day.year, 0)
+        updated = bits | 1 << _bit(day)
+        self.years[day.year] = updated
+        return updated != bits
+
+    def clear(self, day: date) -> bool:
+        bits = self.years.get(day.year, 0)
+        updated = bits & ~(1 << _bit(day))
+        if updated:
+            self.years[day.year] = updated
+        else:
+            self.years.pop(day.year, None)
+        return updated != bits
+
+    def streak_ending(self, day: date) -> int:
+        streak = 0
+        while True:
+            position = _bit(day)
+            window = (1 << (position + 1)) - 1
+            gaps = ~self.years.get(day.year, 0) & window
+            if gaps:
+                return streak + position - (gaps.bit_length() - 1)
+            streak += position + 1
+            day = date(day.year - 1, 12, 31)
+            if day.year not in self.years:
+                return streak
+
+    def longest_streak(self, year: int = None) -> int:
+        if year is not None:
+            return _longest_run(self.years.get(year, 0))
+
+        longest = 0
+        carried = 0
+        previous_year = None
+        for current_year in sorted(self.years):
+            bits = self.years[current_year]
+            length = _days_in_year(current_year)
+            if previous_year != current_year - 1:
+                carried = 0
+            leading = _leading_run(bits)
+            longest = max(longest, _longest_run(bits), carried + leading)
+            # Carry the run that reaches December 31st into the next year.
+            carried = carried + length if leading == length else _trailing_run(bits, length)
+            previous_year = current_year
+        return longest
+
+    def month_counts(self, year: int) -> List[int]:
+        bits = self.years.get(year, 0)
+        return [_popcount(bits & mask) for mask in MONTH_MASKS[calendar.isleap(year)]]
+
+    def total(self, year: int) -> int:
+        return _popcount(self.years.get(year, 0))
+
+    def days(self, year: int) -> List[date]:
+        bits = self.years.get(year, 0)
+        start = date(year, 1, 1)
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(start + timedelta(days=low.bit_length() - 1))
+            bits ^= low
+        return result
+
+    def items(self) -> List[Tuple[int, int]]:
+        return sorted(self.years.items())
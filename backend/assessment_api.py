@@ -1,14 +1,75 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Set
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Dict, Optional
 import json
 from datetime import datetime, timedelta, date
 from enum import Enum
 import random
+import gc
+import hashlib
+import hmac
+import asyncio
+from http_cache import PayloadCache, encode_json, payload_response
+from lru_cache import LRUCache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, LoopLagMonitor, MetricsMiddleware, MetricsRegistry, endpoint_routes
+from profiler import PROFILE_HEADER, ProfilerMiddleware, ProfileStore
+from rate_limit import Rate, RateLimitMiddleware, RouteLimit, TokenBuckets
+from rollover import RolloverScheduler, local_epoch_day, local_now
+from sharding import NOTE_ID_STRIDE, PoolPublisher, ShardConfig
+from storage import create_storage_from_env
+from achievements import AchievementEngine
+from event_hub import EventHub
+from activity import ActivityBitmap
+from completion_history import CompletionHistory, linear_trend, week_of, week_start
+from note_registry import SYSTEM_USER, LikeSet, NoteRegistry
+from recommendations import CategoryScorer
+from user_locks import UserLocks, serialized
+from task_catalog import DEFAULT_CATALOG_PATH, TaskCatalog
+from struggle_classifier import StruggleClassifier, text_key
+from task_index import TaskRecord, TaskTemplate, TaskTemplates, UserTaskIndex, date_from_epoch_day, datetime_from_us, epoch_day, timestamp_us
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import os
+import numpy as np
 
 app = FastAPI(title="Mental Health App Backend")
 
+RATE_LIMITS = [
+    RouteLimit("POST", "/api/assessment/{user_id}/struggle", per_user=Rate.per_minute(10, burst=5), per_ip=Rate.per_minute(60)),
+    RouteLimit("POST", "/api/ai/tasks/generate", per_user=Rate.per_minute(5), per_ip=Rate.per_minute(30)),
+    RouteLimit("POST", "/api/notes/{note_id}/like", per_user=Rate.per_minute(30), per_ip=Rate.per_minute(120)),
+    RouteLimit("POST", "/api/notes/daily", per_ip=Rate.per_minute(30)),
+]
+
+route_for = endpoint_routes(app)
+
+# Opt-in request profiling: requests carrying MINDFLOW_PROFILE_TOKEN in the
+# X-MindFlow-Profile header, plus a MINDFLOW_PROFILE_SAMPLE_RATE fraction of
+# all requests. With neither set the middleware is not installed at all.
+PROFILE_TOKEN = os.environ.get("MINDFLOW_PROFILE_TOKEN") or None
+PROFILE_SAMPLE_RATE = float(os.environ.get("MINDFLOW_PROFILE_SAMPLE_RATE", "0"))
+profile_store: Optional[ProfileStore] = None
+if PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    profile_store = ProfileStore(
+        os.environ.get("MINDFLOW_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", "profiles")),
+        os.environ.get("MINDFLOW_PROFILE_FORMAT", "speedscope"),
+    )
+    app.add_middleware(
+        ProfilerMiddleware, store=profile_store, route_for=route_for, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE
+    )
+
+rate_limit_buckets = TokenBuckets()
+
+# Added before CORS so that 429 responses still carry the CORS headers.
+app.add_middleware(
+    RateLimitMiddleware,
+    limits=RATE_LIMITS,
+    buckets=rate_limit_buckets,
+    trust_forwarded_for=os.environ.get("MINDFLOW_TRUST_FORWARDED_FOR") == "1",
+    enabled=os.environ.get("MINDFLOW_RATE_LIMITS", "1") != "0",
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -17,18 +78,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-ACHIEVEMENTS = {
-    "streak_5": {"id": "streak_5", "text": "5-day streak", "type": "streak", "threshold": 5, "icon": "🔥"},
-    "streak_7": {"id": "streak_7", "text": "7-day streak", "type": "streak", "threshold": 7, "icon": "🔥"},
-    "streak_14": {"id": "streak_14", "text": "14-day streak", "type": "streak", "threshold": 14, "icon": "🔥"},
-    "streak_30": {"id": "streak_30", "text": "30-day streak", "type": "streak", "threshold": 30, "icon": "🔥"},
-    "tasks_10": {"id": "tasks_10", "text": "Completed 10 tasks", "type": "tasks", "threshold": 10, "icon": "✅"},
-    "tasks_25": {"id": "tasks_25", "text": "Completed 25 tasks", "type": "tasks", "threshold": 25, "icon": "✅"},
-    "tasks_50": {"id": "tasks_50", "text": "Completed 50 tasks", "type": "tasks", "threshold": 50, "icon": "✅"},
-    "tasks_100": {"id": "tasks_100", "text": "Completed 100 tasks", "type": "tasks", "threshold": 100, "icon": "✅"},
-    "notes_3": {"id": "notes_3", "text": "Shared 3 notes", "type": "notes", "threshold": 3, "icon": "📝"},
-    "notes_10": {"id": "notes_10", "text": "Shared 10 notes", "type": "notes", "threshold": 10, "icon": "📝"},
-}
+# Outermost, so rejected and failed requests are timed too.
+metrics_registry = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics_registry, route_for=route_for)
+loop_lag_monitor = LoopLagMonitor(metrics_registry)
+
+achievement_engine = AchievementEngine.from_file()
+
+payload_cache = PayloadCache()
+
+# Every endpoint that changes a user's tasks, progress or notes runs under
+# that user's lock. Reads take no lock: handlers never await in the middle
+# of a mutation, so a read always sees a state between two mutations.
+user_locks = UserLocks()
+
+# Progress changes are pushed to the user's open event streams, so clients
+# don't have to poll for changes made on another device.
+event_hub = EventHub()
+EVENT_KEEPALIVE_SECONDS = 25.0
 
 class AssessmentQuestion(BaseModel):
     id: int
@@ -106,18 +173,102 @@ class UserProgress(BaseModel):
     notes_shared: int = 0  
     achievements: Dict[str, UserAchievement] = {}  
 
+class ProgressRecord:
+    # UserProgress as it is kept in memory: the same fields in slots, without
+    # a model instance and its bookkeeping per user. Achievements are kept as
+    # the bitmask of unlocked ones and their dates, next to the user's
+    # timezone and current day; none of those are sent as they are. Built
+    # into a UserProgress only when a response returns it.
+    
+    DEFAULTS = {
+        **{name: field.default for name, field in UserProgress.model_fields.items()
+           if name not in ("user_id", "achievements")},
+        "achievements_unlocked": 0,
+        "achievement_dates": {},
+        "timezone": None,
+        "current_day": None,
+    }
+    # Dict defaults are copied per record, everything else is shared as is.
+    MUTABLE = tuple(name for name, default in DEFAULTS.items() if isinstance(default, dict))
+    SHARED = tuple((name, default) for name, default in DEFAULTS.items() if not isinstance(default, dict))
+    
+    # A record restored from storage keeps the stored dict until a field is
+    # first read, so a start doesn't build every user's record up front. The
+    # timezone is read at once: users are grouped by it as they are loaded.
+    __slots__ = ("user_id", *DEFAULTS, "stored")
+    
+    def __init__(self, user_id: str, **fields):
+        unknown = fields.keys() - self.DEFAULTS.keys()
+        if unknown:
+            raise TypeError(f"Unknown progress fields: {', '.join(sorted(unknown))}")
+        self.stored = None
+        self._fill(user_id, fields)
+    
+    @classmethod
+    def from_json(cls, data: Dict) -> "ProgressRecord":
+        # Straight from the stored dict; fields this version doesn't know
+        # are ignored.
+        record = cls.__new__(cls)
+        record.user_id = data["user_id"]
+        record.timezone = data.get("timezone")
+        record.stored = data
+        return record
+    
+    def __getattr__(self, name: str):
+        # Only reached for a field that is not set yet, i.e. on the first
+        # read of a record from_json() has not filled in.
+        stored = self.stored
+        if stored is None or name not in self.DEFAULTS:
+            raise AttributeError(f"'ProgressRecord' object has no attribute '{name}'")
+        self.stored = None
+        for field in self.DEFAULTS:
+            try:
+                # Fields assigned before the first read keep their value.
+                object.__getattribute__(self, field)
+            except AttributeError:
+                value = stored.get(field, self.DEFAULTS[field])
+                setattr(self, field, dict(value) if field in self.MUTABLE else value)
+        return getattr(self, name)
+    
+    def _fill(self, user_id: str, fields: Dict) -> None:
+        self.user_id = user_id
+        for name, default in self.SHARED:
+            setattr(self, name, fields.get(name, default))
+        for name in self.MUTABLE:
+            value = fields.get(name)
+            setattr(self, name, dict(value) if value else {})
+    
+    def to_json(self) -> Dict:
+        # What model_dump(exclude_defaults=True) wrote before, so either can
+        # read the other's records.
+        data = {"user_id": self.user_id}
+        for name, default in self.DEFAULTS.items():
+            value = getattr(self, name)
+            if value != default:
+                data[name] = dict(value) if isinstance(value, dict) else value
+        return data
+    
+    def model(self) -> UserProgress:
+        fields = {name: getattr(self, name) for name in UserProgress.model_fields if name != "achievements"}
+        achievements = {achievement["id"]: achievement for achievement in achievement_entries(self)}
+        return UserProgress(**fields, achievements=achievements)
+
 class MotivationalQuote(BaseModel):
     quote: str
     author: str
     category: str
 
 class DailyNote(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
     note_id: int
     user_id: str
     message: str
     created_at: str
     likes: int = 0
-    liked_by: Set[str] = set()  
+    # Interned ids of the users who liked the note. Never serialized: each
+    # like is its own record in the note_likes collection.
+    liked_by: LikeSet = Field(default_factory=LikeSet, exclude=True)
     is_public: bool = True
     category: Optional[str] = None  
     mood: Optional[str] = None  
@@ -137,12 +288,16 @@ class SelectedTasks(BaseModel):
     task_details: List[TaskDetail]
 
 user_assessments: Dict[str, UserAssessment] = {}
-user_tasks: Dict[str, List[UserTask]] = {}  
-user_progress: Dict[str, UserProgress] = {} 
-completed_tasks: Dict[str, List[UserTask]] = {}  
+user_tasks: Dict[str, UserTaskIndex] = {}  
+user_progress: Dict[str, ProgressRecord] = {} 
+task_templates = TaskTemplates()
 
 daily_notes: Dict[str, List[DailyNote]] = {}  
-user_daily_note_count: Dict[str, Dict[str, int]] = {}  
+note_activity: Dict[str, ActivityBitmap] = {}  
+task_activity: Dict[str, ActivityBitmap] = {}
+template_seen: Dict[str, Dict[int, int]] = {}  
+
+SEEN_TEMPLATE_DAYS = 14  
 
 ASSESSMENT_QUESTIONS = [
     AssessmentQuestion(
@@ -197,16 +352,26 @@ ASSESSMENT_QUESTIONS = [
     ),
 ]
 
-TASK_TEMPLATES = {
-    "habits": [
-        {"title": "Morning Routine Builder", "description": "Start with a 5-minute morning routine and gradually increase duration", "difficulty": "easy", "duration": "5-15 minutes"},
-        {"title": "Habit Stacking", "description": "Attach a new habit to an existing one", "difficulty": "medium", "duration": "10-20 minutes"},
-    ],
-    "emotions": [
-        {"title": "Emotion Journaling", "description": "Write down three emotions you felt today and their triggers", "difficulty": "easy", "duration": "10 minutes"},
-        {"title": "Mindfulness Practice", "description": "Practice 5 minutes of mindful breathing", "difficulty": "medium", "duration": "5 minutes"},
-    ],
-}
+category_scorer = CategoryScorer(ASSESSMENT_QUESTIONS)
+
+TASK_CATALOG_PATH = os.environ.get("MINDFLOW_TASK_CATALOG", DEFAULT_CATALOG_PATH)
+
+def build_struggle_classifier(catalog: TaskCatalog) -> StruggleClassifier:
+    return StruggleClassifier(
+        catalog.templates,
+        {
+            question.category: " ".join([
+                question.category.replace("_", " "),
+                question.question,
+                *catalog.keywords(question.category),
+            ])
+            for question in ASSESSMENT_QUESTIONS
+        },
+    )
+
+task_catalog = TaskCatalog.from_file(TASK_CATALOG_PATH)
+struggle_classifier = build_struggle_classifier(task_catalog)
+recommendation_cache = LRUCache(int(os.environ.get("MINDFLOW_RECOMMENDATION_CACHE_SIZE", "10000")))
 
 MOTIVATIONAL_QUOTES = [
     MotivationalQuote(
@@ -324,7 +489,320 @@ PREDEFINED_NOTES = [
     )
 ]
 
-daily_notes = {"system": PREDEFINED_NOTES.copy()}  
+shard_config = ShardConfig.from_env()
+
+note_registry = NoteRegistry(
+    id_offset=shard_config.index,
+    id_stride=NOTE_ID_STRIDE if shard_config.sharded else 1,
+)
+note_registry.add_all(PREDEFINED_NOTES)
+daily_notes = note_registry.by_user
+
+storage = create_storage_from_env()
+
+# Every completion and undo, in order, with weekly per-user rollups for the
+# insights endpoints. Written next to the storage state by its writer.
+completion_history = CompletionHistory(os.path.join(storage.state_dir, "history") if storage.state_dir else None)
+storage.flush_hooks.append(completion_history.flush)
+
+def persist_assessment(user_id: str) -> None:
+    storage.put("assessments", user_id, user_assessments[user_id].model_dump(mode="json"))
+
+def persist_progress(user_id: str) -> None:
+    storage.put("progress", user_id, user_progress[user_id].to_json())
+
+def persist_tasks(user_id: str, day: int) -> None:
+    index = user_tasks.get(user_id)
+    tasks = [task_row(task) for task in index.for_day(day)] if index else []
+    if tasks:
+        storage.put("tasks", f"{user_id}/{day}", tasks)
+    else:
+        storage.delete("tasks", f"{user_id}/{day}")
+
+def intern_template(**fields) -> TaskTemplate:
+    template, created = task_templates.intern(**fields)
+    if created:
+        storage.put("task_templates", str(template.id), template.to_json())
+    return template
+
+# Tasks are stored as [task_id, template_id, status, created_at, completed_at]
+# rows, with the status as its position in TaskStatus.
+TASK_STATUSES = list(TaskStatus)
+TASK_STATUS_CODES = {status: code for code, status in enumerate(TASK_STATUSES)}
+
+def task_row(task: TaskRecord) -> List:
+    return [task.task_id, task.template_id, TASK_STATUS_CODES[task.status], task.created_at, task.completed_at]
+
+def task_from_row(row: List) -> TaskRecord:
+    task_id, template_id, status, created_at, completed_at = row
+    return TaskRecord(task_id, template_id, TASK_STATUSES[status], created_at, completed_at)
+
+def task_from_legacy(data: Dict) -> TaskRecord:
+    # A full UserTask dump, as tasks were stored before templates existed.
+    template = intern_template(
+        title=data["title"],
+        description=data["description"],
+        category=data["category"],
+        difficulty=data["difficulty"],
+        estimated_duration=data["estimated_duration"],
+        energy_level=data.get("energy_level", 3),
+        steps=data.get("steps") or (),
+        ai_generated=data.get("ai_generated", False),
+    )
+    completed_at = data.get("completed_at")
+    return TaskRecord(
+        data["task_id"],
+        template.id,
+        TaskStatus(data.get("status", TaskStatus.PENDING)),
+        timestamp_us(datetime.fromisoformat(data["created_at"])),
+        timestamp_us(datetime.fromisoformat(completed_at)) if completed_at else None,
+    )
+
+def task_model(user_id: str, task: TaskRecord) -> UserTask:
+    template = task_templates.get(task.template_id)
+    return UserTask(
+        task_id=task.task_id,
+        user_id=user_id,
+        title=template.title,
+        description=template.description,
+        category=template.category,
+        difficulty=TaskDifficulty(template.difficulty),
+        estimated_duration=template.estimated_duration,
+        status=task.status,
+        created_at=datetime_from_us(task.created_at).isoformat(),
+        completed_at=datetime_from_us(task.completed_at).isoformat() if task.completed_at is not None else None,
+        ai_generated=template.ai_generated,
+        energy_level=template.energy_level,
+        steps=list(template.steps),
+    )
+
+def persist_note(note: DailyNote) -> None:
+    storage.put("notes", str(note.note_id), note.model_dump(mode="json"))
+
+def persist_like(note_id: int, user_id: str) -> None:
+    storage.put("note_likes", f"{note_id}/{user_id}", 1)
+
+def pooled_notes() -> List[Dict]:
+    # What this shard contributes to the shared note pool: its users' public
+    # notes and the predefined notes whose likes it keeps.
+    return [
+        note.model_dump(mode="json")
+        for note_id, note in sorted(note_registry.by_id.items())
+        if (note.is_public and note.user_id != SYSTEM_USER)
+        or (note.user_id == SYSTEM_USER and shard_config.owns_note(note_id))
+    ]
+
+pool_publisher = PoolPublisher(shard_config.pool_url, pooled_notes) if shard_config.pool_url else None
+
+def publish_note(note: DailyNote) -> None:
+    if pool_publisher is None:
+        return
+    if note.is_public or note.user_id == SYSTEM_USER:
+        pool_publisher.put(note.model_dump(mode="json"))
+    else:
+        pool_publisher.remove(note.note_id)
+
+def persist_template_seen(user_id: str) -> None:
+    storage.put("template_seen", user_id, {str(template_id): day for template_id, day in template_seen[user_id].items()})
+
+def load_state() -> None:
+    # Replay allocates millions of small objects that are never cyclic
+    # garbage, so pausing the collector roughly halves cold-start time.
+    # Freezing them afterwards keeps the first collection after the load
+    # from walking all of them.
+    gc.disable()
+    try:
+        _load_collections(storage.load())
+        if not completion_history.load():
+            backfill_completion_history()
+    finally:
+        gc.freeze()
+        gc.enable()
+
+def backfill_completion_history() -> None:
+    # State from before the history existed: the completions still on record
+    # are the tasks that are completed now.
+    completions = []
+    for user_id, index in user_tasks.items():
+        for _, tasks in index.items():
+            for task in tasks:
+                if task.completed_at is not None:
+                    template = task_templates.get(task.template_id)
+                    completions.append(
+                        (user_id, task.completed_at, template.category, template.difficulty, template.energy_level)
+                    )
+    completion_history.extend(sorted(completions, key=lambda completion: completion[1]))
+
+def _load_collections(collections: Dict[str, Dict]) -> None:
+
+    for user_id, data in collections.get("assessments", {}).items():
+        user_assessments[user_id] = UserAssessment.model_validate(data)
+
+    for template_id, data in sorted(collections.get("task_templates", {}).items(), key=lambda item: int(item[0])):
+        task_templates.load(int(template_id), data)
+    
+    # Days in order, so each index sees a reused task id's newest day last.
+    # Rows become records when their user is first looked at.
+    stored_tasks = collections.get("tasks", {})
+    days = [(int(day), user_id, key) for key in stored_tasks for user_id, day in (key.rsplit("/", 1),)]
+    days.sort(key=lambda entry: entry[0])
+    legacy_days = []
+    for day, user_id, key in days:
+        index = user_tasks.get(user_id)
+        if index is None:
+            index = user_tasks[user_id] = UserTaskIndex()
+        rows = stored_tasks[key]
+        if rows and isinstance(rows[0], dict):
+            legacy_days.append((user_id, day))
+            index.extend(day, [task_from_legacy(data) for data in rows])
+        else:
+            index.load(day, rows, task_from_row)
+    for user_id, day in legacy_days:
+        persist_tasks(user_id, day)
+
+    for user_id, data in collections.get("progress", {}).items():
+        if "achievements" in data:
+            data = dict(data)
+            legacy = data.pop("achievements")
+            completed = [a for a in legacy.values() if a.get("completed")]
+            data["achievements_unlocked"] = achievement_engine.mask_for(a["id"] for a in completed)
+            data["achievement_dates"] = {a["id"]: a["completion_date"] for a in completed if a.get("completion_date")}
+        user_progress[user_id] = ProgressRecord.from_json(data)
+
+    notes = sorted(collections.get("notes", {}).values(), key=lambda n: n["note_id"])
+    # Notes written before likes had their own collection carry liked_by.
+    legacy_likes = [(data["note_id"], user_id) for data in notes for user_id in data.get("liked_by", ())]
+    note_registry.add_all(
+        DailyNote.model_validate({key: value for key, value in data.items() if key != "liked_by"}) for data in notes
+    )
+    
+    likes = [key.split("/", 1) for key in collections.get("note_likes", {})]
+    for note_id, user_id in [(int(note_id), user_id) for note_id, user_id in likes] + legacy_likes:
+        note = note_registry.get(note_id)
+        if note is not None:
+            note.liked_by.add(note_registry.user_ids.intern(user_id))
+    for note_id, user_id in legacy_likes:
+        persist_like(note_id, user_id)
+    for note_id in {note_id for note_id, _ in legacy_likes}:
+        if note_registry.get(note_id) is not None:
+            persist_note(note_registry.get(note_id))
+
+    for activity, collection in ((note_activity, "note_activity"), (task_activity, "task_activity")):
+        for key, bits in collections.get(collection, {}).items():
+            user_id, year = key.rsplit("/", 1)
+            if bits:
+                activity.setdefault(user_id, ActivityBitmap()).years[int(year)] = bits
+
+    for user_id, seen in collections.get("template_seen", {}).items():
+        template_seen[user_id] = {int(template_id): day for template_id, day in seen.items()}
+
+    # Note days written before the activity bitmaps existed.
+    for key in collections.get("note_days", {}):
+        user_id, day = key.rsplit("/", 1)
+        note_activity.setdefault(user_id, ActivityBitmap()).set(date.fromisoformat(day))
+
+def mark_activity(activity: Dict[str, ActivityBitmap], collection: str, user_id: str, day: date, active: bool) -> None:
+    bitmap = activity.get(user_id)
+    if bitmap is None:
+        if not active:
+            return
+        bitmap = activity[user_id] = ActivityBitmap()
+    
+    changed = bitmap.set(day) if active else bitmap.clear(day)
+    if changed:
+        storage.put(collection, f"{user_id}/{day.year}", bitmap.years.get(day.year, 0))
+
+def user_now(user_id: str) -> datetime:
+    progress = user_progress.get(user_id)
+    return local_now(progress.timezone if progress else None)
+
+def user_today(user_id: str) -> int:
+    return epoch_day(user_now(user_id).date())
+
+def refresh_today_counters(progress: ProgressRecord) -> None:
+    index = user_tasks.get(progress.user_id)
+    tasks = index.for_day(progress.current_day) if index and progress.current_day is not None else []
+    progress.today_total = len(tasks)
+    progress.today_completed = sum(1 for task in tasks if task.status == TaskStatus.COMPLETED)
+    progress.all_tasks_completed_today = bool(tasks) and progress.today_completed == progress.today_total
+
+def roll_over_user(user_id: str, day: int) -> bool:
+    progress = user_progress.get(user_id)
+    if progress is None or (progress.current_day is not None and progress.current_day >= day):
+        return False
+    
+    previous_day = progress.current_day
+    if previous_day is None and progress.last_completion_date:
+        previous_day = epoch_day(datetime.fromisoformat(progress.last_completion_date).date())
+    
+    streak_before = streak_state(progress)
+    # The streak only survives the night if every task of the previous day
+    # was completed.
+    if previous_day is None or day - previous_day != 1 or not progress.all_tasks_completed_today:
+        progress.current_streak = 0
+    
+    progress.current_day = day
+    refresh_today_counters(progress)
+    check_streak_status(user_id, progress)
+    persist_progress(user_id)
+    publish_streak_change(user_id, progress, streak_before)
+    return True
+
+def streak_state(progress: ProgressRecord) -> tuple:
+    return progress.current_streak, progress.longest_streak, progress.streak_status
+
+def publish_streak_change(user_id: str, progress: ProgressRecord, before: tuple) -> None:
+    if streak_state(progress) != before:
+        event_hub.publish(user_id, "streak_changed", {
+            "current": progress.current_streak,
+            "longest": progress.longest_streak,
+            "status": progress.streak_status,
+            "message": progress.streak_message,
+        })
+
+def get_progress(user_id: str) -> ProgressRecord:
+    progress = user_progress.get(user_id)
+    if progress is None:
+        progress = ProgressRecord(user_id=user_id, current_day=local_epoch_day(None))
+        user_progress[user_id] = progress
+        rollover_scheduler.assign(user_id, None)
+        refresh_today_counters(progress)
+        persist_progress(user_id)
+    elif progress.current_day != local_epoch_day(progress.timezone):
+        roll_over_user(user_id, local_epoch_day(progress.timezone))
+    return progress
+
+def roll_over_idle_user(user_id: str, day: int) -> bool:
+    # A user with a request in flight is rolled over by get_progress on their
+    # next request instead.
+    return not user_locks.busy(user_id) and roll_over_user(user_id, day)
+
+rollover_scheduler = RolloverScheduler(
+    roll_over_idle_user,
+    interval=float(os.environ.get("MINDFLOW_ROLLOVER_INTERVAL", "30")),
+)
+
+def restore_state() -> None:
+    load_state()
+    for user_id, progress in user_progress.items():
+        rollover_scheduler.assign(user_id, progress.timezone)
+
+@app.on_event("startup")
+async def startup_storage():
+    restore_state()
+    storage.start()
+    rollover_scheduler.start()
+    loop_lag_monitor.start()
+    if pool_publisher is not None:
+        pool_publisher.start()
+
+@app.on_event("shutdown")
+async def shutdown_storage():
+    await loop_lag_monitor.stop()
+    if pool_publisher is not None:
+        await pool_publisher.stop()
+    await rollover_scheduler.stop()
+    storage.close()
 
 class CreateNoteRequest(BaseModel):
     user_id: str
@@ -336,6 +814,9 @@ class CreateNoteRequest(BaseModel):
 class StruggleDescription(BaseModel):
     description: str
 
+class BatchRecommendationRequest(BaseModel):
+    user_ids: Optional[List[str]] = None
+
     # Current API Endpoints Documentation:
 # GET /api/assessment/questions
 #   - Returns all assessment questions
@@ -353,7 +834,6 @@ class StruggleDescription(BaseModel):
 #   - Requires user_id and description
 #   - Returns task recommendations
 #   - TODO: Add validation for description length and content
-#   - TODO: Implement rate limiting for API calls
 #   - TODO: Add user authentication
 #   - TODO: Add input sanitization for description
 
@@ -378,16 +858,24 @@ class StruggleDescription(BaseModel):
 # 8. Add proper logging
 
 @app.get("/api/assessment/questions")
-async def get_assessment_questions():
-    return {"questions": ASSESSMENT_QUESTIONS}
+async def get_assessment_questions(request: Request):
+    # The questions only change with a deploy, so the version never moves.
+    payload = payload_cache.get(
+        "questions", None,
+        lambda: {"questions": [question.model_dump(mode="json") for question in ASSESSMENT_QUESTIONS]}
+    )
+    return payload_response(request, payload)
 
 @app.post("/api/assessment/submit")
+@serialized(user_locks, lambda kwargs: kwargs["assessment"].user_id)
 async def submit_assessment(assessment: UserAssessment):
     assessment.timestamp = datetime.now().isoformat()
     user_assessments[assessment.user_id] = assessment
+    persist_assessment(assessment.user_id)
     return {"status": "success", "message": "Assessment submitted successfully"}
 
 @app.post("/api/assessment/{user_id}/struggle")
+@serialized(user_locks)
 async def submit_struggle_description(user_id: str, struggle: StruggleDescription):
     description = struggle.description.strip()
     
@@ -416,104 +904,220 @@ async def submit_struggle_description(user_id: str, struggle: StruggleDescriptio
         )
 
     user_assessments[user_id].struggle_description = description
+    persist_assessment(user_id)
     
     recommendations = generate_task_recommendations(user_id)
     return {"recommendations": recommendations}
 
 def generate_task_recommendations(user_id: str) -> List[TaskRecommendation]:
     assessment = user_assessments[user_id]
+    today_day = user_today(user_id)
+    plan = recommendation_plan(assessment, assessment.struggle_description)
+    templates = select_templates(plan, recently_seen_templates(user_id, today_day))
+    mark_templates_seen(user_id, [template["id"] for template in templates], today_day)
+    return recommendations_for(templates)
+
+def focus_categories(lowest_categories: List, description: Optional[str] = None, count: int = 3) -> List[str]:
+    # The category the description points at most clearly comes first, then
+    # the user's weakest assessment categories.
+    categories = [category for category, _ in lowest_categories]
+    if description:
+        categories = struggle_classifier.classify(description).top_categories(1) + categories
+    return list(dict.fromkeys(categories))[:count]
+
+def assessment_fingerprint(responses: List[AssessmentResponse]) -> str:
+    # Ratings are already whole slider steps, so the sorted (question, rating)
+    # pairs are the quantized response vector.
+    pairs = sorted((response.question_id, response.rating) for response in responses)
+    return hashlib.blake2b(repr(pairs).encode("utf-8"), digest_size=8).hexdigest()
+
+def recommendation_key(assessment: UserAssessment, description: Optional[str]) -> tuple:
+    return (
+        task_catalog.version,
+        assessment_fingerprint(assessment.responses),
+        text_key(description) if description else None,
+    )
+
+def recommendation_plan(assessment: UserAssessment, description: Optional[str], lowest_categories: Optional[List] = None) -> tuple:
+    # The focus categories and each one's templates in ranked order depend
+    # only on the answers and the description, so users who share both share
+    # the plan. Which templates a user has already seen is applied afterwards.
+    key = recommendation_key(assessment, description)
+    plan = recommendation_cache.get(key)
+    if plan is None:
+        if lowest_categories is None:
+            lowest_categories = category_scorer.lowest_for(assessment)
+        plan = tuple(
+            (category, tuple(
+                template["id"] for template in struggle_classifier.rank_templates(
+                    description, task_catalog.query(categories=[category])
+                )
+            ))
+            for category in focus_categories(lowest_categories, description)
+        )
+        recommendation_cache.put(key, plan)
+    return plan
+
+def recently_seen_templates(user_id: str, today_day: int, days: int = SEEN_TEMPLATE_DAYS) -> List[int]:
+    seen = template_seen.get(user_id, {})
+    return [template_id for template_id, day in seen.items() if today_day - day < days]
+
+def mark_templates_seen(user_id: str, template_ids: List[int], today_day: int) -> None:
+    seen = template_seen.setdefault(user_id, {})
+    for template_id in template_ids:
+        seen[template_id] = today_day
+    # Entries outside the window can no longer exclude anything.
+    for template_id in [t for t, day in seen.items() if today_day - day >= SEEN_TEMPLATE_DAYS]:
+        del seen[template_id]
+    persist_template_seen(user_id)
+
+def select_templates(plan: tuple, seen: Optional[List[int]] = None, per_category: int = 2) -> List[Dict]:
+    seen = set(seen or ())
+    selected = []
+    for _, ranked in plan:
+        # Templates the user hasn't been shown recently come first; once a
+        # category runs out of fresh ones the rest of it is used again.
+        chosen = [template_id for template_id in ranked if template_id not in seen][:per_category]
+        if len(chosen) < per_category:
+            chosen += [template_id for template_id in ranked if template_id in seen][:per_category - len(chosen)]
+        selected += [task_catalog.by_id[template_id] for template_id in chosen]
+    return selected
+
+def recommendations_for(templates: List[Dict]) -> List[TaskRecommendation]:
+    return [
+        TaskRecommendation(
+            task_id=task_id,
+            title=template["title"],
+            description=template["description"],
+            category=template["category"],
+            difficulty=template["difficulty"],
+            estimated_duration=template["duration"]
+        )
+        for task_id, template in enumerate(templates, 1)
+    ]
+
+@app.post("/api/recommendations/batch")
+async def generate_batch_recommendations(batch: BatchRecommendationRequest):
+    user_ids = batch.user_ids if batch.user_ids is not None else list(user_assessments)
+    found = [user_id for user_id in user_ids if user_id in user_assessments]
+    missing = [user_id for user_id in user_ids if user_id not in user_assessments]
+    
+    # Only users whose plan isn't cached need scoring, and those are scored
+    # together in one matrix product.
+    uncached = [
+        user_id for user_id in found
+        if recommendation_key(user_assessments[user_id], user_assessments[user_id].struggle_description) not in recommendation_cache
+    ]
+    lowest = dict(zip(uncached, category_scorer.lowest_categories([user_assessments[user_id] for user_id in uncached])))
     
-    category_scores = {}
-    for response in assessment.responses:
-        question = next(q for q in ASSESSMENT_QUESTIONS if q.id == response.question_id)
-        if question.category not in category_scores:
-            category_scores[question.category] = []
-        category_scores[question.category].append(response.rating)
+    recommendations = {}
+    for user_id in found:
+        assessment = user_assessments[user_id]
+        plan = recommendation_plan(assessment, assessment.struggle_description, lowest.get(user_id))
+        templates = select_templates(plan, recently_seen_templates(user_id, user_today(user_id)))
+        recommendations[user_id] = recommendations_for(templates)
     
-    category_averages = {
-        category: sum(scores) / len(scores)
-        for category, scores in category_scores.items()
+    return {
+        "recommendations": recommendations,
+        "missing": missing
     }
-    
-    lowest_categories = sorted(
-        category_averages.items(),
-        key=lambda x: x[1]
-    )[:3]
-    
-    recommendations = []
-    task_id = 1
-    
-    for category, _ in lowest_categories:
-        if category in TASK_TEMPLATES:
-            for template in TASK_TEMPLATES[category][:2]: 
-                recommendations.append(
-                    TaskRecommendation(
-                        task_id=task_id,
-                        title=template["title"],
-                        description=template["description"],
-                        category=category,
-                        difficulty=template["difficulty"],
-                        estimated_duration=template["duration"]
-                    )
-                )
-                task_id += 1
-    
-    return recommendations
 
-@app.get("/api/tasks/{user_id}")
-async def get_user_tasks(user_id: str, status: Optional[TaskStatus] = None):
-    today = datetime.now().date()
+@app.get("/api/templates")
+async def search_task_templates(
+    category: Optional[List[str]] = Query(None),
+    difficulty: Optional[List[TaskDifficulty]] = Query(None),
+    energy_level: Optional[List[int]] = Query(None),
+    max_minutes: Optional[int] = Query(None, ge=0),
+    min_minutes: Optional[int] = Query(None, ge=0),
+    user_id: Optional[str] = None,
+    unseen_days: int = Query(SEEN_TEMPLATE_DAYS, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    exclude_ids = None
+    if user_id is not None and unseen_days:
+        exclude_ids = recently_seen_templates(user_id, user_today(user_id), unseen_days)
+
+    bits = task_catalog.mask(
+        categories=category,
+        difficulties=[d.value for d in difficulty] if difficulty is not None else None,
+        energy_levels=energy_level,
+        max_minutes=max_minutes,
+        min_minutes=min_minutes,
+        exclude_ids=exclude_ids,
+    )
+    return {
+        "templates": task_catalog.templates_in(bits, limit),
+        "total": bin(bits).count("1")
+    }
+
+@app.post("/api/templates/reload")
+async def reload_task_templates():
+    global task_catalog, struggle_classifier
+    task_catalog = TaskCatalog.from_file(TASK_CATALOG_PATH)
+    struggle_classifier = build_struggle_classifier(task_catalog)
+    recommendation_cache.clear()
+    return {"status": "success", "templates": len(task_catalog), "version": task_catalog.version}
+
+@app.get("/api/recommendations/cache")
+async def get_recommendation_cache_stats():
+    return {
+        "recommendations": recommendation_cache.stats(),
+        "struggle_classifier": struggle_classifier.cache.stats()
+    }
+
+STARTER_TASKS = [
+    {
+        "title": "Morning Mindfulness",
+        "description": "Take 5 minutes to practice deep breathing and set your intentions for the day",
+        "category": "mindset",
+        "difficulty": "easy",
+        "estimated_duration": "5 minutes",
+        "steps": ["Find a quiet space", "Sit comfortably", "Focus on your breath", "Set your daily intention"]
+    },
+    {
+        "title": "Gratitude Journal",
+        "description": "Write down three things you're grateful for today",
+        "category": "emotions",
+        "difficulty": "easy",
+        "estimated_duration": "10 minutes",
+        "steps": ["Find a quiet moment", "Reflect on your day", "Write down three gratitudes", "Add why you're grateful for each"]
+    },
+    {
+        "title": "Energy Check-in",
+        "description": "Rate your current energy level and identify what affects it",
+        "category": "habits",
+        "difficulty": "medium",
+        "estimated_duration": "15 minutes",
+        "steps": ["Rate your energy 1-10", "Note what's affecting it", "Plan one action to improve it", "Schedule a follow-up check"]
+    }
+]
+
+def today_tasks(user_id: str, progress: ProgressRecord) -> List[TaskRecord]:
+    # A user who has not taken the assessment gets a starter set of tasks on
+    # first look; one who has picks their own with /select.
+    today_day = progress.current_day
     
     if user_id not in user_tasks:
-        user_tasks[user_id] = []
-    
-    tasks = [
-        task for task in user_tasks[user_id]
-        if datetime.fromisoformat(task.created_at).date() == today
-    ]
+        user_tasks[user_id] = UserTaskIndex()
     
+    tasks = user_tasks[user_id].for_day(today_day)
     if not tasks and user_id not in user_assessments:
+        created_at = timestamp_us(user_now(user_id))
         default_tasks = [
-            UserTask(
-                task_id=1,
-                user_id=user_id,
-                title="Morning Mindfulness",
-                description="Take 5 minutes to practice deep breathing and set your intentions for the day",
-                category="mindset",
-                difficulty=TaskDifficulty.EASY,
-                estimated_duration="5 minutes",
-                created_at=datetime.now().isoformat(),
-                status=TaskStatus.PENDING,
-                steps=["Find a quiet space", "Sit comfortably", "Focus on your breath", "Set your daily intention"]
-            ),
-            UserTask(
-                task_id=2,
-                user_id=user_id,
-                title="Gratitude Journal",
-                description="Write down three things you're grateful for today",
-                category="emotions",
-                difficulty=TaskDifficulty.EASY,
-                estimated_duration="10 minutes",
-                created_at=datetime.now().isoformat(),
-                status=TaskStatus.PENDING,
-                steps=["Find a quiet moment", "Reflect on your day", "Write down three gratitudes", "Add why you're grateful for each"]
-            ),
-            UserTask(
-                task_id=3,
-                user_id=user_id,
-                title="Energy Check-in",
-                description="Rate your current energy level and identify what affects it",
-                category="habits",
-                difficulty=TaskDifficulty.MEDIUM,
-                estimated_duration="15 minutes",
-                created_at=datetime.now().isoformat(),
-                status=TaskStatus.PENDING,
-                steps=["Rate your energy 1-10", "Note what's affecting it", "Plan one action to improve it", "Schedule a follow-up check"]
-            )
+            TaskRecord(task_id, intern_template(**fields).id, TaskStatus.PENDING, created_at)
+            for task_id, fields in enumerate(STARTER_TASKS, start=1)
         ]
-        user_tasks[user_id].extend(default_tasks)
+        user_tasks[user_id].extend(today_day, default_tasks)
+        persist_tasks(user_id, today_day)
+        refresh_today_counters(progress)
+        persist_progress(user_id)
         tasks = default_tasks
-    elif not tasks and user_id in user_assessments:
+    return tasks
+
+def tasks_section(user_id: str, progress: ProgressRecord, status: Optional[TaskStatus] = None) -> Dict:
+    tasks = today_tasks(user_id, progress)
+    
+    if not tasks and user_id in user_assessments:
         return {
             "tasks": [],
             "streak_info": {
@@ -532,38 +1136,11 @@ async def get_user_tasks(user_id: str, status: Optional[TaskStatus] = None):
             }
         }
     
-    if status:
-        tasks = [task for task in tasks if task.status == status]
-    
-    if user_id not in user_progress:
-        user_progress[user_id] = UserProgress(user_id=user_id)
-    else:
-        progress = user_progress[user_id]
-        if progress.last_completion_date:
-            last_date = datetime.fromisoformat(progress.last_completion_date).date()
-            if last_date != today:
-                if not progress.all_tasks_completed_today:
-                    progress.current_streak = 0
-                    progress.streak_status = "no_streak"
-                    progress.streak_message = "Complete all tasks today to start a streak!"
-                progress.last_completion_date = None
-                progress.all_tasks_completed_today = False
-        else:
-            progress.current_streak = 0
-            progress.streak_status = "no_streak"
-            progress.streak_message = "Complete all tasks today to start a streak!"
-    
-    progress = user_progress[user_id]
-    
-    progress.today_total = len(tasks)
-    progress.today_completed = sum(1 for task in tasks if task.status == TaskStatus.COMPLETED)
-    progress.all_tasks_completed_today = all(task.status == TaskStatus.COMPLETED for task in tasks)
-    
     if status:
         tasks = [task for task in tasks if task.status == status]
     
     return {
-        "tasks": tasks,
+        "tasks": [task_model(user_id, task) for task in tasks],
         "streak_info": {
             "current_streak": progress.current_streak,
             "longest_streak": progress.longest_streak,
@@ -581,38 +1158,7 @@ async def get_user_tasks(user_id: str, status: Optional[TaskStatus] = None):
         }
     }
 
-@app.get("/api/progress/{user_id}")
-async def get_user_progress(user_id: str):
-    today = datetime.now().date()
-    
-    if user_id not in user_progress:
-        user_progress[user_id] = UserProgress(user_id=user_id)
-    else:
-        progress = user_progress[user_id]
-        if progress.last_completion_date:
-            last_date = datetime.fromisoformat(progress.last_completion_date).date()
-            if last_date != today:
-                if not progress.all_tasks_completed_today:
-                    progress.current_streak = 0
-                    progress.streak_status = "no_streak"
-                    progress.streak_message = "Complete all tasks today to start a streak!"
-                progress.last_completion_date = None
-                progress.all_tasks_completed_today = False
-        else:
-            progress.current_streak = 0
-            progress.streak_status = "no_streak"
-            progress.streak_message = "Complete all tasks today to start a streak!"
-    
-    progress = user_progress[user_id]
-    
-    today_tasks = [
-        task for task in user_tasks.get(user_id, [])
-        if datetime.fromisoformat(task.created_at).date() == today
-    ]
-    
-    progress.today_total = len(today_tasks)
-    progress.today_completed = sum(1 for task in today_tasks if task.status == TaskStatus.COMPLETED)
-    
+def progress_section(user_id: str, progress: ProgressRecord) -> Dict:
     check_streak_status(user_id, progress)
     
     completion_percentage = (progress.today_completed / progress.today_total * 100) if progress.today_total > 0 else 0
@@ -630,7 +1176,7 @@ async def get_user_progress(user_id: str):
             "completed": progress.today_completed,
             "total": progress.today_total,
             "completion_percentage": round(completion_percentage, 1),
-            "all_completed": all(task.status == TaskStatus.COMPLETED for task in today_tasks) if today_tasks else False
+            "all_completed": progress.all_tasks_completed_today
         },
         "total_stats": {
             "total_tasks_completed": progress.total_tasks_completed,
@@ -638,54 +1184,72 @@ async def get_user_progress(user_id: str):
         }
     }
 
+@app.get("/api/tasks/{user_id}")
+@serialized(user_locks)
+async def get_user_tasks(user_id: str, status: Optional[TaskStatus] = None):
+    return tasks_section(user_id, get_progress(user_id), status)
+
+@app.get("/api/progress/{user_id}")
+async def get_user_progress(user_id: str):
+    return progress_section(user_id, get_progress(user_id))
+
 @app.post("/api/tasks/{user_id}/complete/{task_id}")
+@serialized(user_locks)
 async def complete_task(user_id: str, task_id: int):
     if user_id not in user_tasks:
         raise HTTPException(status_code=404, detail="User not found")
     
-    task = next((t for t in user_tasks[user_id] if t.task_id == task_id), None)
-    if not task:
+    entry = user_tasks[user_id].get(task_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Task not found")
+    task_day, task = entry
     
-    if user_id not in user_progress:
-        user_progress[user_id] = UserProgress(user_id=user_id)
-    progress = user_progress[user_id]
-    
-    today = datetime.now().date()
-    today_tasks = [
-        t for t in user_tasks[user_id]
-        if datetime.fromisoformat(t.created_at).date() == today
-    ]
+    progress = get_progress(user_id)
+    today = date_from_epoch_day(progress.current_day)
+    today_tasks = user_tasks[user_id].for_day(progress.current_day)
     
     was_completed = task.status == TaskStatus.COMPLETED
-    all_tasks_completed_before = all(t.status == TaskStatus.COMPLETED for t in today_tasks)
+    streak_before = streak_state(progress)
+    all_tasks_completed_before = bool(today_tasks) and all(t.status == TaskStatus.COMPLETED for t in today_tasks)
+    
+    template = task_templates.get(task.template_id)
+    category = template.category
     
     if was_completed:
+        completion_history.append(
+            user_id, task.completed_at, category, template.difficulty, template.energy_level, delta=-1
+        )
         task.status = TaskStatus.PENDING
         task.completed_at = None
         
         progress.total_tasks_completed -= 1
-        progress.categories_completed[task.category] = max(0, progress.categories_completed.get(task.category, 0) - 1)
-        progress.today_completed -= 1
+        progress.categories_completed[category] = max(0, progress.categories_completed.get(category, 0) - 1)
         
-        if all_tasks_completed_before:
+        # Only today's tasks count towards today's streak day; undoing an
+        # older completion leaves the streak alone.
+        if all_tasks_completed_before and task_day == progress.current_day:
             if progress.current_streak > 0:
                 progress.current_streak -= 1
                 progress.streak_status = "decreased"
                 progress.streak_message = f"Streak decreased to {progress.current_streak} days. Complete all tasks to increase it! 💪"
+                if progress.current_streak > 0:
+                    # Today no longer counts, so the streak last grew
+                    # yesterday; completing today again extends it again.
+                    progress.last_completion_date = (user_now(user_id) - timedelta(days=1)).isoformat()
             else:
                 progress.streak_status = "no_streak"
                 progress.streak_message = "Streak broken! Complete all tasks to start a new streak! ��"
     else:
         task.status = TaskStatus.COMPLETED
-        task.completed_at = datetime.now().isoformat()
+        task.completed_at = timestamp_us(user_now(user_id))
+        completion_history.append(user_id, task.completed_at, category, template.difficulty, template.energy_level)
         
         progress.total_tasks_completed += 1
-        progress.categories_completed[task.category] = progress.categories_completed.get(task.category, 0) + 1
-        progress.today_completed += 1
+        progress.categories_completed[category] = progress.categories_completed.get(category, 0) + 1
     
-    all_tasks_completed_after = all(t.status == TaskStatus.COMPLETED for t in today_tasks)
-    progress.all_tasks_completed_today = all_tasks_completed_after
+    refresh_today_counters(progress)
+    all_tasks_completed_after = progress.all_tasks_completed_today
+    mark_activity(task_activity, "task_activity", user_id, today, all_tasks_completed_after)
     
     if all_tasks_completed_after:
         if not all_tasks_completed_before:
@@ -715,15 +1279,26 @@ async def complete_task(user_id: str, task_id: int):
             progress.streak_status = "new_streak"
             progress.streak_message = "New streak started! Keep it going! 🎯"
         
-        progress.last_completion_date = datetime.now().isoformat()
-    
-    if progress.today_total == 0:
-        progress.today_total = len(today_tasks)
-    
-    newly_unlocked_achievements = check_achievements(user_id, progress)
+        progress.last_completion_date = user_now(user_id).isoformat()
+    
+    newly_unlocked_achievements = check_achievements(user_id, progress, "tasks", "streak")
+    persist_tasks(user_id, task_day)
+    persist_progress(user_id)
+    
+    # Undoing a completion sends the same event with status "pending".
+    response_task = task_model(user_id, task)
+    event_hub.publish(user_id, "task_completed", {
+        "task_id": task.task_id,
+        "status": task.status.value,
+        "completed_at": response_task.completed_at,
+        "today_completed": progress.today_completed,
+        "today_total": progress.today_total,
+        "all_completed": progress.all_tasks_completed_today,
+    })
+    publish_streak_change(user_id, progress, streak_before)
     
     return {
-        "task": task,
+        "task": response_task,
         "progress": {
             "current_streak": progress.current_streak,
             "longest_streak": progress.longest_streak,
@@ -737,17 +1312,22 @@ async def complete_task(user_id: str, task_id: int):
     }
 
 @app.get("/api/quotes")
-async def get_motivational_quote(category: Optional[str] = None):
-    quotes = MOTIVATIONAL_QUOTES
+async def get_motivational_quote(request: Request, category: Optional[str] = None):
+    indexes = range(len(MOTIVATIONAL_QUOTES))
     if category:
-        quotes = [q for q in quotes if q.category == category]
+        indexes = [i for i in indexes if MOTIVATIONAL_QUOTES[i].category == category]
     
-    if not quotes:
+    if not indexes:
         raise HTTPException(status_code=404, detail="No quotes found for category")
     
-    return random.choice(quotes)
+    # Each quote is its own pre-encoded payload, so a client that already
+    # holds the randomly picked one gets a 304.
+    index = random.choice(indexes)
+    payload = payload_cache.get(f"quote:{index}", None, lambda: MOTIVATIONAL_QUOTES[index].model_dump(mode="json"))
+    return payload_response(request, payload)
 
 @app.post("/api/ai/tasks/generate")
+@serialized(user_locks)
 async def generate_ai_tasks(user_id: str, struggle_description: str):
     if not struggle_description or len(struggle_description.strip()) < 10:
         raise HTTPException(
@@ -759,56 +1339,44 @@ async def generate_ai_tasks(user_id: str, struggle_description: str):
     if not assessment:
         raise HTTPException(status_code=404, detail="Assessment not found")
     
-    tasks = []
+    progress = get_progress(user_id)
+    created_at = timestamp_us(user_now(user_id))
     task_id = len(user_tasks.get(user_id, [])) + 1
     
-    category_scores = {}
-    for response in assessment.responses:
-        question = next(q for q in ASSESSMENT_QUESTIONS if q.id == response.question_id)
-        if question.category not in category_scores:
-            category_scores[question.category] = []
-        category_scores[question.category].append(response.rating)
+    plan = recommendation_plan(assessment, struggle_description)
+    templates = select_templates(plan, recently_seen_templates(user_id, progress.current_day))
+    mark_templates_seen(user_id, [template["id"] for template in templates], progress.current_day)
     
-    category_averages = {
-        category: sum(scores) / len(scores)
-        for category, scores in category_scores.items()
-    }
-    
-    lowest_categories = sorted(
-        category_averages.items(),
-        key=lambda x: x[1]
-    )[:3]
-    
-    for category, score in lowest_categories:
-        for i in range(2):
-            difficulty = TaskDifficulty.EASY if i == 0 else TaskDifficulty.MEDIUM
-            task = UserTask(
-                task_id=task_id,
-                user_id=user_id,
-                title=f"AI-Generated Task for {category}",
-                description=f"Personalized task based on your {category} assessment and struggle description",
-                category=category,
-                difficulty=difficulty,
-                estimated_duration="15-30 minutes",
-                created_at=datetime.now().isoformat(),
-                ai_generated=True,
-                steps=[
-                    "Step 1: Review your current situation",
-                    "Step 2: Identify specific challenges",
-                    "Step 3: Create an action plan",
-                    "Step 4: Implement and track progress"
-                ]
-            )
-            tasks.append(task)
-            task_id += 1
+    tasks = [
+        TaskRecord(
+            task_id + offset,
+            intern_template(
+                title=template["title"],
+                description=template["description"],
+                category=template["category"],
+                difficulty=TaskDifficulty(template["difficulty"]).value,
+                estimated_duration=template["duration"],
+                energy_level=template.get("energy_level", 3),
+                steps=template.get("steps", ()),
+                ai_generated=True
+            ).id,
+            TaskStatus.PENDING,
+            created_at
+        )
+        for offset, template in enumerate(templates)
+    ]
     
     if user_id not in user_tasks:
-        user_tasks[user_id] = []
-    user_tasks[user_id].extend(tasks)
+        user_tasks[user_id] = UserTaskIndex()
+    user_tasks[user_id].extend(progress.current_day, tasks)
+    persist_tasks(user_id, progress.current_day)
+    refresh_today_counters(progress)
+    persist_progress(user_id)
     
-    return {"tasks": tasks}
+    return {"tasks": [task_model(user_id, task) for task in tasks]}
 
 @app.post("/api/notes/daily")
+@serialized(user_locks, lambda kwargs: kwargs["note_request"].user_id)
 async def create_daily_note(note_request: CreateNoteRequest):
     if not note_request.message or len(note_request.message.strip()) < 10:
         raise HTTPException(
@@ -827,18 +1395,14 @@ async def create_daily_note(note_request: CreateNoteRequest):
             }
         )
     
-    today = date.today().isoformat()
-    if note_request.user_id not in user_daily_note_count:
-        user_daily_note_count[note_request.user_id] = {}
-    
-    if user_daily_note_count[note_request.user_id].get(today, 0) >= 1:
-        today_note = None
-        if note_request.user_id in daily_notes:
-            for note in daily_notes[note_request.user_id]:
-                note_date = datetime.fromisoformat(note.created_at).date()
-                if note_date == date.today():
-                    today_note = note
-                    break
+    # The note's day is the user's, like their tasks'.
+    now = user_now(note_request.user_id)
+    today = now.date()
+    posted_today = note_activity.get(note_request.user_id)
+    
+    if posted_today and posted_today.has(today):
+        user_notes = note_registry.for_user(note_request.user_id)
+        today_note = user_notes[-1] if user_notes and user_notes[-1].created_at[:10] == today.isoformat() else None
         
         raise HTTPException(
             status_code=400,
@@ -850,31 +1414,28 @@ async def create_daily_note(note_request: CreateNoteRequest):
             }
         )
     
-    note_id = sum(len(notes) for notes in daily_notes.values()) + 1
     note = DailyNote(
-        note_id=note_id,
+        note_id=note_registry.next_id(),
         user_id=note_request.user_id,
         message=note_request.message,
-        created_at=datetime.now().isoformat(),
+        created_at=now.isoformat(),
         likes=0,
         category=note_request.category,
         mood=note_request.mood,
         is_public=note_request.is_public
     )
     
-    if note_request.user_id not in daily_notes:
-        daily_notes[note_request.user_id] = []
-    daily_notes[note_request.user_id].append(note)
+    note_registry.add(note)
+    persist_note(note)
+    publish_note(note)
     
-    user_daily_note_count[note_request.user_id][today] = 1
+    mark_activity(note_activity, "note_activity", note_request.user_id, today, True)
     
-    if note_request.user_id not in user_progress:
-        user_progress[note_request.user_id] = UserProgress(user_id=note_request.user_id)
-    
-    progress = user_progress[note_request.user_id]
+    progress = get_progress(note_request.user_id)
     progress.notes_shared += 1
     
-    newly_unlocked = check_achievements(note_request.user_id, progress)
+    newly_unlocked = check_achievements(note_request.user_id, progress, "notes")
+    persist_progress(note_request.user_id)
     
     return {
         "note": note,
@@ -887,86 +1448,119 @@ async def create_daily_note(note_request: CreateNoteRequest):
 async def get_random_note(
     user_id: str,
     category: Optional[str] = None,
-    exclude_own: bool = True
+    exclude_own: bool = True,
+    unique_this_week: bool = False
 ):
-    available_notes = []
+    seen = None
+    if unique_this_week:
+        seen = note_registry.seen_this_week(user_id, tuple(user_now(user_id).date().isocalendar())[:2])
     
-    for creator_id, notes in daily_notes.items():
-        if creator_id == "system":
-            continue
-        if exclude_own and creator_id == user_id:
-            continue
-        
-        for note in notes:
-            if note.is_public and (category is None or note.category == category):
-                available_notes.append(note)
-    
-    if not available_notes:
-        system_notes = daily_notes.get("system", [])
-        for note in system_notes:
-            if category is None or note.category == category:
-                available_notes.append(note)
-    
-    if not available_notes:
-        default_note = DailyNote(
-            note_id=0,
-            user_id="system",
-            message="Every day is a new opportunity to grow and make progress. Keep going!",
-            created_at=datetime.now().isoformat(),
-            likes=0,
-            category="motivation",
-            mood="inspired",
-            is_public=True
-        )
-        return default_note
+    note = note_registry.sample(user_id, category=category, exclude_own=exclude_own, seen=seen)
     
-    return random.choice(available_notes)
+    return note or default_note()
+
+def default_note() -> DailyNote:
+    return DailyNote(
+        note_id=0,
+        user_id="system",
+        message="Every day is a new opportunity to grow and make progress. Keep going!",
+        created_at=datetime.now().isoformat(),
+        likes=0,
+        category="motivation",
+        mood="inspired",
+        is_public=True
+    )
 
 @app.get("/api/notes/user/{user_id}")
 async def get_user_notes(
     user_id: str,
     limit: int = 10,
     offset: int = 0,
-    category: Optional[str] = None
+    category: Optional[str] = None,
+    before: Optional[int] = None
 ):
-    if user_id not in daily_notes:
-        return {"notes": []}
-    
-    notes = daily_notes[user_id]
-    if category:
-        notes = [note for note in notes if note.category == category]
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=422, detail="limit must be between 1 and 100")
+    if offset < 0:
+        raise HTTPException(status_code=422, detail="offset must not be negative")
     
-    notes.sort(key=lambda x: x.created_at, reverse=True)
-    
-    paginated_notes = notes[offset:offset + limit]
+    notes, next_cursor = note_registry.page(
+        user_id, limit, before=before, category=category, offset=offset
+    )
     
-    return {"notes": paginated_notes}
+    return {"notes": notes, "next_cursor": next_cursor}
+
+def note_owner(note_id: int) -> Optional[str]:
+    # Liking changes the owner's note and stats, so it runs under the owner's lock.
+    note = note_registry.get(note_id)
+    return note.user_id if note is not None else None
 
 @app.post("/api/notes/{note_id}/like")
+@serialized(user_locks, lambda kwargs: note_owner(kwargs["note_id"]))
 async def like_note(note_id: int, user_id: str):
-    note = None
-    for notes in daily_notes.values():
-        for n in notes:
-            if n.note_id == note_id:
-                note = n
-                break
-        if note:
-            break
-    
+    note = note_registry.get(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    if user_id in note.liked_by:
+    if not note_registry.like(note, user_id):
         raise HTTPException(status_code=400, detail="You have already liked this note")
     
-    note.likes += 1
-    note.liked_by.add(user_id)
+    persist_note(note)
+    persist_like(note_id, user_id)
+    publish_note(note)
+    event_hub.publish(note.user_id, "note_liked", {"note_id": note.note_id, "likes": note.likes})
     
     return note
 
+@app.post("/api/notes/{note_id}/visibility")
+@serialized(user_locks)
+async def set_note_visibility(note_id: int, user_id: str, is_public: bool):
+    note = note_registry.get(note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    
+    if note.user_id != user_id:
+        raise HTTPException(status_code=403, detail="You can only change your own notes")
+    
+    note_registry.set_visibility(note, is_public)
+    persist_note(note)
+    publish_note(note)
+    
+    return note
+
+@app.delete("/api/notes/{note_id}")
+@serialized(user_locks)
+async def delete_note(note_id: int, user_id: str):
+    note = note_registry.get(note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    
+    if note.user_id != user_id:
+        raise HTTPException(status_code=403, detail="You can only delete your own notes")
+    
+    note_registry.remove(note_id)
+    storage.delete("notes", str(note_id))
+    for liker in note_registry.likers(note):
+        storage.delete("note_likes", f"{note_id}/{liker}")
+    if pool_publisher is not None:
+        pool_publisher.remove(note_id)
+    
+    # The note's day only stays on the calendar and in the streak while
+    # another of the user's notes is on it.
+    day = note.created_at[:10]
+    if not any(other.created_at[:10] == day for other in note_registry.for_user(user_id)):
+        mark_activity(note_activity, "note_activity", user_id, date.fromisoformat(day), False)
+    progress = user_progress.get(user_id)
+    if progress is not None and progress.notes_shared > 0:
+        progress.notes_shared -= 1
+        persist_progress(user_id)
+    
+    return {"status": "success", "message": "Note deleted successfully"}
+
 @app.get("/api/notes/stats/{user_id}")
 async def get_user_note_stats(user_id: str):
-    if user_id not in daily_notes:
+    stats = note_registry.stats.get(user_id)
+    if not stats:
         return {
             "total_notes": 0,
             "total_likes": 0,
@@ -975,148 +1569,203 @@ async def get_user_note_stats(user_id: str):
             "streak_days": 0
         }
     
-    notes = daily_notes[user_id]
-    total_likes = sum(note.likes for note in notes)
-    
-    notes_by_category = {}
-    for note in notes:
-        if note.category:
-            notes_by_category[note.category] = notes_by_category.get(note.category, 0) + 1
-    
-    notes_by_mood = {}
-    for note in notes:
-        if note.mood:
-            notes_by_mood[note.mood] = notes_by_mood.get(note.mood, 0) + 1
-    
-    streak_days = 0
-    if user_id in user_daily_note_count:
-        dates = sorted(user_daily_note_count[user_id].keys())
-        if dates:
-            current_streak = 0
-            current_date = date.today()
-            
-            for d in reversed(dates):
-                note_date = date.fromisoformat(d)
-                if (current_date - note_date).days == current_streak:
-                    current_streak += 1
-                else:
-                    break
-            
-            streak_days = current_streak
+    return {
+        "total_notes": stats.total_notes,
+        "total_likes": stats.total_likes,
+        "notes_by_category": stats.by_category,
+        "notes_by_mood": stats.by_mood,
+        "streak_days": note_activity[user_id].streak_ending(user_now(user_id).date()) if user_id in note_activity else 0
+    }
+
+@app.post("/api/notes/stats/verify")
+async def verify_note_stats(repair: bool = False):
+    drift = note_registry.check_stats(repair=repair)
     
     return {
-        "total_notes": len(notes),
-        "total_likes": total_likes,
-        "notes_by_category": notes_by_category,
-        "notes_by_mood": notes_by_mood,
-        "streak_days": streak_days
+        "users_checked": len(set(note_registry.stats) | set(note_registry.by_user)),
+        "users_drifted": len(drift),
+        "repaired": repair,
+        "drift": drift
+    }
+
+def activity_summary(bitmap: Optional[ActivityBitmap], year: int, today: date) -> Dict:
+    if bitmap is None:
+        bitmap = ActivityBitmap()
+    return {
+        "days": [day.isoformat() for day in bitmap.days(year)],
+        "monthly_counts": bitmap.month_counts(year),
+        "total": bitmap.total(year),
+        "current_streak": bitmap.streak_ending(today),
+        "longest_streak": bitmap.longest_streak(year)
+    }
+
+@app.get("/api/activity/{user_id}/calendar")
+async def get_activity_calendar(user_id: str, year: Optional[int] = None):
+    today = user_now(user_id).date()
+    if year is None:
+        year = today.year
+    if year < 1 or year > 9999:
+        raise HTTPException(status_code=422, detail="Invalid year")
+    
+    return {
+        "user_id": user_id,
+        "year": year,
+        "notes": activity_summary(note_activity.get(user_id), year, today),
+        "tasks": activity_summary(task_activity.get(user_id), year, today)
+    }
+
+@app.get("/api/insights/{user_id}/trends")
+async def get_completion_trends(user_id: str, weeks: int = Query(12, ge=1, le=520)):
+    # Read from the user's weekly rollup: the cost depends on the window,
+    # not on how many tasks the user has ever completed.
+    last_week = week_of(user_today(user_id))
+    first_week = last_week - weeks + 1
+    window = completion_history.weekly(user_id, first_week, weeks)
+    if window is None:
+        counts = np.zeros((weeks, 0), dtype=np.int32)
+        energy = np.zeros(weeks, dtype=np.int32)
+        difficulty = np.zeros((weeks, 0), dtype=np.int32)
+    else:
+        counts, energy, difficulty = window
+    
+    completed = counts.sum(axis=1)
+    category_totals = counts.sum(axis=0)
+    categories = completion_history.category_names()
+    difficulties = completion_history.difficulty_names()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average_energy = np.round(energy / completed, 2)
+    
+    return {
+        "user_id": user_id,
+        "weeks": weeks,
+        "week_starts": [date_from_epoch_day(week_start(week)).isoformat() for week in range(first_week, last_week + 1)],
+        "completed": completed.tolist(),
+        "by_category": {
+            categories[column]: counts[:, column].tolist()
+            for column in np.flatnonzero(category_totals)
+        },
+        "by_difficulty": {
+            difficulties[column]: difficulty[:, column].tolist()
+            for column in np.flatnonzero(difficulty.sum(axis=0))
+        },
+        "average_energy": [None if total <= 0 else value for total, value in zip(completed.tolist(), average_energy.tolist())],
+        "summary": {
+            "total_completed": int(completed.sum()),
+            "active_weeks": int(np.count_nonzero(completed > 0)),
+            "weekly_average": round(float(completed.mean()), 2),
+            "trend_per_week": round(linear_trend(completed.astype(np.float64)), 3),
+            "top_category": categories[int(category_totals.argmax())] if category_totals.any() else None,
+            "category_totals": {categories[column]: int(category_totals[column]) for column in np.flatnonzero(category_totals)}
+        }
     }
 
 @app.post("/api/tasks/{user_id}/select")
+@serialized(user_locks)
 async def save_selected_tasks(user_id: str, selected_tasks: SelectedTasks):
     if user_id != selected_tasks.user_id:
         raise HTTPException(status_code=400, detail="User ID mismatch")
     
     if user_id not in user_tasks:
-        user_tasks[user_id] = []
+        user_tasks[user_id] = UserTaskIndex()
     
-    selected_date = datetime.fromisoformat(selected_tasks.selected_date).date()
+    progress = get_progress(user_id)
+    selected_day = epoch_day(datetime.fromisoformat(selected_tasks.selected_date).date())
+    today_day = progress.current_day
+    created_at = timestamp_us(user_now(user_id))
     
-    user_tasks[user_id] = [
-        task for task in user_tasks[user_id]
-        if datetime.fromisoformat(task.created_at).date() != selected_date
-    ]
+    user_tasks[user_id].clear_day(selected_day)
     
     for task_detail in selected_tasks.task_details:
-        task = UserTask(
-            task_id=task_detail.task_id,
-            user_id=user_id,
+        template = intern_template(
             title=task_detail.title,
             description=task_detail.description,
             category=task_detail.category,
-            difficulty=TaskDifficulty(task_detail.difficulty),
-            estimated_duration=task_detail.estimated_duration,
-            created_at=datetime.now().isoformat(),
-            status=TaskStatus.PENDING
+            difficulty=TaskDifficulty(task_detail.difficulty).value,
+            estimated_duration=task_detail.estimated_duration
         )
-        user_tasks[user_id].append(task)
+        user_tasks[user_id].add(today_day, TaskRecord(task_detail.task_id, template.id, TaskStatus.PENDING, created_at))
+    
+    persist_tasks(user_id, selected_day)
+    if selected_day != today_day:
+        persist_tasks(user_id, today_day)
     
-    if user_id not in user_progress:
-        user_progress[user_id] = UserProgress(user_id=user_id)
+    refresh_today_counters(progress)
+    persist_progress(user_id)
     
     return {
         "status": "success",
         "message": "Tasks saved successfully",
-        "progress": user_progress[user_id]
+        "progress": progress.model()
     }
 
 @app.post("/api/progress/{user_id}/reset")
+@serialized(user_locks)
 async def reset_user_progress(user_id: str):
-    user_progress[user_id] = UserProgress(
+    previous = user_progress.get(user_id)
+    timezone = previous.timezone if previous else None
+    user_progress[user_id] = ProgressRecord(
         user_id=user_id,
         current_streak=0,
         longest_streak=0,
         streak_status="no_streak",
         streak_message="Complete all tasks today to start a streak!",
         today_completed=0,
-        today_total=0
+        today_total=0,
+        timezone=timezone,
+        current_day=local_epoch_day(timezone)
     )
+    rollover_scheduler.assign(user_id, timezone, timezone)
+    persist_progress(user_id)
     
     if user_id in user_tasks:
-        today = datetime.now().date()
-        user_tasks[user_id] = [
-            task for task in user_tasks[user_id]
-            if datetime.fromisoformat(task.created_at).date() != today
-        ]
+        today_day = user_progress[user_id].current_day
+        if user_tasks[user_id].clear_day(today_day):
+            persist_tasks(user_id, today_day)
     
     return {
         "status": "success",
         "message": "Progress reset successfully",
-        "progress": user_progress[user_id]
+        "progress": user_progress[user_id].model()
     }
 
 @app.post("/api/tasks/{user_id}/refresh-day")
+@serialized(user_locks)
 async def refresh_day_for_user(user_id: str):
-    if user_id not in user_progress:
-        user_progress[user_id] = UserProgress(user_id=user_id)
+    # Day rollover is done server-side by rollover_scheduler; this only
+    # catches up a user the scheduler has not reached yet.
+    progress = get_progress(user_id)
 
     if user_id not in user_tasks:
         return {"status": "success", "message": "No tasks to refresh"}
-
-    progress = user_progress[user_id]
-    today_date = date.today().isoformat()
-    
-    if progress.last_completion_date:
-        last_date = date.fromisoformat(progress.last_completion_date)
-        today = date.today()
-        
-        if (today - last_date).days == 1 and progress.all_tasks_completed_today:
-            pass
-        elif (today - last_date).days == 0:
-            pass
-        elif (today - last_date).days > 1:
-            progress.current_streak = 0
-            progress.streak_status = "reset"
-            progress.streak_message = "Streak reset! Complete all tasks today to start again."
     
-    progress.today_completed = 0
-    progress.all_tasks_completed_today = False
-    
-    for task in user_tasks[user_id]:
-        if task.status != TaskStatus.COMPLETED:
-            task.status = TaskStatus.PENDING
-    
-    progress.today_total = len(user_tasks[user_id])
-    
-    response = {
+    return {
         "status": "success", 
         "message": "Day refreshed successfully",
-        "progress": progress
+        "progress": progress.model()
     }
+
+@app.post("/api/users/{user_id}/timezone")
+@serialized(user_locks)
+async def set_user_timezone(user_id: str, timezone: str):
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=422, detail="Unknown timezone")
+    
+    progress = get_progress(user_id)
+    previous = progress.timezone
+    progress.timezone = timezone
+    rollover_scheduler.assign(user_id, timezone, previous)
+    roll_over_user(user_id, local_epoch_day(timezone))
+    persist_progress(user_id)
     
-    return response
+    return {
+        "status": "success",
+        "timezone": timezone,
+        "current_day": date_from_epoch_day(progress.current_day).isoformat()
+    }
 
-def check_streak_status(user_id: str, progress: UserProgress) -> None:
+def check_streak_status(user_id: str, progress: ProgressRecord) -> None:
     if progress.all_tasks_completed_today:
         if progress.current_streak > 0:
             progress.streak_status = "maintained"
@@ -1132,90 +1781,77 @@ def check_streak_status(user_id: str, progress: UserProgress) -> None:
             progress.streak_status = "no_streak"
             progress.streak_message = "Complete all tasks today to start a streak!"
 
-def check_achievements(user_id: str, progress: UserProgress) -> List[str]:
+def check_achievements(user_id: str, progress: ProgressRecord, *achievement_types: str) -> List[str]:
     if not user_id or user_id not in user_progress:
         return []
     
-    if not hasattr(progress, 'achievements'):
-        progress.achievements = {}
-    
     newly_unlocked = []
-    
-    for achievement_id, achievement_data in ACHIEVEMENTS.items():
-        if achievement_id not in progress.achievements:
-            progress.achievements[achievement_id] = UserAchievement(
-                id=achievement_data["id"],
-                text=achievement_data["text"],
-                type=achievement_data["type"],
-                threshold=achievement_data["threshold"],
-                icon=achievement_data["icon"],
-                completed=False
-            )
-    
-    if progress.current_streak > 0:
-        for achievement_id, achievement_data in ACHIEVEMENTS.items():
-            if achievement_data["type"] == "streak" and progress.current_streak >= achievement_data["threshold"]:
-                if not progress.achievements[achievement_id].completed:
-                    progress.achievements[achievement_id].completed = True
-                    progress.achievements[achievement_id].completion_date = datetime.now().isoformat()
-                    newly_unlocked.append(achievement_id)
-    
-    if progress.total_tasks_completed > 0:
-        for achievement_id, achievement_data in ACHIEVEMENTS.items():
-            if achievement_data["type"] == "tasks" and progress.total_tasks_completed >= achievement_data["threshold"]:
-                if not progress.achievements[achievement_id].completed:
-                    progress.achievements[achievement_id].completed = True
-                    progress.achievements[achievement_id].completion_date = datetime.now().isoformat()
-                    newly_unlocked.append(achievement_id)
-    
-    if progress.notes_shared > 0:
-        for achievement_id, achievement_data in ACHIEVEMENTS.items():
-            if achievement_data["type"] == "notes" and progress.notes_shared >= achievement_data["threshold"]:
-                if not progress.achievements[achievement_id].completed:
-                    progress.achievements[achievement_id].completed = True
-                    progress.achievements[achievement_id].completion_date = datetime.now().isoformat()
-                    newly_unlocked.append(achievement_id)
+    unlocked = progress.achievements_unlocked
+    
+    for achievement_type in achievement_types or achievement_engine.types:
+        value = getattr(progress, achievement_engine.counters[achievement_type])
+        unlocked, unlocked_now = achievement_engine.evaluate(unlocked, achievement_type, value)
+        newly_unlocked.extend(unlocked_now)
+    
+    if newly_unlocked:
+        progress.achievements_unlocked = unlocked
+        completion_date = datetime.now().isoformat()
+        for achievement_id in newly_unlocked:
+            progress.achievement_dates[achievement_id] = completion_date
+            definition = achievement_engine.by_id[achievement_id]
+            event_hub.publish(user_id, "achievement_unlocked", {
+                **{key: definition[key] for key in ("id", "text", "type", "threshold", "icon")},
+                "completion_date": completion_date,
+            })
     
     return newly_unlocked
 
+def achievement_definitions() -> Dict:
+    achievements = [
+        {key: definition[key] for key in ("id", "text", "type", "threshold", "icon")}
+        for definition in achievement_engine.definitions
+    ]
+    return {
+        "achievements": achievements,
+        "by_type": {
+            achievement_type: [a["id"] for a in achievements if a["type"] == achievement_type]
+            for achievement_type in achievement_engine.types
+        },
+        "total_available": len(achievements)
+    }
+
+@app.get("/api/achievements")
+async def get_achievement_definitions(request: Request):
+    payload = payload_cache.get("achievements", achievement_engine.version, achievement_definitions)
+    return payload_response(request, payload)
+
 @app.get("/api/achievements/{user_id}")
+@serialized(user_locks)
 async def get_user_achievements(user_id: str):
-    if user_id not in user_progress:
-        user_progress[user_id] = UserProgress(user_id=user_id)
-    
-    progress = user_progress[user_id]
-    
-    if not hasattr(progress, 'achievements') or not progress.achievements:
-        progress.achievements = {}
-        for achievement_id, achievement_data in ACHIEVEMENTS.items():
-            progress.achievements[achievement_id] = UserAchievement(
-                id=achievement_data["id"],
-                text=achievement_data["text"],
-                type=achievement_data["type"],
-                threshold=achievement_data["threshold"],
-                icon=achievement_data["icon"],
-                completed=False
-            )
-    
-    check_achievements(user_id, progress)
-    
-    achievements_list = []
-    for achievement_id, achievement in progress.achievements.items():
-        achievements_list.append({
-            "id": achievement.id,
-            "text": achievement.text,
-            "type": achievement.type,
-            "threshold": achievement.threshold,
-            "icon": achievement.icon,
-            "completed": achievement.completed,
-            "completion_date": achievement.completion_date
+    return achievements_section(user_id, get_progress(user_id))
+
+def achievement_entries(progress: ProgressRecord) -> List[Dict]:
+    entries = []
+    for definition in achievement_engine.definitions:
+        completed = bool(progress.achievements_unlocked >> definition["bit"] & 1)
+        entries.append({
+            "id": definition["id"],
+            "text": definition["text"],
+            "type": definition["type"],
+            "threshold": definition["threshold"],
+            "icon": definition["icon"],
+            "completed": completed,
+            "completion_date": progress.achievement_dates.get(definition["id"]) if completed else None
         })
+    return entries
+
+def achievements_section(user_id: str, progress: ProgressRecord) -> Dict:
+    if check_achievements(user_id, progress):
+        persist_progress(user_id)
     
-    achievements_by_type = {
-        "streak": [],
-        "tasks": [],
-        "notes": []
-    }
+    achievements_list = achievement_entries(progress)
+    
+    achievements_by_type = {achievement_type: [] for achievement_type in achievement_engine.types}
     
     for achievement in achievements_list:
         if achievement["type"] in achievements_by_type:
@@ -1229,6 +1865,167 @@ async def get_user_achievements(user_id: str):
         "total_available": len(achievements_list)
     }
 
+@app.get("/api/events/{user_id}")
+async def stream_events(request: Request, user_id: str):
+    # Server-Sent Events: task_completed, streak_changed, achievement_unlocked
+    # and note_liked, plus resync when events were missed and the client
+    # should refetch. Browsers resend Last-Event-ID when they reconnect.
+    last_event_id = request.headers.get("last-event-id")
+    
+    async def stream():
+        subscription = event_hub.subscribe(user_id, last_event_id)
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                event = await subscription.next(EVENT_KEEPALIVE_SECONDS)
+                yield event.sse if event is not None else b": keepalive\n\n"
+        finally:
+            event_hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/events/{user_id}/ws")
+async def event_socket(websocket: WebSocket, user_id: str, last_event_id: Optional[str] = None):
+    # The same events as JSON messages, for clients that prefer a socket.
+    # Messages from the client are ignored; reading them is how a close is
+    # noticed while the socket is idle.
+    await websocket.accept()
+    subscription = event_hub.subscribe(user_id, last_event_id)
+    
+    async def watch_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        subscription.close()
+    
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        while True:
+            event = await subscription.next(EVENT_KEEPALIVE_SECONDS)
+            if subscription.closed:
+                break
+            await websocket.send_text(event.message if event is not None else '{"event":"keepalive"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        event_hub.unsubscribe(subscription)
+
+DASHBOARD_SECTIONS = ("tasks", "progress", "achievements", "note", "quote")
+
+@app.get("/api/dashboard/{user_id}")
+async def get_dashboard(user_id: str, sections: Optional[str] = None):
+    # Everything the app shows on launch in one round trip. The day rollover
+    # and streak check run once and every section reads the same progress.
+    requested = DASHBOARD_SECTIONS if not sections else [section.strip() for section in sections.split(",") if section.strip()]
+    unknown = [section for section in requested if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown sections: {', '.join(unknown)}. Available: {', '.join(DASHBOARD_SECTIONS)}"
+        )
+    
+    progress = get_progress(user_id)
+    dashboard = {"user_id": user_id}
+    
+    # Tasks first: a new user's starter tasks change today's counters.
+    if "tasks" in requested:
+        section = tasks_section(user_id, progress)
+        section["tasks"] = [task.model_dump(mode="json") for task in section["tasks"]]
+        dashboard["tasks"] = section
+    if "progress" in requested:
+        dashboard["progress"] = progress_section(user_id, progress)
+    if "achievements" in requested:
+        dashboard["achievements"] = achievements_section(user_id, progress)
+    if "note" in requested:
+        # Sharded, this samples the shard's own notes; the shared feed is
+        # still /api/notes/random on the pool.
+        dashboard["note"] = (note_registry.sample(user_id) or default_note()).model_dump(mode="json")
+    if "quote" in requested:
+        dashboard["quote"] = random.choice(MOTIVATIONAL_QUOTES).model_dump(mode="json")
+    
+    # Every section is plain JSON data by now; encoding it directly skips
+    # FastAPI's recursive jsonable_encoder, which is most of the cost of
+    # answering the separate endpoints.
+    return Response(content=encode_json(dashboard), media_type="application/json")
+
+def task_counts() -> List:
+    counts = [len(index) for index in user_tasks.values()]
+    return [
+        ({"stat": "total"}, sum(counts)),
+        ({"stat": "max_per_user"}, max(counts, default=0)),
+        ({"stat": "mean_per_user"}, sum(counts) / len(counts) if counts else 0.0),
+    ]
+
+def cache_stats() -> Dict[str, Dict]:
+    return {
+        "recommendations": recommendation_cache.stats(),
+        "struggle_classifier": struggle_classifier.cache.stats(),
+    }
+
+metrics_registry.gauge("mindflow_users", "Users known to each store.", lambda: [
+    ({"store": "progress"}, len(user_progress)),
+    ({"store": "assessments"}, len(user_assessments)),
+    ({"store": "tasks"}, len(user_tasks)),
+])
+metrics_registry.gauge("mindflow_tasks", "Stored tasks.", task_counts)
+metrics_registry.gauge("mindflow_task_templates", "Distinct task contents the stored tasks refer to.", lambda: len(task_templates))
+metrics_registry.gauge("mindflow_completion_history", "Completion history rows, and the users they belong to.", lambda: [
+    ({"stat": "rows"}, len(completion_history)),
+    ({"stat": "users"}, len(completion_history.names["user"])),
+])
+metrics_registry.gauge("mindflow_notes", "Stored notes, and the user notes shared to the random feed.", lambda: [
+    ({"scope": "all"}, len(note_registry)),
+    ({"scope": "public"}, len(note_registry.public[None])),
+])
+metrics_registry.gauge("mindflow_likes", "Likes across all notes.", lambda: sum(
+    stats.total_likes for stats in note_registry.stats.values()
+))
+metrics_registry.gauge("mindflow_cache_entries", "Entries held by each cache.", lambda: [
+    ({"cache": name}, stats["size"]) for name, stats in cache_stats().items()
+])
+for field in ("hits", "misses", "evictions"):
+    metrics_registry.gauge(f"mindflow_cache_{field}_total", f"Cache {field}.", lambda field=field: [
+        ({"cache": name}, stats[field]) for name, stats in cache_stats().items()
+    ], kind="counter")
+metrics_registry.gauge("mindflow_cache_hit_ratio", "Hits over lookups since start.", lambda: [
+    ({"cache": name}, stats["hit_rate"]) for name, stats in cache_stats().items()
+])
+metrics_registry.gauge("mindflow_event_subscribers", "Open event streams and sockets.", lambda: len(event_hub))
+metrics_registry.gauge("mindflow_events_published_total", "Events published to users with a stream.",
+                       lambda: event_hub.published, kind="counter")
+metrics_registry.gauge("mindflow_rate_limit_buckets", "Token buckets currently tracked.", lambda: len(rate_limit_buckets))
+metrics_registry.gauge("mindflow_user_locks", "Users with a mutation in flight or queued.", lambda: len(user_locks))
+metrics_registry.gauge("mindflow_storage_pending_ops", "Writes waiting for the background writer.", lambda: storage.pending_count)
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+def check_profile_access(request: Request) -> ProfileStore:
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if PROFILE_TOKEN and not hmac.compare_digest(
+        request.headers.get(PROFILE_HEADER.decode("latin-1"), ""), PROFILE_TOKEN
+    ):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+    return profile_store
+
+@app.get("/debug/profiles")
+async def list_profiles(request: Request, limit: int = Query(50, ge=1, le=500)):
+    return {"profiles": check_profile_access(request).recent(limit)}
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    path = check_profile_access(request).path_for(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if path.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
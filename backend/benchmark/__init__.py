@@ -0,0 +1,24 @@
+"""Load benchmark that replays a day in the life of many users.
+
+    cd backend
+    python -m benchmark --users 500 --concurrency 50
+    python -m benchmark --users 500 --save-baseline
+    python -m benchmark --users 500 --uvicorn
+
+By default the app runs in-process behind httpx's ASGI transport; --uvicorn
+starts a local server and --url targets one that is already running. The
+run fails (exit status 1) when a request errors or when latency or
+throughput regress past --threshold against the stored baseline. No
+baseline is committed, since timings are per machine: a run without one, or
+with one recorded under other options, fails until --save-baseline records
+it (--no-baseline just reports).
+
+    python -m benchmark.memory --users 1000 100000 1000000
+
+measures resident memory per user, one fresh interpreter per population.
+
+    python -m benchmark.cluster --shards 1 4
+
+runs the same day against run_cluster.py with each shard count and prints
+the throughput next to the single-shard run.
+"""
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .config import BACKEND_DIR, BENCHMARK_ENV
+from .clients import drive, run_clients
+from .report import LatencyRecorder, compare, format_summary, load_baseline, save_baseline
+
+# Next to the rest of the machine-local state, which git ignores.
+DEFAULT_BASELINE = os.path.join(
+    os.environ.get("MINDFLOW_STATE_DIR", os.path.join(BACKEND_DIR, "state")), "benchmark-baseline.json"
+)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Replay a user day against the backend.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="users active at the same time")
+    parser.add_argument("--polls", type=int, default=4, help="task/progress polls before each completion")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's steps")
+    parser.add_argument("--seed", type=int, default=1)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="benchmark a server that is already running")
+    target.add_argument("--uvicorn", action="store_true", help="start a local uvicorn server and benchmark it")
+    parser.add_argument("--port", type=int, default=8765, help="port for --uvicorn")
+    parser.add_argument("--clients", type=int, default=1,
+                        help="client processes for --url/--uvicorn; one Python client saturates well before the server")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    baseline = parser.add_mutually_exclusive_group()
+    baseline.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    baseline.add_argument("--no-baseline", action="store_true", help="report only, without comparing to a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore latency changes smaller than this")
+    return parser.parse_args(argv)
+
+
+def run_config(args: argparse.Namespace, mode: str) -> dict:
+    # Runs are only comparable when they did the same work the same way.
+    return {"mode": mode, "users": args.users, "concurrency": args.concurrency,
+            "polls": args.polls, "think_ms": args.think_ms, "clients": args.clients if mode != "asgi" else 1}
+
+
+async def run_in_process(args: argparse.Namespace, recorder: LatencyRecorder) -> None:
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+    from assessment_api import app
+
+    # The ASGI transport does not send lifespan events, so run them here.
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await drive(client, args, recorder, "bench")
+    finally:
+        await app.router.shutdown()
+
+
+def start_uvicorn(port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "assessment_api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**BENCHMARK_ENV, **os.environ},
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited before it was ready")
+        try:
+            if httpx.get(url + "/api/assessment/questions").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_uvicorn(process)
+    raise RuntimeError("uvicorn did not start within 30 seconds")
+
+
+def stop_uvicorn(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if args.uvicorn:
+        mode = "uvicorn"
+        server = start_uvicorn(args.port)
+        try:
+            recorder = run_clients(f"http://127.0.0.1:{args.port}", args)
+        finally:
+            stop_uvicorn(server)
+    elif args.url:
+        mode = "url"
+        recorder = run_clients(args.url.rstrip("/"), args)
+    else:
+        mode = "asgi"
+        recorder = LatencyRecorder()
+        asyncio.run(run_in_process(args, recorder))
+
+    summary = recorder.summary()
+    config = run_config(args, mode)
+    # Latencies depend on the machine, so no baseline ships with the repo:
+    # record one with --save-baseline before comparing against it.
+    failed = False
+    baseline = None
+    if not (args.save_baseline or args.no_baseline):
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"FAIL: no baseline at {args.baseline}; record one with --save-baseline "
+                  f"(same options as this run) or pass --no-baseline.")
+            failed = True
+        elif baseline.get("config") != config:
+            print(f"FAIL: baseline {args.baseline} was recorded with {baseline.get('config')}, this run is {config}; "
+                  f"rerun with those options, record a new baseline with --save-baseline or pass --no-baseline.")
+            baseline = None
+            failed = True
+
+    print(format_summary(summary, baseline))
+
+    if summary["errors"]:
+        print(f"FAIL: {summary['errors']} failed requests: {recorder.errors}")
+        failed = True
+    if baseline is not None:
+        regressions = compare(summary, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+
+    if args.save_baseline and not failed:
+        save_baseline(args.baseline, summary, config)
+        print(f"Saved baseline to {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import concurrent.futures
+import time
+
+import httpx
+
+from .report import LatencyRecorder
+from .scenario import Session, run_population
+
+
+async def run_against(url: str, args: argparse.Namespace, recorder: LatencyRecorder, prefix: str) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=30.0, limits=limits) as client:
+        await drive(client, args, recorder, prefix)
+
+
+def run_client(url: str, args: argparse.Namespace, index: int, prefix: str) -> LatencyRecorder:
+    # One client process's share of the population.
+    share = argparse.Namespace(**vars(args))
+    share.users = len(range(index, args.users, args.clients))
+    share.concurrency = max(1, args.concurrency // args.clients)
+    share.seed = args.seed * 1000 + index
+    recorder = LatencyRecorder()
+    asyncio.run(run_against(url, share, recorder, f"{prefix}-{index}"))
+    return recorder
+
+
+def run_clients(url: str, args: argparse.Namespace) -> LatencyRecorder:
+    # A live server keeps earlier runs' users, so each run gets fresh ids.
+    prefix = f"bench-{int(time.time())}"
+    if args.clients <= 1:
+        return run_client(url, args, 0, prefix)
+    with concurrent.futures.ProcessPoolExecutor(args.clients) as pool:
+        parts = list(pool.map(run_client, [url] * args.clients, [args] * args.clients, range(args.clients),
+                              [prefix] * args.clients))
+    return LatencyRecorder.merge(parts)
+
+
+async def drive(client: httpx.AsyncClient, args: argparse.Namespace, recorder: LatencyRecorder, prefix: str) -> None:
+    session = Session(client, recorder, think_time=args.think_ms / 1000)
+    recorder.started = time.perf_counter()
+    await run_population(session, args.users, args.concurrency, args.polls, args.seed, prefix=prefix)
+    recorder.finish()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .clients import run_clients
+from .config import BACKEND_DIR, BENCHMARK_ENV
+
+DEFAULT_SHARDS = (1, os.cpu_count() or 2)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark.cluster",
+        description="Replay the same user day against run_cluster.py with different shard counts.",
+    )
+    parser.add_argument("--shards", type=int, nargs="+", default=sorted(set(DEFAULT_SHARDS)))
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100, help="users active at the same time")
+    parser.add_argument("--polls", type=int, default=4, help="task/progress polls before each completion")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's steps")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=max(DEFAULT_SHARDS),
+                        help="client processes; one Python client saturates well before a cluster")
+    parser.add_argument("--port", type=int, default=8800, help="router port; the pool and shards use the ports after it")
+    return parser.parse_args(argv)
+
+
+def start_cluster(shards: int, port: int, state_dir: str) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "run_cluster.py", "--shards", str(shards), "--port", str(port),
+         "--base-port", str(port + 1), "--state-dir", state_dir],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **BENCHMARK_ENV},
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("run_cluster.py exited before it was ready")
+        try:
+            # Through the router to a shard, so both are up.
+            if httpx.get(url + "/api/assessment/questions").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_cluster(process)
+    raise RuntimeError("the cluster did not start within 60 seconds")
+
+
+def stop_cluster(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    print(f"{args.users} users, {args.concurrency} at a time, {args.clients} client processes, "
+          f"{os.cpu_count()} cores")
+    print(f"{'shards':>6}  {'requests':>8}  {'errors':>6}  {'seconds':>8}  {'req/s':>8}  {'speedup':>7}")
+    failed = False
+    first = None
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory(prefix="mindflow-cluster-") as state_dir:
+            cluster = start_cluster(shards, args.port, state_dir)
+            try:
+                summary = run_clients(f"http://127.0.0.1:{args.port}", args).summary()
+            finally:
+                stop_cluster(cluster)
+        first = first or summary["throughput_rps"]
+        speedup = summary["throughput_rps"] / first if first else 0.0
+        print(f"{shards:>6}  {summary['requests']:>8}  {summary['errors']:>6}  {summary['seconds']:>8.2f}  "
+              f"{summary['throughput_rps']:>8.1f}  {speedup:>6.2f}x")
+        failed = failed or bool(summary["errors"])
+    if failed:
+        print("FAIL: some requests failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
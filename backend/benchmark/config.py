@@ -0,0 +1,7 @@
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One client address drives every simulated user, so the per-IP limits
+# would throttle the run; persistence is off unless asked for.
+BENCHMARK_ENV = {"MINDFLOW_STORAGE": "memory", "MINDFLOW_RATE_LIMITS": "0"}
@@ -0,0 +1,95 @@
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from .config import BACKEND_DIR, BENCHMARK_ENV
+
+DEFAULT_POPULATIONS = (1_000, 100_000, 1_000_000)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark.memory", description="Measure resident memory per user of a populated backend."
+    )
+    parser.add_argument("--users", type=int, nargs="+", default=list(DEFAULT_POPULATIONS))
+    parser.add_argument("--measure", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def resident_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs: the peak is the best there is. ru_maxrss is in KiB on
+        # Linux and in bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(users: int) -> dict:
+    # Every user looks at today's tasks once: a progress record, the three
+    # starter tasks, and what storage keeps of both. This is the state every
+    # new user leaves behind, and most users never do more.
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+    import assessment_api as api
+
+    gc.collect()
+    before = resident_bytes()
+    start = time.perf_counter()
+    gc.disable()
+    try:
+        for index in range(users):
+            user_id = f"memory-{index}"
+            api.today_tasks(user_id, api.get_progress(user_id))
+            if index % 10_000 == 0:
+                # What the storage writer would have drained by now.
+                api.storage.flush()
+    finally:
+        gc.enable()
+    api.storage.flush()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    used = resident_bytes() - before
+    return {"users": users, "bytes": used, "bytes_per_user": round(used / users), "seconds": round(seconds, 2)}
+
+
+def run(users: int) -> dict:
+    # A fresh interpreter per population, so one run's freed arenas don't
+    # flatter the next.
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmark.memory", "--measure", str(users)],
+        cwd=BACKEND_DIR, env={**BENCHMARK_ENV, **os.environ}, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        reason = "killed, out of memory?" if process.returncode < 0 else process.stderr.strip().splitlines()[-1:]
+        return {"users": users, "error": reason}
+    return json.loads(process.stdout)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return 0
+
+    print(f"{'users':>10}  {'resident':>12}  {'bytes/user':>10}  {'seconds':>8}")
+    failed = False
+    for users in args.users:
+        result = run(users)
+        if "error" in result:
+            print(f"{users:>10}  {result['error']}")
+            failed = True
+            continue
+        print(f"{users:>10}  {result['bytes'] / 2**20:>9.1f} MiB  {result['bytes_per_user']:>10}  {result['seconds']:>8.2f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
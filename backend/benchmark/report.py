@@ -0,0 +1,130 @@
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyRecorder:
+    # Raw samples per endpoint label, in seconds. A day of a few thousand
+    # users is well under a million samples, so there is no need to bucket.
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, label: str, seconds: float) -> None:
+        self.samples.setdefault(label, []).append(seconds)
+
+    def error(self, label: str) -> None:
+        self.errors[label] = self.errors.get(label, 0) + 1
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    @classmethod
+    def merge(cls, recorders: List["LatencyRecorder"]) -> "LatencyRecorder":
+        # perf_counter is system-wide on the platforms we run on, so the
+        # client processes' start and finish times are comparable.
+        merged = cls()
+        for recorder in recorders:
+            for label, samples in recorder.samples.items():
+                merged.samples.setdefault(label, []).extend(samples)
+            for label, count in recorder.errors.items():
+                merged.errors[label] = merged.errors.get(label, 0) + count
+        merged.started = min(recorder.started for recorder in recorders)
+        merged.finished = max(recorder.finished or recorder.started for recorder in recorders)
+        return merged
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        total = sum(len(samples) for samples in self.samples.values())
+        endpoints = {}
+        for label, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            endpoints[label] = {"count": len(ordered)}
+            for p in PERCENTILES:
+                endpoints[label][f"p{p}_ms"] = round(percentile(ordered, p) * 1000, 3)
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    # Nearest-rank on an already sorted list.
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    # A latency regression has to be both relatively (threshold) and
+    # absolutely (min_delta_ms) worse, so sub-millisecond jitter on fast
+    # endpoints does not fail a run.
+    regressions = []
+    for label, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if before is None:
+            continue
+        for p in PERCENTILES:
+            key = f"p{p}_ms"
+            old, new = before[key], stats[key]
+            if new > old * (1 + threshold) and new - old > min_delta_ms:
+                regressions.append(f"{label} {key}: {old:.3f} -> {new:.3f}")
+
+    old_rps = baseline.get("throughput_rps")
+    if old_rps and current["throughput_rps"] < old_rps * (1 - threshold):
+        regressions.append(f"throughput: {old_rps:.1f} -> {current['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def format_summary(summary: dict, baseline: Optional[dict] = None) -> str:
+    width = max([len(label) for label in summary["endpoints"]] + [8])
+    cell_width = 17 if baseline else 9
+    lines = [f"{'endpoint':<{width}}  {'count':>7}" + "".join(f"  {f'p{p} ms':>{cell_width}}" for p in PERCENTILES)]
+    for label, stats in summary["endpoints"].items():
+        row = f"{label:<{width}}  {stats['count']:>7}"
+        before = (baseline or {}).get("endpoints", {}).get(label)
+        for p in PERCENTILES:
+            key = f"p{p}_ms"
+            cell = f"{stats[key]:.3f}"
+            if before:
+                cell += f" ({_change(before[key], stats[key])})"
+            row += f"  {cell:>{cell_width}}"
+        lines.append(row)
+    lines.append(
+        f"{summary['requests']} requests, {summary['errors']} errors in {summary['seconds']:.2f}s: "
+        f"{summary['throughput_rps']:.1f} req/s"
+        + (f" ({_change(baseline['throughput_rps'], summary['throughput_rps'])})" if baseline else "")
+    )
+    return "\n".join(lines)
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path: str, summary: dict, config: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump({**summary, "config": config}, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "new"
+    return f"{(new - old) / old * 100:+.0f}%"
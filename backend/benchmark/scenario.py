@@ -0,0 +1,129 @@
+import asyncio
+import random
+import time
+from datetime import date
+from typing import List, Optional
+
+import httpx
+
+from .report import LatencyRecorder
+
+STRUGGLES = [
+    "I keep procrastinating on everything and feel behind at work",
+    "I can't sleep well and wake up tired every single morning",
+    "Feeling lonely since moving to a new city, hard to meet people",
+    "Too much screen time, I scroll my phone for hours at night",
+    "Anxious before meetings and my thoughts keep racing",
+    "My desk and room are a mess and it stresses me out",
+    "I skip workouts and feel sluggish the whole afternoon",
+    "Overwhelmed by exams and deadlines piling up this month",
+]
+
+NOTES = [
+    "Small steps every day still count as progress.",
+    "Took a walk at lunch and it cleared my head completely.",
+    "Be as kind to yourself as you are to your friends.",
+    "Drank water before coffee today and felt better for it.",
+    "Wrote down three good things from today before bed.",
+]
+
+
+class Session:
+    # One client plus the recorder; every request goes through call() so it
+    # is timed under its route template rather than the concrete path.
+
+    def __init__(self, client: httpx.AsyncClient, recorder: LatencyRecorder, think_time: float = 0.0):
+        self.client = client
+        self.recorder = recorder
+        self.think_time = think_time
+
+    async def call(self, label: str, method: str, path: str, ok=(200,), **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.error(label)
+            return None
+        self.recorder.record(label, time.perf_counter() - start)
+        if response.status_code not in ok:
+            self.recorder.error(label)
+            return None
+        return response
+
+    async def pause(self) -> None:
+        if self.think_time:
+            await asyncio.sleep(self.think_time)
+
+
+async def user_day(session: Session, user_id: str, question_ids: List[int], rng: random.Random, polls: int) -> None:
+    # Assessment, struggle, pick tasks, then poll tasks and progress between
+    # completions, share a note and like someone else's, and finish with the
+    # midnight refresh.
+    responses = [{"question_id": qid, "rating": rng.randint(1, 10)} for qid in question_ids]
+    if not await session.call("POST /api/assessment/submit", "POST", "/api/assessment/submit", json={
+        "user_id": user_id, "responses": responses, "timestamp": "",
+    }):
+        return
+    await session.pause()
+
+    response = await session.call(
+        "POST /api/assessment/{user_id}/struggle", "POST", f"/api/assessment/{user_id}/struggle",
+        json={"description": rng.choice(STRUGGLES)},
+    )
+    if response is None:
+        return
+    recommendations = response.json()["recommendations"]
+    await session.pause()
+
+    picked = recommendations[:3]
+    await session.call("POST /api/tasks/{user_id}/select", "POST", f"/api/tasks/{user_id}/select", json={
+        "user_id": user_id,
+        "task_ids": [task["task_id"] for task in picked],
+        "selected_date": date.today().isoformat(),
+        "task_details": picked,
+    })
+
+    response = await session.call("GET /api/tasks/{user_id}", "GET", f"/api/tasks/{user_id}")
+    task_ids = [task["task_id"] for task in response.json()["tasks"]] if response else []
+    for task_id in task_ids:
+        for index in range(polls):
+            await session.pause()
+            if index % 2:
+                await session.call("GET /api/progress/{user_id}", "GET", f"/api/progress/{user_id}")
+            else:
+                await session.call("GET /api/tasks/{user_id}", "GET", f"/api/tasks/{user_id}")
+        await session.call(
+            "POST /api/tasks/{user_id}/complete/{task_id}", "POST", f"/api/tasks/{user_id}/complete/{task_id}"
+        )
+
+    await session.pause()
+    await session.call("POST /api/notes/daily", "POST", "/api/notes/daily", json={
+        "user_id": user_id, "message": rng.choice(NOTES), "category": "motivation", "is_public": True,
+    })
+    response = await session.call("GET /api/notes/random", "GET", "/api/notes/random", params={"user_id": user_id})
+    note = response.json() if response else None
+    if note and note.get("note_id"):
+        await session.call(
+            "POST /api/notes/{note_id}/like", "POST", f"/api/notes/{note['note_id']}/like", params={"user_id": user_id}
+        )
+
+    await session.pause()
+    await session.call("POST /api/tasks/{user_id}/refresh-day", "POST", f"/api/tasks/{user_id}/refresh-day")
+
+
+async def run_population(
+    session: Session, users: int, concurrency: int, polls: int, seed: int, prefix: str = "bench"
+) -> None:
+    response = await session.call("GET /api/assessment/questions", "GET", "/api/assessment/questions")
+    if response is None:
+        raise RuntimeError("Could not load the assessment questions")
+    question_ids = [question["id"] for question in response.json()["questions"]]
+
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, user_rng: random.Random) -> None:
+        async with semaphore:
+            await user_day(session, f"{prefix}-{index}", question_ids, user_rng, polls)
+
+    await asyncio.gather(*[one(index, random.Random(rng.random())) for index in range(users)])
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .config import BACKEND_DIR, BENCHMARK_ENV
+
+DEFAULT_USERS = 100_000
+# "Well under a second" for 100k users; the default leaves room for slow CI boxes.
+DEFAULT_BUDGET = 1.0
+# Users whose changes are left in the journal after the last snapshot.
+TAIL_SHARE = 10
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark.startup",
+        description="Time a cold start: app setup, then the latest snapshot plus the writes made after it.",
+    )
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--storage", choices=("journal", "sqlite"), default="journal")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds a start may take")
+    parser.add_argument("--repeat", type=int, default=5, help="starts to time; the fastest counts")
+    parser.add_argument("--fill", metavar="STATE_DIR", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", metavar="STATE_DIR", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def import_app(state_dir: str, storage: str):
+    os.environ.update(BENCHMARK_ENV)
+    os.environ.update(MINDFLOW_STORAGE=storage, MINDFLOW_STATE_DIR=state_dir)
+    import assessment_api
+    return assessment_api
+
+
+def fill(state_dir: str, storage: str, users: int) -> None:
+    # Every user has today's starter tasks; every fourth finished them. The
+    # state is compacted into a snapshot, then a tenth of the users complete
+    # one more task, which only reaches the journal.
+    api = import_app(state_dir, storage)
+
+    async def complete(user_ids, task_ids):
+        for user_id in user_ids:
+            for task_id in task_ids:
+                await api.complete_task(user_id, task_id)
+
+    api.load_state()
+    gc.disable()
+    try:
+        user_ids = [f"startup-{index}" for index in range(users)]
+        for user_id in user_ids:
+            api.today_tasks(user_id, api.get_progress(user_id))
+        asyncio.run(complete(user_ids[::4], (1, 2, 3)))
+        api.storage.flush(compact=True)
+        asyncio.run(complete(user_ids[1::TAIL_SHARE], (1,)))
+        api.storage.flush()
+    finally:
+        gc.enable()
+    api.storage.backend.close()
+
+
+def measure(state_dir: str, storage: str) -> dict:
+    # The libraries the app imports take as long with no users as with a
+    # million, so they are loaded before the clock starts. What is timed is
+    # everything a start does on top: the module's own setup (catalog,
+    # classifier, scorer) and restoring the state before serving.
+    import fastapi.testclient  # noqa: F401
+    import httpx  # noqa: F401
+    import numpy  # noqa: F401
+    start = time.perf_counter()
+    api = import_app(state_dir, storage)
+    imported = time.perf_counter()
+    api.restore_state()
+    end = time.perf_counter()
+    return {"users": len(api.user_progress), "seconds": end - start, "setup": imported - start}
+
+
+def run(args: argparse.Namespace, *extra: str) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmark.startup", "--storage", args.storage, *extra],
+        cwd=BACKEND_DIR, env={**os.environ, **BENCHMARK_ENV}, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or f"exit status {process.returncode}")
+    return json.loads(process.stdout) if process.stdout.strip() else {}
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.fill:
+        fill(args.fill, args.storage, args.users)
+        return 0
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.storage)))
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix="mindflow-startup-") as state_dir:
+        run(args, "--users", str(args.users), "--fill", state_dir)
+        # A fresh interpreter per start, as a restarted server would be.
+        results = [run(args, "--measure", state_dir) for _ in range(max(1, args.repeat))]
+
+    seconds = min(result["seconds"] for result in results)
+    runs = ", ".join(f"{result['seconds']:.3f}" for result in results)
+    print(f"{results[0]['users']} users, {args.storage}: start in {seconds:.3f} s "
+          f"(runs: {runs}; budget {args.budget:.3f} s)")
+    if results[0]["users"] != args.users:
+        print(f"FAIL: expected {args.users} users after the start")
+        return 1
+    if seconds > args.budget:
+        print(f"FAIL: start took {seconds:.3f} s, over the {args.budget:.3f} s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
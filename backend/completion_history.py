@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from storage import read_json_lines
+
+US_PER_DAY = 86_400_000_000
+INITIAL_CAPACITY = 1024
+ROLLUP_WEEKS = 8
+
+# One completion (delta 1) or undone completion (delta -1) as it is kept on
+# disk. In memory every field is its own column.
+RECORD = np.dtype([
+    ("user", "<u4"),
+    ("day", "<i4"),
+    ("completed_at", "<i8"),
+    ("category", "<u2"),
+    ("difficulty", "<u1"),
+    ("energy_level", "<u1"),
+    ("delta", "<i1"),
+])
+
+NAME_KINDS = ("user", "category", "difficulty")
+
+
+def week_of(day: int) -> int:
+    # Weeks start on Monday; epoch-day 0 was a Thursday.
+    return (day + 3) // 7
+
+
+def week_start(week: int) -> int:
+    return week * 7 - 3
+
+
+def linear_trend(values: np.ndarray) -> float:
+    # Least-squares slope, in units per step; flat for fewer than two points.
+    if len(values) < 2:
+        return 0.0
+    x = np.arange(len(values), dtype=np.float64)
+    x -= x.mean()
+    return float((x * (values - values.mean())).sum() / (x * x).sum())
+
+
+class WeeklyRollup:
+    # One user's completions summed per week: a weeks x categories count
+    # matrix, the energy levels of those completions and a weeks x
+    # difficulties count matrix. Row 0 is first_week; rows and category
+    # columns grow as they are needed.
+
+    __slots__ = ("first_week", "counts", "energy", "difficulty")
+
+    def __init__(self, week: int, categories: int, difficulties: int):
+        self.first_week = week
+        self.counts = np.zeros((ROLLUP_WEEKS, max(categories, 1)), dtype=np.int32)
+        self.energy = np.zeros(ROLLUP_WEEKS, dtype=np.int32)
+        self.difficulty = np.zeros((ROLLUP_WEEKS, max(difficulties, 1)), dtype=np.int32)
+
+    def add(self, week: int, category: int, difficulty: int, energy_level: int, delta: int) -> None:
+        if week < self.first_week:
+            self._grow(before=self.first_week - week)
+        row = week - self.first_week
+        if row >= len(self.energy) or category >= self.counts.shape[1] or difficulty >= self.difficulty.shape[1]:
+            self._grow(rows=row + 1, categories=category + 1, difficulties=difficulty + 1)
+        self.counts[row, category] += delta
+        self.energy[row] += energy_level * delta
+        self.difficulty[row, difficulty] += delta
+
+    def window(self, first_week: int, weeks: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Rows for first_week .. first_week + weeks - 1, zero where the user
+        # has no rows.
+        counts = np.zeros((weeks, self.counts.shape[1]), dtype=np.int32)
+        energy = np.zeros(weeks, dtype=np.int32)
+        difficulty = np.zeros((weeks, self.difficulty.shape[1]), dtype=np.int32)
+        start = max(first_week, self.first_week)
+        stop = min(first_week + weeks, self.first_week + len(self.energy))
+        if start < stop:
+            source = slice(start - self.first_week, stop - self.first_week)
+            target = slice(start - first_week, stop - first_week)
+            counts[target] = self.counts[source]
+            energy[target] = self.energy[source]
+            difficulty[target] = self.difficulty[source]
+        return counts, energy, difficulty
+
+    @classmethod
+    def from_rows(
+        cls, weeks: np.ndarray, categories: np.ndarray, difficulties: np.ndarray, energy: np.ndarray,
+        deltas: np.ndarray, category_count: int, difficulty_count: int,
+    ) -> "WeeklyRollup":
+        # The rollup that adding each row in turn would give, summed in one go.
+        first = int(weeks.min())
+        rollup = cls(first, category_count, difficulty_count)
+        rows = weeks - first
+        rollup._grow(rows=int(rows.max()) + 1, categories=int(categories.max()) + 1,
+                     difficulties=int(difficulties.max()) + 1)
+        deltas = deltas.astype(np.int32)
+        np.add.at(rollup.counts, (rows, categories), deltas)
+        np.add.at(rollup.energy, rows, energy.astype(np.int32) * deltas)
+        np.add.at(rollup.difficulty, (rows, difficulties), deltas)
+        return rollup
+
+    def _grow(self, before: int = 0, rows: int = 0, categories: int = 0, difficulties: int = 0) -> None:
+        length = len(self.energy)
+        after = max(0, rows - length)
+        if after:
+            after = max(after, length)
+        pad_categories = max(0, categories - self.counts.shape[1])
+        pad_difficulties = max(0, difficulties - self.difficulty.shape[1])
+        self.counts = np.pad(self.counts, ((before, after), (0, pad_categories)))
+        self.energy = np.pad(self.energy, (before, after))
+        self.difficulty = np.pad(self.difficulty, ((before, after), (0, pad_difficulties)))
+        self.first_week -= before
+
+
+class CompletionHistory:
+    # Append-only log of task completions in NumPy columns, with user,
+    # category and difficulty interned to small ints. Undoing a completion
+    # appends the same row with delta -1, so the log is never rewritten.
+    # Every row is also added to its user's WeeklyRollup as it is appended,
+    # so trends are read from the rollup and never from the log. Rows loaded
+    # from disk are summed into a user's rollup the first time that user is
+    # looked at, so a start doesn't build rollups for everyone.
+    #
+    # With a directory, rows are appended to completions.bin (RECORD
+    # records) and new names to names.jsonl by flush(), which the storage
+    # writer calls from its thread.
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros(INITIAL_CAPACITY, dtype=RECORD.fields[name][0]) for name in RECORD.names
+        }
+        self.count = 0
+        self.ids: Dict[str, Dict[str, int]] = {kind: {} for kind in NAME_KINDS}
+        self.names: Dict[str, List[str]] = {kind: [] for kind in NAME_KINDS}
+        self.rollups: Dict[int, WeeklyRollup] = {}
+        # Row numbers of the loaded rows ordered by user, and their users.
+        self._loaded_rows = np.zeros(0, dtype=np.int64)
+        self._loaded_users = np.zeros(0, dtype=RECORD.fields["user"][0])
+        self.lock = threading.Lock()
+        self._flushed = 0
+        self._new_names: List[Tuple[str, str]] = []
+        # Whether completions.bin exists: written once even when empty, so
+        # a backfill that found nothing doesn't run again on every start.
+        self._on_disk = False
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load(self) -> bool:
+        # Whether there was a history to load; without one the caller can
+        # backfill from whatever else it knows.
+        if self.directory is None:
+            return False
+        names_path = os.path.join(self.directory, "names.jsonl")
+        rows_path = os.path.join(self.directory, "completions.bin")
+        if not os.path.exists(rows_path):
+            return False
+        self._on_disk = True
+
+        if os.path.exists(names_path):
+            for kind, name in read_json_lines(names_path):
+                self._intern(kind, name, new=False)
+
+        with open(rows_path, "rb") as f:
+            raw = f.read()
+        usable = len(raw) - len(raw) % RECORD.itemsize
+        if usable != len(raw):
+            # Drop a torn final record so later appends stay aligned.
+            with open(rows_path, "r+b") as f:
+                f.truncate(usable)
+        records = np.frombuffer(raw[:usable], dtype=RECORD)
+        # Names are written before the rows that use them, but be safe.
+        records = records[
+            (records["user"] < len(self.names["user"]))
+            & (records["category"] < len(self.names["category"]))
+            & (records["difficulty"] < len(self.names["difficulty"]))
+        ]
+        self._reserve(len(records))
+        for name in RECORD.names:
+            self.columns[name][:len(records)] = records[name]
+        self.count = self._flushed = len(records)
+        self._loaded_rows = np.argsort(records["user"], kind="stable")
+        self._loaded_users = records["user"][self._loaded_rows]
+        return True
+
+    def append(
+        self, user_id: str, completed_at: int, category: str, difficulty: str, energy_level: int, delta: int = 1
+    ) -> None:
+        day = completed_at // US_PER_DAY
+        with self.lock:
+            user = self._intern("user", user_id)
+            category_id = self._intern("category", category)
+            difficulty_id = self._intern("difficulty", difficulty)
+            self._reserve(self.count + 1)
+            row = self.count
+            self.columns["user"][row] = user
+            self.columns["day"][row] = day
+            self.columns["completed_at"][row] = completed_at
+            self.columns["category"][row] = category_id
+            self.columns["difficulty"][row] = difficulty_id
+            self.columns["energy_level"][row] = energy_level
+            self.columns["delta"][row] = delta
+            self.count += 1
+        self._rollup(user, day).add(week_of(day), category_id, difficulty_id, energy_level, delta)
+
+    def extend(self, completions: Sequence[Tuple[str, int, str, str, int]]) -> None:
+        for user_id, completed_at, category, difficulty, energy_level in completions:
+            self.append(user_id, completed_at, category, difficulty, energy_level)
+
+    def weekly(
+        self, user_id: str, first_week: int, weeks: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # (weeks x categories counts, energy sums, weeks x difficulties
+        # counts) for the window, or None for a user without completions.
+        user = self.ids["user"].get(user_id)
+        rollup = self._existing_rollup(user) if user is not None else None
+        if rollup is None:
+            return None
+        return rollup.window(first_week, weeks)
+
+    def category_names(self) -> List[str]:
+        return self.names["category"]
+
+    def difficulty_names(self) -> List[str]:
+        return self.names["difficulty"]
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        with self.lock:
+            names, self._new_names = self._new_names, []
+            start, stop = self._flushed, self.count
+            records = np.empty(stop - start, dtype=RECORD)
+            for name in RECORD.names:
+                records[name] = self.columns[name][start:stop]
+            self._flushed = stop
+        if not names and not len(records) and self._on_disk:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if names:
+            with open(os.path.join(self.directory, "names.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps([kind, name], ensure_ascii=False) + "\n" for kind, name in names))
+        with open(os.path.join(self.directory, "completions.bin"), "ab") as f:
+            f.write(records.tobytes())
+        self._on_disk = True
+
+    def _intern(self, kind: str, name: str, new: bool = True) -> int:
+        ids = self.ids[kind]
+        index = ids.get(name)
+        if index is None:
+            index = ids[name] = len(self.names[kind])
+            self.names[kind].append(name)
+            if new:
+                self._new_names.append((kind, name))
+        return index
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self.columns["user"])
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.columns[name] = grown
+
+    def _rollup(self, user: int, day: int) -> WeeklyRollup:
+        rollup = self._existing_rollup(user)
+        if rollup is None:
+            rollup = self.rollups[user] = WeeklyRollup(
+                week_of(day), len(self.names["category"]), len(self.names["difficulty"])
+            )
+        return rollup
+
+    def _existing_rollup(self, user: int) -> Optional[WeeklyRollup]:
+        rollup = self.rollups.get(user)
+        if rollup is not None:
+            return rollup
+        start, stop = np.searchsorted(self._loaded_users, (user, user + 1))
+        if start == stop:
+            return None
+        rows = self._loaded_rows[start:stop]
+        columns = self.columns
+        rollup = self.rollups[user] = WeeklyRollup.from_rows(
+            week_of(columns["day"][rows]), columns["category"][rows], columns["difficulty"][rows],
+            columns["energy_level"][rows], columns["delta"][rows],
+            len(self.names["category"]), len(self.names["difficulty"]),
+        )
+        return rollup
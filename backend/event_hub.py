@@ -0,0 +1,171 @@
+import asyncio
+import json
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+BUFFER_SIZE = 64
+HISTORY_SIZE = 32
+MAX_HISTORY_USERS = 10_000
+
+RESYNC = "resync"
+
+
+class Event:
+    # Encoded once when published, however many connections it goes to.
+
+    __slots__ = ("seq", "id", "event", "data", "sse", "message")
+
+    def __init__(self, seq: int, event_id: str, event: str, data: dict):
+        self.seq = seq
+        self.id = event_id
+        self.event = event
+        self.data = data
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self.sse = f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+        self.message = json.dumps({"id": event_id, "event": event, "data": data}, ensure_ascii=False, separators=(",", ":"))
+
+
+class Subscription:
+    # One open connection: a bounded buffer and, while the connection waits,
+    # one future. An idle subscriber is these few slots and nothing else.
+
+    __slots__ = ("user_id", "pending", "waiter", "closed")
+
+    def __init__(self, user_id: str, buffer_size: int):
+        self.user_id = user_id
+        self.pending: Deque[Event] = deque(maxlen=buffer_size)
+        self.waiter: Optional[asyncio.Future] = None
+        self.closed = False
+
+    def deliver(self, event: Event) -> None:
+        if len(self.pending) == self.pending.maxlen:
+            # Too slow to keep up: drop what it has and tell it to refetch.
+            # The refetched state includes this event, so a reconnect
+            # resumes after it.
+            self.pending.clear()
+            event = resync_event(self.user_id, event.seq, event.id)
+        self.pending.append(event)
+        self._wake()
+
+    def close(self) -> None:
+        # The connection went away; a pending next() returns None.
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        # The next event, or None once timeout passes without one (time for
+        # a keepalive) or the subscription is closed.
+        if not self.pending and not self.closed:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.waiter = None
+        return self.pending.popleft() if self.pending and not self.closed else None
+
+
+class EventHub:
+    # In-process fan-out of per-user events to open SSE and WebSocket
+    # connections. Publishing never awaits: each subscriber gets the event
+    # appended to its buffer and its waiter woken.
+    #
+    # The last few events of every user who has connected are kept, so a
+    # client that reconnects with Last-Event-ID gets what it missed. When
+    # that is no longer possible (restart, history overflow) it gets a resync
+    # event and refetches its state instead.
+
+    def __init__(
+        self,
+        buffer_size: int = BUFFER_SIZE,
+        history_size: int = HISTORY_SIZE,
+        max_history_users: int = MAX_HISTORY_USERS,
+    ):
+        self.buffer_size = buffer_size
+        self.history_size = history_size
+        self.max_history_users = max_history_users
+        self.instance = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        # user -> (recent events, seq of the newest event no longer in them)
+        self.history: "OrderedDict[str, Tuple[Deque[Event], int]]" = OrderedDict()
+        self.published = 0
+
+    def __len__(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(user_id, self.buffer_size)
+        for event in self.replay(user_id, last_event_id):
+            subscription.deliver(event)
+        self.subscribers.setdefault(user_id, set()).add(subscription)
+        self._history_for(user_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self.subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: str, data: dict) -> int:
+        subscriptions = self.subscribers.get(user_id)
+        history = self.history.get(user_id)
+        if not subscriptions and history is None:
+            # Nobody is listening and nobody has been: nothing to keep.
+            return 0
+
+        events, dropped = self._history_for(user_id)
+        self.seq += 1
+        published = Event(self.seq, f"{self.instance}-{self.seq}", event, data)
+        self.published += 1
+        if len(events) == events.maxlen:
+            dropped = events[0].seq
+        events.append(published)
+        self.history[user_id] = (events, dropped)
+
+        for subscription in subscriptions or ():
+            subscription.deliver(published)
+        return len(subscriptions or ())
+
+    def replay(self, user_id: str, last_event_id: Optional[str]) -> List[Event]:
+        if not last_event_id:
+            return []
+        instance, _, seq = last_event_id.partition("-")
+        history = self.history.get(user_id)
+        if instance != self.instance or not seq.isdigit() or history is None:
+            return [self._resync(user_id)]
+        events, dropped = history
+        seq = int(seq)
+        if seq < dropped:
+            return [self._resync(user_id)]
+        return [event for event in events if event.seq > seq]
+
+    def _resync(self, user_id: str) -> Event:
+        # Carries the current id: a client that refetches and later
+        # reconnects with it is replayed only what came after.
+        return resync_event(user_id, self.seq, f"{self.instance}-{self.seq}")
+
+    def _history_for(self, user_id: str) -> Tuple[Deque[Event], int]:
+        history = self.history.get(user_id)
+        if history is None:
+            # Whatever happened before now is unknown to this history.
+            history = self.history[user_id] = (deque(maxlen=self.history_size), self.seq)
+            while len(self.history) > self.max_history_users:
+                self.history.popitem(last=False)
+        else:
+            self.history.move_to_end(user_id)
+        return history
+
+
+def resync_event(user_id: str, seq: int, event_id: str) -> Event:
+    return Event(seq, event_id, RESYNC, {"user_id": user_id})
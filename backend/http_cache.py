@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+# Below this size the gzip framing costs about as much as it saves.
+GZIP_MIN_SIZE = 512
+
+
+def encode_json(data: Any) -> bytes:
+    # Same separators and escaping as FastAPI's JSONResponse.
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class EncodedPayload:
+    # Response bytes serialized once, with a strong ETag per representation
+    # and a precomputed gzip variant for larger bodies.
+
+    __slots__ = ("body", "gzipped", "etag", "gzip_etag")
+
+    def __init__(self, body: bytes, gzip_min_size: int = GZIP_MIN_SIZE):
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.body = body
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.gzipped = gzip.compress(body, mtime=0) if len(body) >= gzip_min_size else None
+
+    @classmethod
+    def from_data(cls, data: Any) -> "EncodedPayload":
+        return cls(encode_json(data))
+
+
+class PayloadCache:
+    # One encoded payload per resource, rebuilt only when the version the
+    # caller passes changes. A hit is a dict lookup and a comparison.
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[Hashable, EncodedPayload]] = {}
+
+    def get(self, resource: str, version: Hashable, build: Callable[[], Any]) -> EncodedPayload:
+        entry = self.entries.get(resource)
+        if entry is None or entry[0] != version:
+            entry = (version, EncodedPayload.from_data(build()))
+            self.entries[resource] = entry
+        return entry[1]
+
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return True
+    candidates = {tag[2:] if tag.startswith("W/") else tag for tag in candidates}
+    return any(etag in candidates for etag in etags)
+
+
+def quality_of(params: str) -> float:
+    # The q value of one Accept-Encoding entry; a malformed one counts as
+    # q=0, i.e. not acceptable.
+    params = params.strip().lower()
+    if not params.startswith("q="):
+        return 1.0
+    try:
+        return float(params[2:])
+    except ValueError:
+        return 0.0
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return quality_of(params) > 0
+    return False
+
+
+def payload_response(request: Request, payload: EncodedPayload) -> Response:
+    use_gzip = payload.gzipped is not None and accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": payload.gzip_etag if use_gzip else payload.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), (payload.etag, payload.gzip_etag)):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.gzipped, media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
@@ -0,0 +1,198 @@
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Request latencies, in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Starlette appends the charset to text/* media types.
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+GaugeValue = Union[float, Iterable[Tuple[Dict[str, str], float]]]
+
+
+class Histogram:
+    # Per-bucket (not cumulative) counts; the cumulative form Prometheus
+    # expects is built at scrape time so observing stays a bisect and two
+    # increments.
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    # Everything is updated from the event loop thread, so plain ints and
+    # dicts are enough; there is nothing to lock.
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.in_flight = 0
+        self.loop_lag = Histogram((0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+        self.last_loop_lag = 0.0
+        self.gauges: List[Tuple[str, str, str, Callable[[], GaugeValue]]] = []
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram()
+        histogram.observe(seconds)
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], GaugeValue], kind: str = "gauge") -> None:
+        # collect() runs at scrape time and returns a number or a list of
+        # (labels, value) pairs.
+        self.gauges.append((name, help_text, kind, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        lines += _header("http_requests_total", "Requests handled, by route and status.", "counter")
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        lines += _header("http_request_duration_seconds", "Request latency, by route.", "histogram")
+        for (method, route), histogram in sorted(self.latency.items()):
+            lines += _histogram_lines("http_request_duration_seconds", histogram, method=method, route=route)
+
+        lines += _header("http_requests_in_flight", "Requests currently being handled.", "gauge")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+
+        lines += _header("event_loop_lag_seconds", "How late the event loop woke a sleeping task.", "histogram")
+        lines += _histogram_lines("event_loop_lag_seconds", self.loop_lag)
+        lines += _header("event_loop_lag_last_seconds", "Most recent event loop lag sample.", "gauge")
+        lines.append(f"event_loop_lag_last_seconds {_number(self.last_loop_lag)}")
+
+        for name, help_text, kind, collect in self.gauges:
+            lines += _header(name, help_text, kind)
+            value = collect()
+            if isinstance(value, (int, float)):
+                lines.append(f"{name} {_number(value)}")
+            else:
+                for labels, sample in value:
+                    lines.append(f"{name}{_labels(**labels)} {_number(sample)}")
+
+        lines.append("")
+        return "\n".join(lines)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware timing every HTTP request. The route label is the
+    # path template of the endpoint that handled it (known once the router
+    # has run), so per-user paths don't explode the label set.
+
+    def __init__(self, app, registry: MetricsRegistry, route_for: Callable[[dict], str]):
+        self.app = app
+        self.registry = registry
+        self.route_for = route_for
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry = self.registry
+        registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            registry.in_flight -= 1
+            registry.observe_request(scope["method"], self.route_for(scope), status, time.perf_counter() - start)
+
+
+def endpoint_routes(app) -> Callable[[dict], str]:
+    # Maps the endpoint the router stored in the scope back to its path
+    # template. Built on first use, after every route has been registered.
+    routes: Dict[object, str] = {}
+
+    def route_for(scope: dict) -> str:
+        if not routes:
+            for route in app.routes:
+                endpoint = getattr(route, "endpoint", None)
+                if endpoint is not None:
+                    routes[endpoint] = route.path
+        return routes.get(scope.get("endpoint"), "unmatched")
+
+    return route_for
+
+
+class LoopLagMonitor:
+    # Sleeps for interval and records how much later than asked it woke up.
+
+    def __init__(self, registry: MetricsRegistry, interval: float = 0.5):
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.registry.last_loop_lag = lag
+            self.registry.loop_lag.observe(lag)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _header(name: str, help_text: str, kind: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _histogram_lines(name: str, histogram: Histogram, **labels: str) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=_number(bound))} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {_number(histogram.sum)}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+
+def _labels(**labels: str) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
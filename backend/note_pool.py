@@ -0,0 +1,106 @@
+import uuid
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from note_registry import NoteRegistry
+
+# Shared component of a sharded deployment. Shards own their users' notes and
+# push every public (and predefined) note here, so /api/notes/random can
+# sample across all users. Contents are rebuilt from the shards: a new
+# instance id tells them to send everything again.
+
+app = FastAPI(title="Mental Health App Note Pool")
+
+INSTANCE = uuid.uuid4().hex
+
+
+class PooledNote:
+    __slots__ = ("note_id", "user_id", "category", "mood", "is_public", "likes", "data")
+
+    def __init__(self, data: Dict):
+        self.note_id = data["note_id"]
+        self.user_id = data["user_id"]
+        self.category = data.get("category")
+        self.mood = data.get("mood")
+        self.is_public = data.get("is_public", True)
+        self.likes = data.get("likes", 0)
+        self.data = data
+
+
+class PoolOp(BaseModel):
+    op: str
+    note: Optional[Dict] = None
+    note_id: Optional[int] = None
+
+
+class PoolBatch(BaseModel):
+    ops: List[PoolOp]
+
+
+pool = NoteRegistry()
+
+
+def apply(op: PoolOp) -> None:
+    if op.op == "remove":
+        pool.remove(op.note_id)
+        return
+
+    note = PooledNote(op.note)
+    current = pool.get(note.note_id)
+    if current is not None and current.is_public == note.is_public and current.category == note.category:
+        # Likes and text change in place; the pools only care about identity.
+        pool.stats_for(current.user_id).total_likes += note.likes - current.likes
+        current.likes = note.likes
+        current.data = note.data
+        return
+    if current is not None:
+        pool.remove(note.note_id)
+    pool.add(note)
+
+
+@app.post("/internal/pool/notes")
+async def apply_pool_ops(batch: PoolBatch):
+    for op in batch.ops:
+        apply(op)
+    return {"instance": INSTANCE, "applied": len(batch.ops)}
+
+
+@app.get("/internal/pool/stats")
+async def get_pool_stats():
+    return {
+        "instance": INSTANCE,
+        "notes": len(pool),
+        "public": len(pool.public[None]),
+        "system": len(pool.system[None])
+    }
+
+
+@app.get("/api/notes/random")
+async def get_random_note(
+    user_id: str,
+    category: Optional[str] = None,
+    exclude_own: bool = True,
+    unique_this_week: bool = False
+):
+    seen = None
+    if unique_this_week:
+        seen = pool.seen_this_week(user_id, tuple(date.today().isocalendar())[:2])
+
+    note = pool.sample(user_id, category=category, exclude_own=exclude_own, seen=seen)
+
+    if not note:
+        return {
+            "note_id": 0,
+            "user_id": "system",
+            "message": "Every day is a new opportunity to grow and make progress. Keep going!",
+            "created_at": datetime.now().isoformat(),
+            "likes": 0,
+            "is_public": True,
+            "category": "motivation",
+            "mood": "inspired"
+        }
+
+    return note.data
@@ -0,0 +1,403 @@
+import bisect
+import itertools
+import random
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+SYSTEM_USER = "system"
+SAMPLE_ATTEMPTS = 32
+
+
+class UserIds:
+    # Interns user id strings as small ints, so per-note like sets hold four
+    # bytes per liker instead of a reference to a string.
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, user_id: str) -> int:
+        uid = self.ids.get(user_id)
+        if uid is None:
+            uid = self.ids[user_id] = len(self.names)
+            self.names.append(user_id)
+        return uid
+
+    def lookup(self, user_id: str) -> Optional[int]:
+        return self.ids.get(user_id)
+
+
+class LikeSet:
+    # Sorted array of interned user ids: O(log n) membership by bisection.
+    # Ids are handed out in order of first appearance, so most inserts land
+    # at or near the end.
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.ids = array("I", sorted(set(ids)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, uid: int) -> bool:
+        position = bisect.bisect_left(self.ids, uid)
+        return position < len(self.ids) and self.ids[position] == uid
+
+    def add(self, uid: int) -> bool:
+        ids = self.ids
+        if not ids or ids[-1] < uid:
+            ids.append(uid)
+            return True
+        position = bisect.bisect_left(ids, uid)
+        if ids[position] == uid:
+            return False
+        ids.insert(position, uid)
+        return True
+
+
+class SamplingPool:
+    # Dense list plus position map: add, remove and uniform sampling are all
+    # O(1) (removal swaps the last element into the freed slot).
+
+    __slots__ = ("items", "positions")
+
+    def __init__(self):
+        self.items: List = []
+        self.positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, note) -> None:
+        if note.note_id in self.positions:
+            return
+        self.positions[note.note_id] = len(self.items)
+        self.items.append(note)
+
+    def remove(self, note) -> None:
+        position = self.positions.pop(note.note_id, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last.note_id] = position
+
+    def sample(self, accept: Optional[Callable] = None, attempts: int = SAMPLE_ATTEMPTS):
+        if not self.items:
+            return None
+        if accept is None:
+            return random.choice(self.items)
+        for _ in range(attempts):
+            note = random.choice(self.items)
+            if accept(note):
+                return note
+        return None
+
+
+class NoteStats:
+    # Per-user aggregates, updated in place as notes are created, liked and
+    # deleted.
+
+    __slots__ = ("total_notes", "total_likes", "by_category", "by_mood")
+
+    def __init__(self):
+        self.total_notes = 0
+        self.total_likes = 0
+        self.by_category: Dict[str, int] = {}
+        self.by_mood: Dict[str, int] = {}
+
+    def add(self, note) -> None:
+        self.total_notes += 1
+        self.total_likes += note.likes
+        if note.category:
+            self.by_category[note.category] = self.by_category.get(note.category, 0) + 1
+        if note.mood:
+            self.by_mood[note.mood] = self.by_mood.get(note.mood, 0) + 1
+
+    def remove(self, note) -> None:
+        self.total_notes -= 1
+        self.total_likes -= note.likes
+        if note.category:
+            _decrement(self.by_category, note.category)
+        if note.mood:
+            _decrement(self.by_mood, note.mood)
+
+    def as_dict(self) -> Dict:
+        return {
+            "total_notes": self.total_notes,
+            "total_likes": self.total_likes,
+            "notes_by_category": dict(self.by_category),
+            "notes_by_mood": dict(self.by_mood),
+        }
+
+
+class NoteRegistry:
+    # Owns every note: a note_id index for direct lookup, the per-user (and
+    # per-user, per-category) lists in creation order, the id sequence used
+    # for new notes and the sampling pools behind /api/notes/random. Pools
+    # are keyed by category, with None holding every note. New ids are
+    # congruent to id_offset modulo id_stride, which lets shards allocate
+    # ids without talking to each other.
+
+    def __init__(self, id_offset: int = 0, id_stride: int = 1):
+        self.by_id: Dict[int, object] = {}
+        self.by_user: Dict[str, List] = {}
+        self.by_user_category: Dict[Tuple[str, str], List] = {}
+        self.public: Dict[Optional[str], SamplingPool] = {None: SamplingPool()}
+        self.system: Dict[Optional[str], SamplingPool] = {None: SamplingPool()}
+        self.public_by_owner: Dict[Tuple[str, Optional[str]], int] = {}
+        self.seen: Dict[str, Tuple[Tuple[int, int], Set[int]]] = {}
+        self.stats: Dict[str, NoteStats] = {}
+        self.user_ids = UserIds()
+        self.id_offset = id_offset % id_stride
+        self.id_stride = id_stride
+        self._ids = itertools.count(self._aligned(1), id_stride)
+        self._id_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def next_id(self) -> int:
+        with self._id_lock:
+            return next(self._ids)
+
+    def reserve_ids(self, last_id: int) -> None:
+        # Make sure the sequence never hands out an id at or below last_id.
+        with self._id_lock:
+            current = next(self._ids)
+            self._ids = itertools.count(self._aligned(max(current, last_id + 1)), self.id_stride)
+
+    def _aligned(self, value: int) -> int:
+        # Smallest id >= value that this registry may hand out.
+        return value + (self.id_offset - value) % self.id_stride
+
+    def get(self, note_id: int):
+        return self.by_id.get(note_id)
+
+    def for_user(self, user_id: str) -> List:
+        return self.by_user.get(user_id, [])
+
+    def add(self, note) -> None:
+        # Ids are allocated in creation order, so appending keeps every list
+        # sorted by note_id.
+        self.by_id[note.note_id] = note
+        self.by_user.setdefault(note.user_id, []).append(note)
+        if note.category is not None:
+            self.by_user_category.setdefault((note.user_id, note.category), []).append(note)
+        self._index(note)
+        self.stats_for(note.user_id).add(note)
+
+    def add_all(self, notes: Iterable) -> None:
+        last_id = 0
+        for note in notes:
+            self.add(note)
+            last_id = max(last_id, note.note_id)
+        self.reserve_ids(last_id)
+
+    def remove(self, note_id: int) -> Optional[object]:
+        note = self.by_id.pop(note_id, None)
+        if note is None:
+            return None
+        self._unindex(note)
+        self.stats_for(note.user_id).remove(note)
+        _remove_from(self.by_user, note.user_id, note)
+        if note.category is not None:
+            _remove_from(self.by_user_category, (note.user_id, note.category), note)
+        return note
+
+    def like(self, note, user_id: str) -> bool:
+        if not note.liked_by.add(self.user_ids.intern(user_id)):
+            return False
+        note.likes += 1
+        self.stats_for(note.user_id).total_likes += 1
+        return True
+
+    def has_liked(self, note, user_id: str) -> bool:
+        uid = self.user_ids.lookup(user_id)
+        return uid is not None and uid in note.liked_by
+
+    def likers(self, note) -> List[str]:
+        return [self.user_ids.names[uid] for uid in note.liked_by]
+
+    def stats_for(self, user_id: str) -> NoteStats:
+        stats = self.stats.get(user_id)
+        if stats is None:
+            stats = self.stats[user_id] = NoteStats()
+        return stats
+
+    def check_stats(self, repair: bool = False) -> Dict[str, Dict]:
+        # Rebuilds every user's aggregates from the raw notes and reports the
+        # users whose maintained counters drifted.
+        drift = {}
+        for user_id in set(self.stats) | set(self.by_user):
+            expected = NoteStats()
+            for note in self.by_user.get(user_id, []):
+                expected.add(note)
+
+            actual = self.stats.get(user_id, NoteStats())
+            if actual.as_dict() != expected.as_dict():
+                drift[user_id] = {"expected": expected.as_dict(), "actual": actual.as_dict()}
+                if repair:
+                    self.stats[user_id] = expected
+        return drift
+
+    def page(
+        self,
+        user_id: str,
+        limit: int,
+        before: Optional[int] = None,
+        category: Optional[str] = None,
+        offset: int = 0,
+    ) -> Tuple[List, Optional[int]]:
+        # Newest first. Returns the page and the cursor for the next one.
+        if category is None:
+            notes = self.by_user.get(user_id, [])
+        else:
+            notes = self.by_user_category.get((user_id, category), [])
+
+        end = len(notes) if before is None else _position_before(notes, before)
+        end = max(0, end - offset)
+        start = max(0, end - limit)
+
+        page = notes[start:end]
+        page.reverse()
+        next_cursor = page[-1].note_id if page and start > 0 else None
+        return page, next_cursor
+
+    def set_visibility(self, note, is_public: bool) -> None:
+        if note.is_public == is_public:
+            return
+        self._unindex(note)
+        note.is_public = is_public
+        self._index(note)
+
+    def _pools_for(self, note) -> Optional[Dict[Optional[str], SamplingPool]]:
+        if note.user_id == SYSTEM_USER:
+            return self.system
+        if note.is_public:
+            return self.public
+        return None
+
+    def _index(self, note) -> None:
+        pools = self._pools_for(note)
+        if pools is None:
+            return
+        for key in (None, note.category) if note.category is not None else (None,):
+            pool = pools.get(key)
+            if pool is None:
+                pool = pools[key] = SamplingPool()
+            pool.add(note)
+            if pools is self.public:
+                owner = (note.user_id, key)
+                self.public_by_owner[owner] = self.public_by_owner.get(owner, 0) + 1
+
+    def _unindex(self, note) -> None:
+        pools = self._pools_for(note)
+        if pools is None:
+            return
+        for key in (None, note.category) if note.category is not None else (None,):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            pool.remove(note)
+            if pools is self.public:
+                owner = (note.user_id, key)
+                remaining = self.public_by_owner.get(owner, 0) - 1
+                if remaining > 0:
+                    self.public_by_owner[owner] = remaining
+                else:
+                    self.public_by_owner.pop(owner, None)
+
+    def seen_this_week(self, user_id: str, week: Tuple[int, int]) -> Set[int]:
+        entry = self.seen.get(user_id)
+        if entry is None or entry[0] != week:
+            entry = (week, set())
+            self.seen[user_id] = entry
+        return entry[1]
+
+    def sample(
+        self,
+        user_id: str,
+        category: Optional[str] = None,
+        exclude_own: bool = True,
+        seen: Optional[Set[int]] = None,
+    ):
+        note = self._sample_public(user_id, category, exclude_own, seen)
+        if note is None:
+            pool = self.system.get(category)
+            if pool is not None:
+                if seen:
+                    note = pool.sample(lambda n: n.note_id not in seen)
+                if note is None:
+                    note = pool.sample()
+        if note is not None and seen is not None:
+            seen.add(note.note_id)
+        return note
+
+    def _sample_public(self, user_id: str, category: Optional[str], exclude_own: bool, seen: Optional[Set[int]]):
+        pool = self.public.get(category)
+        if pool is None or not pool:
+            return None
+
+        own = self.public_by_owner.get((user_id, category), 0) if exclude_own else 0
+        if own >= len(pool):
+            return None
+
+        if seen:
+            # Unseen notes are preferred, but once the attempts run out we
+            # fall back to a repeat rather than scanning the pool.
+            if exclude_own:
+                note = pool.sample(lambda n: n.user_id != user_id and n.note_id not in seen)
+            else:
+                note = pool.sample(lambda n: n.note_id not in seen)
+            if note is not None:
+                return note
+
+        if not own:
+            return pool.sample()
+
+        note = pool.sample(lambda n: n.user_id != user_id)
+        if note is None:
+            # Only reachable when the user owns nearly all of a small pool.
+            note = random.choice([n for n in pool.items if n.user_id != user_id])
+        return note
+
+
+def _remove_from(lists: Dict, key, note) -> None:
+    notes = lists.get(key)
+    if not notes:
+        return
+    position = _position_before(notes, note.note_id)
+    if position < len(notes) and notes[position] is note:
+        del notes[position]
+    if not notes:
+        del lists[key]
+
+
+def _position_before(notes: List, note_id: int) -> int:
+    # Index of the first note whose id is >= note_id.
+    lo, hi = 0, len(notes)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if notes[mid].note_id < note_id:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _decrement(counts: Dict[str, int], key: str) -> None:
+    remaining = counts.get(key, 0) - 1
+    if remaining > 0:
+        counts[key] = remaining
+    else:
+        counts.pop(key, None)
@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROFILE_HEADER = b"x-mindflow-profile"
+DEFAULT_INTERVAL = 0.001
+MAX_PROFILES = 200
+FORMATS = ("speedscope", "collapsed")
+
+Frame = Tuple[str, str, int]
+
+
+class Capture:
+    # Samples for one request. root is the frame of the middleware call that
+    # is running the request: a sample of the loop thread belongs to this
+    # request only when root is on its stack, which keeps concurrent
+    # requests out of each other's profiles.
+
+    __slots__ = ("root", "samples", "weights", "last")
+
+    def __init__(self, root):
+        self.root = root
+        self.samples: List[Tuple[Frame, ...]] = []
+        self.weights: List[float] = []
+        self.last = time.perf_counter()
+
+
+class StackSampler:
+    # One daemon thread that runs only while a capture is active and reads
+    # the loop thread's stack every interval via sys._current_frames.
+    # CPython hands the GIL over every switch interval (5 ms by default), so
+    # that is lowered to the sampling interval for as long as the thread runs.
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.captures: Dict[int, Capture] = {}
+        self.lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._target_thread = 0
+        self._switch_interval = sys.getswitchinterval()
+
+    def begin(self, root) -> Capture:
+        capture = Capture(root)
+        with self.lock:
+            self.captures[id(capture)] = capture
+            if self._thread is None:
+                self._target_thread = threading.get_ident()
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._switch_interval, self.interval))
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        return capture
+
+    def end(self, capture: Capture) -> None:
+        with self.lock:
+            self.captures.pop(id(capture), None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.captures:
+                    sys.setswitchinterval(self._switch_interval)
+                    self._thread = None
+                    return
+                captures = list(self.captures.values())
+            frame = sys._current_frames().get(self._target_thread)
+            now = time.perf_counter()
+            for capture in captures:
+                stack = _stack_below(frame, capture.root)
+                if stack is not None:
+                    capture.samples.append(stack)
+                    capture.weights.append(now - capture.last)
+                capture.last = now
+
+
+class ProfileStore:
+    # Profiles are files in one directory, named so that sorting by name is
+    # sorting by time; only the newest max_profiles are kept. save runs on a
+    # worker thread, so the index is only touched under the lock.
+
+    def __init__(self, directory: str, profile_format: str = "speedscope", max_profiles: int = MAX_PROFILES):
+        if profile_format not in FORMATS:
+            raise ValueError(f"Unknown profile format: {profile_format}")
+        self.directory = directory
+        self.profile_format = profile_format
+        self.max_profiles = max_profiles
+        self.index: List[dict] = []
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def save(self, profile_id: str, capture: Capture, info: dict) -> dict:
+        created = datetime.now()
+        extension = ".speedscope.json" if self.profile_format == "speedscope" else ".collapsed.txt"
+        entry = {
+            "profile_id": profile_id,
+            "file": profile_id + extension,
+            "format": self.profile_format,
+            "created_at": created.isoformat(),
+            "samples": len(capture.samples),
+            **info,
+        }
+        if self.profile_format == "speedscope":
+            content = json.dumps(speedscope(capture, entry))
+        else:
+            content = collapsed(capture)
+        with open(os.path.join(self.directory, entry["file"]), "w", encoding="utf-8") as handle:
+            handle.write(content)
+        with open(os.path.join(self.directory, profile_id + ".meta.json"), "w", encoding="utf-8") as handle:
+            json.dump(entry, handle)
+
+        with self.lock:
+            self.index.append(entry)
+            expired = self.index[:-self.max_profiles] if len(self.index) > self.max_profiles else []
+            del self.index[:len(expired)]
+        for old in expired:
+            self._delete(old)
+        return entry
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        with self.lock:
+            return self.index[::-1][:limit]
+
+    def path_for(self, profile_id: str) -> Optional[str]:
+        with self.lock:
+            for entry in self.index:
+                if entry["profile_id"] == profile_id:
+                    return os.path.join(self.directory, entry["file"])
+        return None
+
+    def _load_index(self) -> None:
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".meta.json"):
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as handle:
+                        self.index.append(json.load(handle))
+                except (OSError, ValueError):
+                    continue
+        while len(self.index) > self.max_profiles:
+            self._delete(self.index.pop(0))
+
+    def _delete(self, entry: dict) -> None:
+        for name in (entry["file"], entry["profile_id"] + ".meta.json"):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilerMiddleware:
+    # Profiles a request when it carries the admin token in the
+    # X-MindFlow-Profile header, or when it is picked at sample_rate. Only
+    # installed when one of the two is configured, so it costs nothing
+    # when profiling is off.
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        route_for: Callable[[dict], str],
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval: float = DEFAULT_INTERVAL,
+    ):
+        self.app = app
+        self.store = store
+        self.route_for = route_for
+        self.token = token.encode("latin-1") if token else None
+        self.sample_rate = sample_rate
+        self.sampler = StackSampler(interval)
+
+    def requested(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/") or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        profile_id = self.store.new_id()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [*message.get("headers", []), (b"x-mindflow-profile-id", profile_id.encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        capture = self.sampler.begin(sys._getframe())
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            self.sampler.end(capture)
+            # Formatting and writing a profile takes milliseconds; other
+            # requests keep the event loop meanwhile.
+            await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                self.store.save, profile_id, capture, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": self.route_for(scope),
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 3),
+                },
+            ))
+
+
+def _stack_below(frame, root) -> Optional[Tuple[Frame, ...]]:
+    # The frames from root's callee down to the innermost one, outermost
+    # first, or None when root is not on the stack.
+    frames = []
+    while frame is not None:
+        if frame is root:
+            frames.reverse()
+            return tuple(frames)
+        code = frame.f_code
+        frames.append((code.co_name, code.co_filename, frame.f_lineno))
+        frame = frame.f_back
+    return None
+
+
+def collapsed(capture: Capture) -> str:
+    # Brendan Gregg's folded format: "outer;inner;leaf count" per stack.
+    counts: Dict[str, int] = {}
+    for stack in capture.samples:
+        line = ";".join(f"{name} ({os.path.basename(filename)}:{lineno})" for name, filename, lineno in stack)
+        counts[line or "(idle)"] = counts.get(line or "(idle)", 0) + 1
+    return "".join(f"{line} {count}\n" for line, count in sorted(counts.items()))
+
+
+def speedscope(capture: Capture, entry: dict) -> dict:
+    frames: List[dict] = []
+    positions: Dict[Frame, int] = {}
+    samples = []
+    for stack in capture.samples:
+        indexes = []
+        for frame in stack:
+            position = positions.get(frame)
+            if position is None:
+                position = positions[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            indexes.append(position)
+        samples.append(indexes)
+    weights = [round(weight * 1000, 3) for weight in capture.weights]
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "exporter": "mindflow",
+        "name": f"{entry['method']} {entry['path']}",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{entry['method']} {entry['path']} ({entry['status']}, {entry['duration_ms']} ms)",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
@@ -0,0 +1,179 @@
+import itertools
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Sequence
+from urllib.parse import parse_qs
+
+MAX_BUCKETS = 100_000
+# Cold-end buckets looked at per new bucket once the map is full.
+FULL_SCAN = 64
+
+
+class Rate:
+    # capacity requests in a burst, refilled at per_second tokens a second.
+
+    __slots__ = ("capacity", "per_second")
+
+    def __init__(self, capacity: int, per_second: float):
+        self.capacity = capacity
+        self.per_second = per_second
+
+    @classmethod
+    def per_minute(cls, count: int, burst: Optional[int] = None) -> "Rate":
+        return cls(burst if burst is not None else count, count / 60.0)
+
+
+class RouteLimit:
+    __slots__ = ("method", "pattern", "per_user", "per_ip")
+
+    def __init__(self, method: str, path: str, per_user: Optional[Rate] = None, per_ip: Optional[Rate] = None):
+        # Path templates use the routes' own syntax; a {user_id} segment is
+        # where the per-user key comes from, otherwise the user_id query
+        # parameter is used.
+        self.method = method
+        self.pattern = re.compile(
+            "^" + re.sub(r"\\\{(\w+)\\\}", lambda m: f"(?P<{m.group(1)}>[^/]+)", re.escape(path)) + "$"
+        )
+        self.per_user = per_user
+        self.per_ip = per_ip
+
+
+class TokenBuckets:
+    # Buckets live in an LRU-ordered dict that aims to stay under
+    # max_entries. A bucket that has been idle long enough to refill
+    # completely is the same as no bucket, so such entries are dropped from
+    # the cold end as new ones come in. A bucket that is still refilling is
+    # never dropped, even over max_entries: forgetting it would hand a
+    # throttled client a fresh burst, and anyone can make new keys.
+
+    def __init__(self, max_entries: int = MAX_BUCKETS, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def take(self, key: Hashable, rate: Rate) -> float:
+        # Returns 0 when the request may proceed, otherwise the number of
+        # seconds until a token is available.
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self._make_room(now)
+            self.buckets[key] = [rate.capacity - 1.0, now, rate]
+            return 0.0
+
+        self.buckets.move_to_end(key)
+        tokens = min(rate.capacity, bucket[0] + (now - bucket[1]) * rate.per_second)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return 0.0
+        bucket[0] = tokens
+        return (1.0 - tokens) / rate.per_second
+
+    def _make_room(self, now: float) -> None:
+        # Two refilled buckets per new one keeps pace with insertions. Once
+        # the map is full, look further: routes refill at different rates,
+        # so a refilled bucket can sit behind one that is still refilling.
+        buckets = self.buckets
+        full = len(buckets) >= self.max_entries
+        scan = FULL_SCAN if full else 2
+        refilled = []
+        for key, (tokens, last, rate) in itertools.islice(buckets.items(), scan):
+            if tokens + (now - last) * rate.per_second >= rate.capacity:
+                refilled.append(key)
+                if len(refilled) == 2:
+                    break
+            elif not full:
+                break
+        for key in refilled:
+            del buckets[key]
+
+
+class RateLimitMiddleware:
+    # Plain ASGI middleware: no request object, no body reads, one regex per
+    # configured route. Requests over the limit get a 429 with Retry-After.
+
+    def __init__(
+        self,
+        app,
+        limits: Sequence[RouteLimit],
+        max_entries: int = MAX_BUCKETS,
+        trust_forwarded_for: bool = False,
+        enabled: bool = True,
+        buckets: Optional[TokenBuckets] = None,
+    ):
+        self.app = app
+        self.limits = list(limits)
+        self.buckets = buckets if buckets is not None else TokenBuckets(max_entries)
+        self.trust_forwarded_for = trust_forwarded_for
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = self.check(scope)
+        if retry_after:
+            await self.reject(send, retry_after)
+            return
+        await self.app(scope, receive, send)
+
+    def check(self, scope) -> float:
+        method = scope["method"]
+        path = scope["path"]
+        for index, limit in enumerate(self.limits):
+            if limit.method != method:
+                continue
+            match = limit.pattern.match(path)
+            if match is None:
+                continue
+
+            # The user's own limit first, so a user over it doesn't also use
+            # up the tokens everyone behind the same address shares.
+            wait = 0.0
+            if limit.per_user is not None:
+                user_id = match.groupdict().get("user_id") or _query_user_id(scope)
+                if user_id:
+                    wait = self.buckets.take((index, "user", user_id), limit.per_user)
+            if limit.per_ip is not None and not wait:
+                wait = self.buckets.take((index, "ip", self.client_ip(scope)), limit.per_ip)
+            return wait
+        return 0.0
+
+    def client_ip(self, scope) -> str:
+        if self.trust_forwarded_for:
+            # The last entry is the one our own proxy appended; earlier ones
+            # come from the client and can be forged.
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[-1].strip()
+        client = scope.get("client")
+        return client[0] if client else ""
+
+    async def reject(self, send, retry_after: float) -> None:
+        body = json.dumps({"detail": "Too many requests, please slow down"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _query_user_id(scope) -> Optional[str]:
+    query = scope.get("query_string")
+    if not query or b"user_id=" not in query:
+        return None
+    values = parse_qs(query.decode("latin-1")).get("user_id")
+    return values[0] if values else None
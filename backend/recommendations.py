@@ -0,0 +1,59 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class CategoryScorer:
+    # Scores assessments against a precomputed question -> category one-hot
+    # matrix. A user's category averages are (ratings @ Q) / (answered @ Q),
+    # and a batch of users is the same product with one row per user.
+
+    def __init__(self, questions: Sequence):
+        self.categories: List[str] = []
+        category_index: Dict[str, int] = {}
+        for question in questions:
+            if question.category not in category_index:
+                category_index[question.category] = len(self.categories)
+                self.categories.append(question.category)
+
+        self.question_index: Dict[int, int] = {question.id: i for i, question in enumerate(questions)}
+        self.matrix = np.zeros((len(questions), len(self.categories)), dtype=np.float64)
+        for i, question in enumerate(questions):
+            self.matrix[i, category_index[question.category]] = 1.0
+
+    def encode(self, assessments: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+        ratings = np.zeros((len(assessments), len(self.question_index)), dtype=np.float64)
+        answered = np.zeros_like(ratings)
+        for row, assessment in enumerate(assessments):
+            for response in assessment.responses:
+                column = self.question_index.get(response.question_id)
+                if column is None:
+                    continue
+                # Repeated answers to one question all count, as before.
+                ratings[row, column] += response.rating
+                answered[row, column] += 1
+        return ratings, answered
+
+    def averages(self, assessments: Sequence) -> np.ndarray:
+        ratings, answered = self.encode(assessments)
+        sums = ratings @ self.matrix
+        counts = answered @ self.matrix
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.where(counts > 0, counts, 1), np.nan)
+
+    def lowest_categories(self, assessments: Sequence, count: int = 3) -> List[List[Tuple[str, float]]]:
+        averages = self.averages(assessments)
+        ranked = np.argsort(np.where(np.isnan(averages), np.inf, averages), axis=1, kind="stable")[:, :count]
+
+        results = []
+        for row, columns in enumerate(ranked):
+            results.append([
+                (self.categories[column], float(averages[row, column]))
+                for column in columns
+                if not np.isnan(averages[row, column])
+            ])
+        return results
+
+    def lowest_for(self, assessment, count: int = 3) -> List[Tuple[str, float]]:
+        return self.lowest_categories([assessment], count)[0]
+
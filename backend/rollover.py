@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+from zoneinfo import ZoneInfo
+
+from task_index import epoch_day
+
+# None stands for the server's local timezone, which is what users without a
+# stored timezone have always been measured against.
+TimezoneKey = Optional[str]
+
+
+def local_now(timezone: TimezoneKey) -> datetime:
+    if timezone is None:
+        return datetime.now()
+    return datetime.now(ZoneInfo(timezone)).replace(tzinfo=None)
+
+
+def local_epoch_day(timezone: TimezoneKey) -> int:
+    return epoch_day(local_now(timezone).date())
+
+
+class RolloverScheduler:
+    # Users are grouped by timezone. Once a group's local date moves past the
+    # last day it was rolled to, every user in it is rolled over in batches,
+    # yielding to the event loop between batches so requests keep flowing.
+
+    def __init__(
+        self,
+        roll_user: Callable[[str, int], bool],
+        interval: float = 30.0,
+        batch_size: int = 1000,
+    ):
+        self.roll_user = roll_user
+        self.interval = interval
+        self.batch_size = batch_size
+        self.groups: Dict[TimezoneKey, Set[str]] = {}
+        self.rolled_day: Dict[TimezoneKey, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def assign(self, user_id: str, timezone: TimezoneKey, previous: TimezoneKey = None) -> None:
+        if previous != timezone:
+            group = self.groups.get(previous)
+            if group is not None:
+                group.discard(user_id)
+        self.groups.setdefault(timezone, set()).add(user_id)
+
+    async def run_due(self) -> int:
+        rolled = 0
+        for timezone in list(self.groups):
+            day = local_epoch_day(timezone)
+            if self.rolled_day.get(timezone) == day:
+                continue
+            rolled += await self.roll_group(timezone, day)
+            self.rolled_day[timezone] = day
+        return rolled
+
+    async def roll_group(self, timezone: TimezoneKey, day: int) -> int:
+        rolled = 0
+        users = list(self.groups.get(timezone, ()))
+        for start in range(0, len(users), self.batch_size):
+            for user_id in users[start:start + self.batch_size]:
+                if self.roll_user(user_id, day):
+                    rolled += 1
+            await asyncio.sleep(0)
+        return rolled
+
+    async def run_forever(self) -> None:
+        while True:
+            await self.run_due()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,82 @@
+"""Run a sharded deployment on one machine.
+
+    python run_cluster.py --shards 4 --port 8000
+
+Starts the note pool, N shard workers (each with its own state directory)
+and the router on --port, which is the only address clients need. The
+router keeps no state, so it runs as --router-workers processes sharing the
+port; with a single one, its event loop would cap the cluster at what one
+core can proxy, whatever the number of shards.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def spawn(module: str, host: str, port: int, env: dict, workers: int = 1) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", host, "--port", str(port), "--log-level", "warning",
+         "--workers", str(workers)],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="router port")
+    parser.add_argument("--base-port", type=int, default=8100, help="pool port; shards use the ports after it")
+    parser.add_argument("--router-workers", type=int, help="router processes (default: one per shard)")
+    parser.add_argument("--state-dir", default=os.path.join(BACKEND_DIR, "state"))
+    args = parser.parse_args()
+    router_workers = args.router_workers or args.shards
+
+    pool_url = f"http://{args.host}:{args.base_port}"
+    shard_urls = [f"http://{args.host}:{args.base_port + 1 + i}" for i in range(args.shards)]
+
+    processes = [spawn("note_pool", args.host, args.base_port, {})]
+    for index, url in enumerate(shard_urls):
+        processes.append(spawn("assessment_api", args.host, args.base_port + 1 + index, {
+            "MINDFLOW_SHARD_INDEX": str(index),
+            "MINDFLOW_SHARD_COUNT": str(args.shards),
+            "MINDFLOW_POOL_URL": pool_url,
+            "MINDFLOW_TRUST_FORWARDED_FOR": "1",
+            "MINDFLOW_STATE_DIR": os.path.join(args.state_dir, f"shard-{index}"),
+        }))
+    processes.append(spawn("shard_router", args.host, args.port, {
+        "MINDFLOW_SHARD_URLS": ",".join(shard_urls),
+        "MINDFLOW_POOL_URL": pool_url,
+    }, workers=router_workers))
+    print(f"Router on http://{args.host}:{args.port} ({router_workers} workers) -> {args.shards} shards, "
+          f"pool on {pool_url}", flush=True)
+
+    def shutdown(*_):
+        # A second signal must not interrupt the children's graceful shutdown.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    while all(process.poll() is None for process in processes):
+        time.sleep(0.5)
+    shutdown()
+
+
+if __name__ == "__main__":
+    main()
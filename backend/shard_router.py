@@ -0,0 +1,228 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+import httpx
+import websockets
+from fastapi import FastAPI, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from sharding import HashRing, note_shard, split_by_shard
+
+# Front door of a sharded deployment. Every request that concerns one user
+# goes to the shard that owns that user on the hash ring; the random note
+# feed goes to the shared note pool; likes and other note operations go to
+# the shard that created the note; a few admin endpoints fan out.
+
+SHARD_URLS = [url.rstrip("/") for url in os.environ.get("MINDFLOW_SHARD_URLS", "").split(",") if url]
+POOL_URL = (os.environ.get("MINDFLOW_POOL_URL") or "").rstrip("/") or None
+
+# Paths whose second segment is the user id.
+USER_PATH = re.compile(
+    r"^/api/(?:tasks|progress|activity|users|achievements|assessment|dashboard|insights|events)/([^/]+)(?:/|$)"
+)
+NOTE_USER_PATH = re.compile(r"^/api/notes/(?:user|stats)/([^/]+)$")
+NOTE_PATH = re.compile(r"^/api/notes/(\d+)(?:/|$)")
+# Event streams stay open indefinitely and are passed through as they come.
+EVENTS_PATH = re.compile(r"^/api/events/[^/]+$")
+STREAM_TIMEOUT = httpx.Timeout(30.0, read=None)
+SOCKET_OPEN_TIMEOUT = 30.0
+
+BROADCAST_PATHS = {"/api/templates/reload", "/api/notes/stats/verify", "/api/recommendations/cache"}
+STATIC_USER_SEGMENTS = {"questions", "submit"}
+
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "content-length", "host", "upgrade"}
+
+POOL = "pool"
+BROADCAST = "broadcast"
+Target = Union[int, str]
+
+app = FastAPI(title="Mental Health App Router")
+
+ring = HashRing(range(len(SHARD_URLS))) if SHARD_URLS else None
+_round_robin = itertools.cycle(range(len(SHARD_URLS) or 1))
+client: Optional[httpx.AsyncClient] = None
+
+
+def target_for(method: str, path: str, params: Dict[str, str], body: bytes) -> Target:
+    if path == "/api/notes/random":
+        return POOL if POOL_URL else ring.shard_for(params.get("user_id", ""))
+    if path in BROADCAST_PATHS:
+        return BROADCAST
+
+    match = NOTE_PATH.match(path)
+    if match:
+        return note_shard(int(match.group(1)), len(SHARD_URLS))
+
+    match = NOTE_USER_PATH.match(path) or USER_PATH.match(path)
+    if match and match.group(1) not in STATIC_USER_SEGMENTS:
+        return ring.shard_for(match.group(1))
+
+    if "user_id" in params:
+        return ring.shard_for(params["user_id"])
+
+    if method in ("POST", "PUT", "PATCH") and body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and isinstance(payload.get("user_id"), str):
+            return ring.shard_for(payload["user_id"])
+
+    # Static or user-independent: any shard can answer.
+    return next(_round_robin)
+
+
+async def forward(base_url: str, request: Request, body: bytes) -> Response:
+    headers = [
+        (key, value) for key, value in request.headers.items()
+        if key.lower() not in HOP_BY_HOP and key.lower() != "x-forwarded-for"
+    ]
+    # Shards see the router as their client; this keeps per-IP limits per client.
+    forwarded = request.headers.get("x-forwarded-for")
+    client_ip = request.client.host if request.client else ""
+    headers.append(("x-forwarded-for", f"{forwarded}, {client_ip}" if forwarded else client_ip))
+    upstream = client.build_request(
+        request.method,
+        base_url + request.url.path,
+        params=request.query_params.multi_items(),
+        headers=headers,
+        content=body,
+        timeout=STREAM_TIMEOUT if EVENTS_PATH.match(request.url.path) else httpx.USE_CLIENT_DEFAULT,
+    )
+    try:
+        response = await client.send(upstream, stream=True)
+    except httpx.TransportError:
+        # The shard is down or still starting.
+        return Response(content=json.dumps({"detail": "Shard unavailable"}), status_code=502,
+                        media_type="application/json")
+    response_headers = {key: value for key, value in response.headers.items() if key.lower() not in HOP_BY_HOP}
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers=response_headers,
+            background=BackgroundTask(response.aclose),
+        )
+    try:
+        # Raw bytes, so pre-compressed payloads pass through untouched.
+        content = b"".join([chunk async for chunk in response.aiter_raw()])
+    finally:
+        await response.aclose()
+    return Response(content=content, status_code=response.status_code, headers=response_headers)
+
+
+async def fetch_json(method: str, url: str, payload=None) -> Tuple[int, object]:
+    response = await client.request(method, url, json=payload)
+    return response.status_code, response.json()
+
+
+async def broadcast(request: Request, body: bytes) -> Response:
+    results = await asyncio.gather(*[
+        client.request(request.method, url + request.url.path, params=request.query_params.multi_items(), content=body,
+                       headers={"content-type": request.headers.get("content-type", "application/json")})
+        for url in SHARD_URLS
+    ])
+    status = max(result.status_code for result in results)
+    return Response(
+        content=json.dumps({"shards": [result.json() for result in results]}),
+        status_code=status,
+        media_type="application/json",
+    )
+
+
+async def batch_recommendations(body: bytes) -> Response:
+    payload = json.loads(body or b"{}")
+    user_ids: Optional[List[str]] = payload.get("user_ids")
+    if user_ids is None:
+        requests = {shard: {} for shard in range(len(SHARD_URLS))}
+    else:
+        requests = {shard: {"user_ids": ids} for shard, ids in split_by_shard(ring, user_ids).items()}
+
+    results = await asyncio.gather(*[
+        fetch_json("POST", SHARD_URLS[shard] + "/api/recommendations/batch", shard_payload)
+        for shard, shard_payload in requests.items()
+    ])
+    merged = {"recommendations": {}, "missing": []}
+    for status, result in results:
+        if status != 200:
+            return Response(content=json.dumps(result), status_code=status, media_type="application/json")
+        merged["recommendations"].update(result["recommendations"])
+        merged["missing"] += result["missing"]
+    if user_ids is not None:
+        missing = set(merged["missing"])
+        merged["missing"] = [user_id for user_id in user_ids if user_id in missing]
+    return Response(content=json.dumps(merged), media_type="application/json")
+
+
+@app.on_event("startup")
+async def startup_router():
+    global client
+    if not SHARD_URLS:
+        raise RuntimeError("MINDFLOW_SHARD_URLS must list at least one shard")
+    client = httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=200, max_keepalive_connections=100))
+
+
+@app.on_event("shutdown")
+async def shutdown_router():
+    await client.aclose()
+
+
+@app.websocket("/api/events/{user_id}/ws")
+async def route_event_socket(websocket: WebSocket, user_id: str):
+    # Relayed to the user's shard frame by frame, both ways: the shard sends
+    # the events, and the client's frames are how the shard notices a close.
+    url = "ws" + SHARD_URLS[ring.shard_for(user_id)][len("http"):] + websocket.url.path
+    if websocket.url.query:
+        url += "?" + websocket.url.query
+    try:
+        upstream = await websockets.connect(url, open_timeout=SOCKET_OPEN_TIMEOUT)
+    except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake):
+        await websocket.close(code=1011)
+        return
+    await websocket.accept()
+
+    async def to_client():
+        async for message in upstream:
+            if isinstance(message, str):
+                await websocket.send_text(message)
+            else:
+                await websocket.send_bytes(message)
+
+    async def to_shard():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            await upstream.send(message["text"] if message.get("text") is not None else message["bytes"])
+
+    relays = [asyncio.ensure_future(to_client()), asyncio.ensure_future(to_shard())]
+    try:
+        await asyncio.wait(relays, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for relay in relays:
+            relay.cancel()
+        await upstream.close()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            # The client is already gone.
+            pass
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+async def route(request: Request, path: str):
+    body = await request.body()
+    if request.url.path == "/api/recommendations/batch":
+        return await batch_recommendations(body)
+
+    target = target_for(request.method, request.url.path, dict(request.query_params), body)
+    if target == BROADCAST:
+        return await broadcast(request, body)
+    if target == POOL:
+        return await forward(POOL_URL, request, body)
+    return await forward(SHARD_URLS[target], request, body)
@@ -0,0 +1,161 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Notes created on a shard get ids congruent to the shard index modulo this
+# stride, so a note id alone says which shard owns the note. It is also the
+# upper bound on the number of shards.
+NOTE_ID_STRIDE = 1024
+
+VIRTUAL_NODES = 128
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Consistent hashing with virtual nodes: each shard owns many points on
+    # a 64-bit ring and a user belongs to the first point at or after the
+    # hash of their id. Adding a shard only moves the users it takes over.
+
+    def __init__(self, shards: Iterable[int], virtual_nodes: int = VIRTUAL_NODES):
+        self.shards: List[int] = list(shards)
+        if not self.shards:
+            raise ValueError("A hash ring needs at least one shard")
+        ring = sorted(
+            (_point(f"shard-{shard}#{replica}"), shard)
+            for shard in self.shards
+            for replica in range(virtual_nodes)
+        )
+        self.points = [point for point, _ in ring]
+        self.owners = [shard for _, shard in ring]
+
+    def shard_for(self, user_id: str) -> int:
+        position = bisect.bisect_left(self.points, _point(user_id))
+        return self.owners[position % len(self.points)]
+
+
+def note_shard(note_id: int, shard_count: int) -> int:
+    # Predefined notes exist on every shard; their likes are kept by the
+    # shard this rule picks for them.
+    shard = note_id % NOTE_ID_STRIDE
+    return shard if shard < shard_count else note_id % shard_count
+
+
+class ShardConfig:
+    __slots__ = ("index", "count", "pool_url")
+
+    def __init__(self, index: int = 0, count: int = 1, pool_url: Optional[str] = None):
+        if count < 1 or count > NOTE_ID_STRIDE:
+            raise ValueError(f"Shard count must be between 1 and {NOTE_ID_STRIDE}")
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} is outside 0..{count - 1}")
+        self.index = index
+        self.count = count
+        self.pool_url = pool_url
+
+    @classmethod
+    def from_env(cls) -> "ShardConfig":
+        return cls(
+            index=int(os.environ.get("MINDFLOW_SHARD_INDEX", "0")),
+            count=int(os.environ.get("MINDFLOW_SHARD_COUNT", "1")),
+            pool_url=os.environ.get("MINDFLOW_POOL_URL") or None,
+        )
+
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1 or self.pool_url is not None
+
+    def owns_note(self, note_id: int) -> bool:
+        return note_shard(note_id, self.count) == self.index
+
+
+class PoolPublisher:
+    # Ships note changes to the shared note pool in the background. Changes
+    # are queued without blocking the request, sent in batches, and retried
+    # until the pool accepts them. When the pool reports a new instance id
+    # (it restarted and lost its contents) the shard's whole public set is
+    # sent again.
+
+    def __init__(
+        self,
+        pool_url: str,
+        snapshot: Callable[[], List[Dict]],
+        batch_size: int = 500,
+        retry_interval: float = 1.0,
+    ):
+        self.url = pool_url.rstrip("/") + "/internal/pool/notes"
+        self.snapshot = snapshot
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.pending: deque = deque()
+        self.pool_instance: Optional[str] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def put(self, note: Dict) -> None:
+        self._enqueue({"op": "put", "note": note})
+
+    def remove(self, note_id: int) -> None:
+        self._enqueue({"op": "remove", "note_id": note_id})
+
+    def _enqueue(self, op: Dict) -> None:
+        self.pending.append(op)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_forever(self) -> None:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.pending:
+                    batch = [self.pending[i] for i in range(min(self.batch_size, len(self.pending)))]
+                    try:
+                        response = await client.post(self.url, json={"ops": batch})
+                        response.raise_for_status()
+                        instance = response.json().get("instance")
+                    except Exception:
+                        # Whatever went wrong, the batch is still pending:
+                        # the publisher must outlive any one failure.
+                        logger.exception("Publishing %d note ops to %s failed", len(batch), self.url)
+                        await asyncio.sleep(self.retry_interval)
+                        continue
+                    for _ in batch:
+                        self.pending.popleft()
+
+                    if self.pool_instance is not None and instance != self.pool_instance:
+                        self.pending.extend({"op": "put", "note": note} for note in self.snapshot())
+                    self.pool_instance = instance
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self.pending.extendleft({"op": "put", "note": note} for note in reversed(self.snapshot()))
+            self._wakeup.set()
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def split_by_shard(ring: HashRing, user_ids: Sequence[str]) -> Dict[int, List[str]]:
+    groups: Dict[int, List[str]] = {}
+    for user_id in user_ids:
+        groups.setdefault(ring.shard_for(user_id), []).append(user_id)
+    return groups
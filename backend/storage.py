@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PUT = "put"
+DELETE = "del"
+
+logger = logging.getLogger(__name__)
+
+Op = Tuple[int, str, str, str, Any]
+
+
+class StorageBackend:
+    # Whether compact() keeps a snapshot; when it does not, the collections
+    # are never handed to it.
+    snapshots = False
+
+    def load(self) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        return 0, {}
+
+    def write(self, ops: List[Op]) -> None:
+        pass
+
+    def compact(self, seq: int, collections: Dict[str, Dict[str, Any]]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StorageBackend):
+    pass
+
+
+def read_json_lines(path: str) -> List[Any]:
+    # The values of a JSON-lines file, up to a torn final line from a crash
+    # mid-write. An intact file is parsed as one array, which is several
+    # times faster than a loads() per line.
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    try:
+        return json.loads("[" + ",".join(lines) + "]")
+    except ValueError:
+        pass
+    values = []
+    for line in lines:
+        try:
+            values.append(json.loads(line))
+        except ValueError:
+            break
+    return values
+
+
+class JournalBackend(StorageBackend):
+    # Append-only JSON-lines journal plus a pickled snapshot. Every journal
+    # line carries the sequence number of its mutation, so replay only has to
+    # apply the entries written after the snapshot was taken.
+    snapshots = True
+
+    def __init__(self, directory: str, fsync: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, "snapshot.pickle")
+        self.journal_path = os.path.join(directory, "journal.log")
+        self.fsync = fsync
+        self._journal = None
+
+    def load(self) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        seq = 0
+        collections: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+            seq = snapshot["seq"]
+            collections = snapshot["collections"]
+
+        if os.path.exists(self.journal_path):
+            for op_seq, op, collection, key, value in read_json_lines(self.journal_path):
+                if op_seq <= seq:
+                    continue
+                apply_op(collections, op, collection, key, value)
+                seq = op_seq
+        return seq, collections
+
+    def write(self, ops: List[Op]) -> None:
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def compact(self, seq: int, collections: Dict[str, Dict[str, Any]]) -> None:
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"seq": seq, "collections": collections}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Everything in the journal is now covered by the snapshot.
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class SQLiteBackend(StorageBackend):
+    # One row per key in kv, kept current on every write, plus a pickled
+    # snapshot of all collections. Decoding a JSON value per row is what a
+    # cold start spent most of its time on, so load() starts from the
+    # snapshot and only reads the rows written or removed after it.
+    snapshots = True
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (collection, key))"
+        )
+        if "seq" not in [column[1] for column in self.conn.execute("PRAGMA table_info(kv)")]:
+            # Databases from before the snapshot; their rows predate it.
+            self.conn.execute("ALTER TABLE kv ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS kv_seq ON kv (seq)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS removed ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "PRIMARY KEY (collection, key))"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS snapshot (id INTEGER PRIMARY KEY, seq INTEGER, data BLOB)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self.conn.commit()
+
+    def load(self) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'seq'").fetchone()
+        seq = row[0] if row else 0
+        snapshot = self.conn.execute("SELECT seq, data FROM snapshot WHERE id = 0").fetchone()
+        if snapshot is None:
+            collections: Dict[str, Dict[str, Any]] = {}
+            for collection, key, value in self.conn.execute("SELECT collection, key, value FROM kv"):
+                collections.setdefault(collection, {})[key] = json.loads(value)
+            return seq, collections
+
+        snapshot_seq, data = snapshot
+        collections = pickle.loads(data)
+        changes = self.conn.execute(
+            "SELECT seq, ?, collection, key, value FROM kv WHERE seq > ? "
+            "UNION ALL SELECT seq, ?, collection, key, 'null' FROM removed WHERE seq > ? ORDER BY 1",
+            (PUT, snapshot_seq, DELETE, snapshot_seq),
+        ).fetchall()
+        # Decoded as one array, like the journal.
+        values = json.loads("[" + ",".join([change[4] for change in changes]) + "]")
+        for (_, op, collection, key, _), value in zip(changes, values):
+            apply_op(collections, op, collection, key, value)
+        # The snapshot may cover writes that never reached kv.
+        return max(seq, snapshot_seq), collections
+
+    def write(self, ops: List[Op]) -> None:
+        with self.conn:
+            for op_seq, op, collection, key, value in ops:
+                if op == PUT:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO kv (collection, key, value, seq) VALUES (?, ?, ?, ?)",
+                        (collection, key, json.dumps(value, ensure_ascii=False), op_seq),
+                    )
+                else:
+                    self.conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key))
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO removed (collection, key, seq) VALUES (?, ?, ?)",
+                        (collection, key, op_seq),
+                    )
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('seq', ?)", (ops[-1][0],))
+
+    def compact(self, seq: int, collections: Dict[str, Dict[str, Any]]) -> None:
+        data = pickle.dumps(collections, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO snapshot (id, seq, data) VALUES (0, ?, ?)", (seq, data))
+            self.conn.execute("DELETE FROM removed WHERE seq <= ?", (seq,))
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def apply_op(collections: Dict[str, Dict[str, Any]], op: str, collection: str, key: str, value: Any) -> None:
+    if op == PUT:
+        collections.setdefault(collection, {})[key] = value
+    else:
+        collections.get(collection, {}).pop(key, None)
+
+
+class Storage:
+    # Mutations are recorded in memory and handed to the backend by a
+    # background writer thread, so put()/delete() cost a dict update and a
+    # list append on the request path. Values must be treated as immutable
+    # once passed in.
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        flush_interval: float = 0.05,
+        snapshot_every: int = 50000,
+        state_dir: Optional[str] = None,
+    ):
+        self.backend = backend
+        # Where files kept next to the collections go; None when nothing is
+        # persisted.
+        self.state_dir = state_dir
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.collections: Dict[str, Dict[str, Any]] = {}
+        self.seq = 0
+        self._pending: List[Op] = []
+        # Writes made while a snapshot is being written, applied to the
+        # collections once it is done.
+        self._held: Optional[List[Op]] = None
+        self._since_snapshot = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._writer: Optional[threading.Thread] = None
+        # Called from the writer thread after every flush, for state that is
+        # written alongside the collections rather than through them.
+        self.flush_hooks: List[Callable[[], None]] = []
+
+    @property
+    def pending_count(self) -> int:
+        # Writes recorded but not yet handed to the backend.
+        return len(self._pending)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        self.seq, self.collections = self.backend.load()
+        return self.collections
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._stopping = False
+            self._writer = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+            self._writer.start()
+
+    def put(self, collection: str, key: str, value: Any) -> None:
+        self._record(PUT, collection, key, value)
+
+    def delete(self, collection: str, key: str) -> None:
+        self._record(DELETE, collection, key, None)
+
+    def _record(self, op: str, collection: str, key: str, value: Any) -> None:
+        with self._lock:
+            self.seq += 1
+            entry = (self.seq, op, collection, key, value)
+            if self._held is None:
+                apply_op(self.collections, op, collection, key, value)
+            else:
+                self._held.append(entry)
+            self._pending.append(entry)
+            self._since_snapshot += 1
+
+    def flush(self, compact: bool = False) -> None:
+        with self._lock:
+            ops, self._pending = self._pending, []
+        if ops:
+            try:
+                self.backend.write(ops)
+            except Exception:
+                # Back in front of anything recorded since, for the next try.
+                with self._lock:
+                    self._pending[:0] = ops
+                raise
+        if compact or self._since_snapshot >= self.snapshot_every:
+            self._snapshot()
+        for hook in self.flush_hooks:
+            hook()
+
+    def _snapshot(self) -> None:
+        if not self.backend.snapshots:
+            with self._lock:
+                self._since_snapshot = 0
+            return
+        # The collections are handed over as they are, without a copy: until
+        # the snapshot is written, new writes are held back and applied to
+        # them afterwards, so writers never wait on the pickling.
+        with self._lock:
+            seq, self._held = self.seq, []
+            covered = self._since_snapshot
+        written = False
+        try:
+            self.backend.compact(seq, self.collections)
+            written = True
+        finally:
+            with self._lock:
+                for _, op, collection, key, value in self._held:
+                    apply_op(self.collections, op, collection, key, value)
+                self._held = None
+                if written:
+                    self._since_snapshot -= covered
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Storage flush failed, %d writes pending; retrying", self.pending_count)
+
+    def close(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self.flush(compact=True)
+        self.backend.close()
+
+
+def create_storage_from_env() -> Storage:
+    kind = os.environ.get("MINDFLOW_STORAGE", "journal").lower()
+    state_dir = os.environ.get(
+        "MINDFLOW_STATE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "state"),
+    )
+
+    if kind == "memory":
+        backend: StorageBackend = MemoryBackend()
+    elif kind == "sqlite":
+        backend = SQLiteBackend(os.path.join(state_dir, "mindflow.db"))
+    elif kind == "journal":
+        backend = JournalBackend(state_dir, fsync=os.environ.get("MINDFLOW_FSYNC") == "1")
+    else:
+        raise ValueError(f"Unknown MINDFLOW_STORAGE backend: {kind}")
+
+    return Storage(
+        backend,
+        snapshot_every=int(os.environ.get("MINDFLOW_SNAPSHOT_EVERY", "50000")),
+        state_dir=None if kind == "memory" else state_dir,
+    )
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import re
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from lru_cache import LRUCache
+
+HASH_BITS = 20
+CACHE_SIZE = 4096
+MIN_SIMILARITY = 0.05
+
+STOPWORDS = frozenset(
+    "a about after all am an and any are as at be been but by can could did do does doing for from "
+    "had has have having he her him his how i if in into is it its just me more most my myself no "
+    "nor not of off on once only or other our out over own same she so some such than that the "
+    "their them then there these they this those through to too under until up very was we were "
+    "what when where which while who why will with would you your".split()
+)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def text_key(text: str) -> str:
+    # Descriptions that differ only in case, punctuation or spacing share a key.
+    return hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def features(text: str) -> Dict[int, int]:
+    # Word unigrams and bigrams plus character trigrams of each word, hashed
+    # into a fixed space. crc32 keeps the hashing stable across processes.
+    words = [word for word in normalize(text).split() if word not in STOPWORDS]
+    grams = [f"w {word}" for word in words]
+    grams += [f"b {first} {second}" for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [f"c {padded[i:i + 3]}" for i in range(len(padded) - 2)]
+
+    counts: Dict[int, int] = {}
+    mask = (1 << HASH_BITS) - 1
+    for gram in grams:
+        feature = zlib.crc32(gram.encode("utf-8")) & mask
+        counts[feature] = counts.get(feature, 0) + 1
+    return counts
+
+
+class Classification(NamedTuple):
+    categories: Tuple[Tuple[str, float], ...]
+    template_scores: Dict[int, float]
+
+    def top_categories(self, count: int, min_similarity: float = MIN_SIMILARITY) -> List[str]:
+        return [category for category, score in self.categories[:count] if score >= min_similarity]
+
+
+class StruggleClassifier:
+    # TF-IDF over hashed n-grams. Template and category vectors are computed
+    # once and stored as postings (feature -> documents, weights), so scoring a
+    # description only touches the features it contains. Results are cached
+    # by the hash of the normalized text.
+
+    def __init__(self, templates: Iterable[Dict], category_texts: Dict[str, str], cache_size: int = CACHE_SIZE):
+        templates = list(templates)
+        self.template_ids = np.array([template["id"] for template in templates], dtype=np.int64)
+        self.categories: List[str] = list(category_texts)
+        self.template_categories = np.array(
+            [self.categories.index(template["category"]) if template["category"] in category_texts else -1
+             for template in templates],
+            dtype=np.int64,
+        )
+
+        documents = [_template_text(template) for template in templates]
+        documents += [category_texts[category] for category in self.categories]
+        counts = [features(document) for document in documents]
+
+        document_frequency: Dict[int, int] = {}
+        for document in counts:
+            for feature in document:
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        total = len(counts)
+        self.idf = {
+            feature: math.log((1 + total) / (1 + frequency)) + 1.0
+            for feature, frequency in document_frequency.items()
+        }
+
+        postings: Dict[int, List[Tuple[int, float]]] = {}
+        for row, document in enumerate(counts):
+            for feature, weight in self._weights(document).items():
+                postings.setdefault(feature, []).append((row, weight))
+        self.postings = {
+            feature: (np.array([row for row, _ in entries], dtype=np.int64),
+                      np.array([weight for _, weight in entries], dtype=np.float64))
+            for feature, entries in postings.items()
+        }
+        self.template_count = len(templates)
+
+        self.cache = LRUCache(cache_size)
+
+    def _weights(self, counts: Dict[int, int]) -> Dict[int, float]:
+        weights = {
+            feature: (1.0 + math.log(count)) * self.idf[feature]
+            for feature, count in counts.items()
+            if feature in self.idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if norm:
+            for feature in weights:
+                weights[feature] /= norm
+        return weights
+
+    def similarities(self, text: str) -> np.ndarray:
+        # Cosine similarity against every template, then every category.
+        scores = np.zeros(self.template_count + len(self.categories), dtype=np.float64)
+        for feature, weight in self._weights(features(text)).items():
+            rows, values = self.postings[feature]
+            scores[rows] += values * weight
+        return scores
+
+    def classify(self, text: str) -> Classification:
+        key = text_key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        scores = self.similarities(text)
+        template_scores = scores[:self.template_count]
+
+        # A category is as close as its own description or its best template.
+        category_scores = scores[self.template_count:].copy()
+        matched = self.template_categories >= 0
+        np.maximum.at(category_scores, self.template_categories[matched], template_scores[matched])
+
+        order = np.argsort(-category_scores, kind="stable")
+        nonzero = np.flatnonzero(template_scores)
+        result = Classification(
+            categories=tuple((self.categories[i], float(category_scores[i])) for i in order),
+            template_scores={int(self.template_ids[i]): float(template_scores[i]) for i in nonzero},
+        )
+
+        self.cache.put(key, result)
+        return result
+
+    def rank_templates(self, text: Optional[str], templates: List[Dict]) -> List[Dict]:
+        if not text:
+            return templates
+        scores = self.classify(text).template_scores
+        return sorted(templates, key=lambda template: -scores.get(template["id"], 0.0))
+
+
+def _template_text(template: Dict) -> str:
+    return " ".join([
+        template["category"].replace("_", " "),
+        template["title"],
+        template["description"],
+        *template.get("steps", []),
+    ])
@@ -0,0 +1,147 @@
+import bisect
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "task_templates.json")
+
+DURATION_PATTERN = re.compile(r"(\d+)\s*(?:-\s*(\d+)\s*)?(minutes?|mins?|hours?|hrs?)", re.IGNORECASE)
+
+
+def parse_duration(duration: str) -> Tuple[int, int]:
+    # "5-15 minutes" -> (5, 15), "10 minutes" -> (10, 10), "1 hour" -> (60, 60).
+    match = DURATION_PATTERN.search(duration)
+    if match is None:
+        raise ValueError(f"Cannot parse duration {duration!r}")
+    low = int(match.group(1))
+    high = int(match.group(2)) if match.group(2) else low
+    if match.group(3).lower().startswith("h"):
+        low, high = low * 60, high * 60
+    return min(low, high), max(low, high)
+
+
+def _union(index: Dict, keys: Optional[Iterable]) -> int:
+    bits = 0
+    for key in keys:
+        bits |= index.get(key, 0)
+    return bits
+
+
+class TaskCatalog:
+    # Templates are numbered by position and every facet maps a value to a
+    # bitset of positions, so a faceted query is a handful of ANDs over
+    # Python ints. Durations are answered with prefix/suffix bitsets over the
+    # templates sorted by their longest and shortest durations.
+
+    def __init__(self, templates: Iterable[Dict], categories: Optional[Dict[str, Dict]] = None):
+        templates = list(templates)
+        self.category_info: Dict[str, Dict] = dict(categories or {})
+        # Changes whenever the catalog content does, so anything derived from
+        # it can be keyed on the version.
+        self.version = hashlib.blake2b(
+            json.dumps([templates, self.category_info], sort_keys=True).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        self.templates: List[Dict] = []
+        self.by_id: Dict[int, Dict] = {}
+        self.position: Dict[int, int] = {}
+        self.by_category: Dict[str, int] = {}
+        self.by_difficulty: Dict[str, int] = {}
+        self.by_energy: Dict[int, int] = {}
+
+        for template in templates:
+            if template["id"] in self.by_id:
+                raise ValueError(f"Task template id {template['id']} is used twice")
+            template = dict(template)
+            template["min_minutes"], template["max_minutes"] = parse_duration(template["duration"])
+            position = len(self.templates)
+            bit = 1 << position
+            self.templates.append(template)
+            self.by_id[template["id"]] = template
+            self.position[template["id"]] = position
+            self.by_category[template["category"]] = self.by_category.get(template["category"], 0) | bit
+            self.by_difficulty[template["difficulty"]] = self.by_difficulty.get(template["difficulty"], 0) | bit
+            level = template.get("energy_level", 3)
+            self.by_energy[level] = self.by_energy.get(level, 0) | bit
+
+        self.all = (1 << len(self.templates)) - 1
+        self._max_values, self._at_most = self._cumulative("max_minutes", reverse=False)
+        self._min_values, self._at_least = self._cumulative("min_minutes", reverse=True)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_CATALOG_PATH) -> "TaskCatalog":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["templates"], data.get("categories"))
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    @property
+    def categories(self) -> List[str]:
+        return list(dict.fromkeys([*self.category_info, *self.by_category]))
+
+    def keywords(self, category: str) -> List[str]:
+        return self.category_info.get(category, {}).get("keywords", [])
+
+    def _cumulative(self, field: str, reverse: bool) -> Tuple[List[int], List[int]]:
+        # values[i] is the i-th distinct value in ascending order. For
+        # reverse=False, masks[i] holds every template with field <= values[i];
+        # for reverse=True, every template with field >= values[i].
+        values = sorted({template[field] for template in self.templates})
+        masks = [0] * len(values)
+        for position, template in enumerate(self.templates):
+            masks[bisect.bisect_left(values, template[field])] |= 1 << position
+        running = 0
+        order = range(len(values) - 1, -1, -1) if reverse else range(len(values))
+        for i in order:
+            running |= masks[i]
+            masks[i] = running
+        return values, masks
+
+    def mask(
+        self,
+        categories: Optional[Iterable[str]] = None,
+        difficulties: Optional[Iterable[str]] = None,
+        energy_levels: Optional[Iterable[int]] = None,
+        max_minutes: Optional[int] = None,
+        min_minutes: Optional[int] = None,
+        exclude_ids: Optional[Iterable[int]] = None,
+    ) -> int:
+        bits = self.all
+        if categories is not None:
+            bits &= _union(self.by_category, categories)
+        if difficulties is not None:
+            bits &= _union(self.by_difficulty, difficulties)
+        if energy_levels is not None:
+            bits &= _union(self.by_energy, energy_levels)
+        if max_minutes is not None:
+            i = bisect.bisect_right(self._max_values, max_minutes) - 1
+            bits &= self._at_most[i] if i >= 0 else 0
+        if min_minutes is not None:
+            i = bisect.bisect_left(self._min_values, min_minutes)
+            bits &= self._at_least[i] if i < len(self._min_values) else 0
+        if exclude_ids is not None and bits:
+            excluded = 0
+            for template_id in exclude_ids:
+                position = self.position.get(template_id)
+                if position is not None:
+                    excluded |= 1 << position
+            bits &= ~excluded
+        return bits
+
+    def templates_in(self, bits: int, limit: Optional[int] = None) -> List[Dict]:
+        # Lowest bit first, so results keep catalog order.
+        result = []
+        while bits and (limit is None or len(result) < limit):
+            low = bits & -bits
+            result.append(self.templates[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def query(self, limit: Optional[int] = None, **facets) -> List[Dict]:
+        return self.templates_in(self.mask(**facets), limit)
+
+    def count(self, **facets) -> int:
+        return bin(self.mask(**facets)).count("1")
@@ -0,0 +1,242 @@
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+LOCAL_EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def epoch_day(d: date) -> int:
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def date_from_epoch_day(day: int) -> date:
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+
+def timestamp_us(moment: datetime) -> int:
+    # Microseconds since the epoch on the same naive local clock the
+    # timestamps are shown in, so the round trip gives back the same string.
+    return (moment - LOCAL_EPOCH) // MICROSECOND
+
+
+def datetime_from_us(value: int) -> datetime:
+    return LOCAL_EPOCH + timedelta(microseconds=value)
+
+
+class TaskTemplate:
+    # Everything about a task that is not per-user state. Identical content
+    # is stored once however many users or days it appears for.
+
+    __slots__ = ("id", "title", "description", "category", "difficulty", "estimated_duration",
+                 "energy_level", "steps", "ai_generated")
+
+    def __init__(
+        self,
+        template_id: int,
+        title: str,
+        description: str,
+        category: str,
+        difficulty: str,
+        estimated_duration: str,
+        energy_level: int = 3,
+        steps: Sequence[str] = (),
+        ai_generated: bool = False,
+    ):
+        self.id = template_id
+        self.title = title
+        self.description = description
+        self.category = category
+        self.difficulty = difficulty
+        self.estimated_duration = estimated_duration
+        self.energy_level = energy_level
+        self.steps = tuple(steps)
+        self.ai_generated = ai_generated
+
+    def key(self) -> tuple:
+        return (self.title, self.description, self.category, self.difficulty, self.estimated_duration,
+                self.energy_level, self.steps, self.ai_generated)
+
+    def to_json(self) -> Dict:
+        return {
+            "title": self.title,
+            "description": self.description,
+            "category": self.category,
+            "difficulty": self.difficulty,
+            "estimated_duration": self.estimated_duration,
+            "energy_level": self.energy_level,
+            "steps": list(self.steps),
+            "ai_generated": self.ai_generated,
+        }
+
+
+class TaskTemplates:
+    # Content-addressed table of task templates, numbered in order of first
+    # appearance. The starter tasks, the catalog templates and whatever
+    # clients pick with /select all end up here once.
+
+    def __init__(self):
+        self.by_id: Dict[int, TaskTemplate] = {}
+        self.by_key: Dict[tuple, TaskTemplate] = {}
+        self.next_id = 1
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, template_id: int) -> TaskTemplate:
+        return self.by_id[template_id]
+
+    def intern(self, **fields) -> Tuple[TaskTemplate, bool]:
+        # The template with this content, and whether it was just created.
+        template = TaskTemplate(self.next_id, **fields)
+        existing = self.by_key.get(template.key())
+        if existing is not None:
+            return existing, False
+        self._add(template)
+        return template, True
+
+    def load(self, template_id: int, data: Dict) -> TaskTemplate:
+        template = TaskTemplate(template_id, **data)
+        self._add(template)
+        return template
+
+    def _add(self, template: TaskTemplate) -> None:
+        self.by_id[template.id] = template
+        self.by_key.setdefault(template.key(), template)
+        self.next_id = max(self.next_id, template.id + 1)
+
+
+class TaskRecord:
+    # One task of one user: its id, its template and its own state. The day
+    # is the UserTaskIndex bucket it sits in and the timestamps are
+    # timestamp_us() integers, so a task is a handful of references to
+    # objects it mostly shares with others.
+
+    __slots__ = ("task_id", "template_id", "status", "created_at", "completed_at")
+
+    def __init__(self, task_id: int, template_id: int, status, created_at: int, completed_at: Optional[int] = None):
+        self.task_id = task_id
+        self.template_id = template_id
+        self.status = status
+        self.created_at = created_at
+        self.completed_at = completed_at
+
+
+class UserTaskIndex:
+    # A user's tasks bucketed by the epoch-day they were created on, plus a
+    # task_id map to the days holding a task with that id, most recently
+    # added last (default tasks reuse ids 1-3 every day). An id that lives in
+    # one day maps to that day alone; only reused ids pay for a list. A day
+    # holds a handful of tasks, so finding the task in it is cheaper than a
+    # tuple per task.
+    #
+    # Days loaded from storage stay stored rows until the index is first
+    # used: most users of a restarted server are not looked at for a while,
+    # and a start shouldn't pay for building every task of every one of them.
+
+    __slots__ = ("days", "by_id", "count", "stored")
+
+    def __init__(self):
+        self.days: Dict[int, List] = {}
+        self.by_id: Dict[int, Union[int, List[int]]] = {}
+        self.count = 0
+        self.stored: Optional[Tuple[Callable, List[Tuple[int, Sequence]]]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def load(self, day: int, rows: Sequence, build: Callable) -> None:
+        # Keeps a day's stored rows for build(row) to turn into tasks later.
+        # Days must be loaded in order, like they are added.
+        if self.stored is None:
+            self.stored = (build, [])
+        self.stored[1].append((day, rows))
+        self.count += len(rows)
+
+    def _build(self) -> None:
+        build, days = self.stored
+        self.stored = None
+        for day, rows in days:
+            self.count -= len(rows)
+            self.extend(day, [build(row) for row in rows])
+
+    def for_day(self, day: int) -> List:
+        if self.stored is not None:
+            self._build()
+        return self.days.get(day, [])
+
+    def get(self, task_id: int) -> Optional[Tuple[int, object]]:
+        if self.stored is not None:
+            self._build()
+        days = self.by_id.get(task_id)
+        if days is None:
+            return None
+        day = days if isinstance(days, int) else days[-1]
+        for task in reversed(self.days[day]):
+            if task.task_id == task_id:
+                return day, task
+        return None
+
+    def add(self, day: int, task) -> None:
+        if self.stored is not None:
+            self._build()
+        self.days.setdefault(day, []).append(task)
+        days = self.by_id.get(task.task_id)
+        if days is None:
+            self.by_id[task.task_id] = day
+        elif days != day:
+            self._make_newest(task.task_id, days, day)
+        self.count += 1
+
+    def extend(self, day: int, tasks: Sequence) -> None:
+        # add() for a whole day: most ids are new to the index or already
+        # point at this day.
+        if self.stored is not None:
+            self._build()
+        self.days.setdefault(day, []).extend(tasks)
+        by_id = self.by_id
+        for task in tasks:
+            days = by_id.get(task.task_id)
+            if days is None:
+                by_id[task.task_id] = day
+            elif days != day:
+                self._make_newest(task.task_id, days, day)
+        self.count += len(tasks)
+
+    def _make_newest(self, task_id: int, days: Union[int, List[int]], day: int) -> None:
+        # Makes day the newest day of a task id that already has one.
+        if isinstance(days, int):
+            self.by_id[task_id] = [days, day]
+        elif days[-1] != day:
+            if day in days:
+                days.remove(day)
+            days.append(day)
+
+    def clear_day(self, day: int) -> List:
+        # O(tasks in the day): the cleared day is almost always the newest
+        # entry of each of its ids.
+        if self.stored is not None:
+            self._build()
+        removed = self.days.pop(day, [])
+        if not removed:
+            return removed
+        self.count -= len(removed)
+
+        for task_id in {task.task_id for task in removed}:
+            days = self.by_id[task_id]
+            if isinstance(days, int):
+                del self.by_id[task_id]
+                continue
+            if days[-1] == day:
+                days.pop()
+            else:
+                days.remove(day)
+            if len(days) == 1:
+                self.by_id[task_id] = days[0]
+        return removed
+
+    def items(self) -> Iterator[Tuple[int, List]]:
+        if self.stored is not None:
+            self._build()
+        for day in sorted(self.days):
+            yield day, self.days[day]
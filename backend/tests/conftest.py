@@ -0,0 +1,31 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+# The app reads these at import time: keep tests off the disk and unthrottled.
+os.environ["MINDFLOW_STORAGE"] = "memory"
+os.environ["MINDFLOW_RATE_LIMITS"] = "0"
+os.environ.pop("MINDFLOW_PROFILE_TOKEN", None)
+os.environ.pop("MINDFLOW_PROFILE_SAMPLE_RATE", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def api():
+    import assessment_api
+    return assessment_api
+
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+    return TestClient(api.app)
+
+
+@pytest.fixture
+def user_id():
+    # The app's state is module-global, so every test works on fresh users.
+    return f"test-{uuid.uuid4().hex[:12]}"
@@ -0,0 +1,69 @@
+import pytest
+
+from achievements import AchievementEngine
+
+COUNTERS = {"streak": "current_streak", "tasks": "total_tasks_completed"}
+
+
+def definition(bit, achievement_id, threshold, achievement_type="streak"):
+    return {"bit": bit, "id": achievement_id, "type": achievement_type, "threshold": threshold}
+
+
+@pytest.fixture
+def engine():
+    return AchievementEngine(
+        [
+            definition(0, "streak_5", 5),
+            definition(1, "streak_7", 7),
+            definition(2, "streak_14", 14),
+            definition(3, "tasks_10", 10, "tasks"),
+        ],
+        COUNTERS,
+    )
+
+
+def test_nothing_below_the_first_threshold(engine):
+    assert engine.evaluate(0, "streak", 4) == (0, [])
+    assert engine.evaluate(0, "unknown", 100) == (0, [])
+
+
+def test_unlocks_every_reached_threshold_in_order(engine):
+    unlocked, new = engine.evaluate(0, "streak", 7)
+    assert new == ["streak_5", "streak_7"]
+    assert engine.is_unlocked(unlocked, "streak_7")
+    assert not engine.is_unlocked(unlocked, "streak_14")
+
+    assert engine.evaluate(unlocked, "streak", 7) == (unlocked, [])
+    unlocked, new = engine.evaluate(unlocked, "streak", 20)
+    assert new == ["streak_14"]
+    assert unlocked == engine.mask_for(["streak_5", "streak_7", "streak_14"])
+
+
+def test_types_are_independent(engine):
+    unlocked, new = engine.evaluate(0, "tasks", 10)
+    assert new == ["tasks_10"]
+    assert engine.evaluate(unlocked, "streak", 4) == (unlocked, [])
+
+
+def test_threshold_added_below_an_unlocked_one_still_unlocks(engine):
+    unlocked, _ = engine.evaluate(0, "streak", 14)
+    extended = AchievementEngine(
+        engine.definitions + [definition(4, "streak_3", 3), definition(5, "streak_7b", 7)], COUNTERS
+    )
+
+    unlocked, new = extended.evaluate(unlocked, "streak", 14)
+    assert new == ["streak_3", "streak_7b"]
+    assert extended.evaluate(unlocked, "streak", 14) == (unlocked, [])
+
+
+def test_duplicate_bits_and_unknown_types_are_rejected():
+    with pytest.raises(ValueError):
+        AchievementEngine([definition(0, "a", 1), definition(0, "b", 2)], COUNTERS)
+    with pytest.raises(ValueError):
+        AchievementEngine([definition(0, "a", 1, "hugs")], COUNTERS)
+
+
+def test_bundled_definitions_load():
+    engine = AchievementEngine.from_file()
+    assert set(engine.types) == {"streak", "tasks", "notes"}
+    assert len(engine.by_id) == len(engine.definitions)
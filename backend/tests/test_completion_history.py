@@ -0,0 +1,88 @@
+import numpy as np
+
+from completion_history import US_PER_DAY, CompletionHistory, week_of, week_start
+
+DAY = 20_000
+
+
+def at(day: int) -> int:
+    return day * US_PER_DAY + 3_600_000_000
+
+
+def fill(history: CompletionHistory) -> None:
+    history.append("alice", at(DAY), "mindset", "easy", 3)
+    history.append("alice", at(DAY + 1), "movement", "hard", 5)
+    history.append("bob", at(DAY + 9), "mindset", "medium", 2)
+    history.append("alice", at(DAY + 21), "mindset", "easy", 4)
+    history.append("alice", at(DAY + 21), "mindset", "easy", 4, delta=-1)
+
+
+def windows(history: CompletionHistory, user_id: str):
+    return history.weekly(user_id, week_of(DAY) - 1, 6)
+
+
+def assert_same_counts(before: np.ndarray, after: np.ndarray) -> None:
+    # Rollups only grow the columns they need, so widths can differ.
+    if before.ndim == 2:
+        width = max(before.shape[1], after.shape[1])
+        before = np.pad(before, ((0, 0), (0, width - before.shape[1])))
+        after = np.pad(after, ((0, 0), (0, width - after.shape[1])))
+    np.testing.assert_array_equal(before, after)
+
+
+def test_weekly_sums_completions_and_undos():
+    history = CompletionHistory()
+    fill(history)
+
+    counts, energy, difficulty = windows(history, "alice")
+    categories = history.category_names()
+    assert counts[1, categories.index("mindset")] == 1
+    assert counts[1, categories.index("movement")] == 1
+    assert energy[1] == 8
+    assert counts[4].sum() == 0 and energy[4] == 0
+    assert difficulty[1, history.difficulty_names().index("hard")] == 1
+    assert history.weekly("carol", 0, 4) is None
+
+
+def test_loaded_history_matches_the_written_one(tmp_path):
+    written = CompletionHistory(str(tmp_path))
+    fill(written)
+    written.flush()
+
+    loaded = CompletionHistory(str(tmp_path))
+    assert loaded.load()
+    assert len(loaded) == len(written)
+    for user_id in ("alice", "bob"):
+        for before, after in zip(windows(written, user_id), windows(loaded, user_id)):
+            assert_same_counts(before, after)
+
+    # Rows appended after the load land on top of the loaded ones.
+    loaded.append("bob", at(DAY + 9), "movement", "easy", 1)
+    counts, energy, _ = windows(loaded, "bob")
+    assert counts[2].sum() == 2 and energy[2] == 3
+
+
+def test_appending_before_looking_keeps_loaded_rows(tmp_path):
+    written = CompletionHistory(str(tmp_path))
+    fill(written)
+    written.flush()
+
+    loaded = CompletionHistory(str(tmp_path))
+    loaded.load()
+    loaded.append("alice", at(DAY - 14), "mindset", "easy", 1)
+    counts, energy, _ = loaded.weekly("alice", week_of(DAY) - 2, 3)
+    assert counts[0].sum() == 1
+    assert counts[2].sum() == 2 and energy[2] == 8
+
+
+def test_an_empty_history_is_written_once(tmp_path):
+    history = CompletionHistory(str(tmp_path))
+    assert not history.load()
+    history.flush()
+    assert CompletionHistory(str(tmp_path)).load()
+
+
+def test_weeks_start_on_monday():
+    # 1970-01-05 was a Monday.
+    assert week_start(week_of(4)) == 4
+    assert week_of(4) == week_of(10) != week_of(11)
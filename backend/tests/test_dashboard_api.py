@@ -0,0 +1,43 @@
+import pytest
+
+SECTIONS = {"tasks", "progress", "achievements", "note", "quote"}
+
+
+def test_dashboard_matches_the_separate_endpoints(client, user_id):
+    dashboard = client.get(f"/api/dashboard/{user_id}").json()
+    assert set(dashboard) == {"user_id", *SECTIONS}
+    assert dashboard["user_id"] == user_id
+    assert dashboard["tasks"] == client.get(f"/api/tasks/{user_id}").json()
+    assert dashboard["progress"] == client.get(f"/api/progress/{user_id}").json()
+    assert dashboard["achievements"] == client.get(f"/api/achievements/{user_id}").json()
+    assert dashboard["quote"]["quote"]
+
+
+def test_a_new_users_starter_tasks_are_counted_in_the_same_response(client, user_id):
+    dashboard = client.get(f"/api/dashboard/{user_id}").json()
+    assert len(dashboard["tasks"]["tasks"]) == dashboard["progress"]["today"]["total"] > 0
+    assert dashboard["progress"]["today"]["completed"] == 0
+
+
+def test_sections_can_be_picked(client, user_id):
+    task_id = client.get(f"/api/tasks/{user_id}").json()["tasks"][0]["task_id"]
+    assert client.post(f"/api/tasks/{user_id}/complete/{task_id}").status_code == 200
+
+    dashboard = client.get(f"/api/dashboard/{user_id}", params={"sections": "progress, tasks"}).json()
+    assert set(dashboard) == {"user_id", "tasks", "progress"}
+    assert dashboard["progress"]["today"]["completed"] == 1
+
+
+@pytest.mark.parametrize("sections", ["tasks,bogus", "notes"])
+def test_unknown_sections_are_rejected(client, user_id, sections):
+    response = client.get(f"/api/dashboard/{user_id}", params={"sections": sections})
+    assert response.status_code == 422
+    assert "Available: tasks, progress" in response.json()["detail"]
+
+
+def test_the_note_is_someone_elses(client, user_id):
+    response = client.post("/api/notes/daily", json={"user_id": user_id, "message": "A calm walk this morning"})
+    assert response.status_code == 200
+    for _ in range(20):
+        note = client.get(f"/api/dashboard/{user_id}", params={"sections": "note"}).json()["note"]
+        assert note["user_id"] != user_id
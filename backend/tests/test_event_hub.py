@@ -0,0 +1,89 @@
+import asyncio
+
+from event_hub import RESYNC, EventHub
+
+
+def drain(subscription):
+    events = []
+    while subscription.pending:
+        events.append(subscription.pending.popleft())
+    return events
+
+
+def test_a_reconnect_replays_what_came_after_its_last_event():
+    hub = EventHub()
+    first = hub.subscribe("someone")
+    for index in range(3):
+        hub.publish("someone", "task_completed", {"task_id": index})
+    events = drain(first)
+    assert [event.data["task_id"] for event in events] == [0, 1, 2]
+
+    again = hub.subscribe("someone", events[0].id)
+    assert [event.id for event in drain(again)] == [event.id for event in events[1:]]
+
+
+def test_nobody_listening_keeps_nothing():
+    hub = EventHub()
+    assert hub.publish("someone", "task_completed", {}) == 0
+    assert hub.history == {}
+
+
+def test_an_unknown_id_gets_a_resync_that_can_be_resumed_from():
+    hub = EventHub()
+    hub.subscribe("other")
+    hub.publish("other", "task_completed", {})
+
+    stale = drain(hub.subscribe("someone", "deadbeef-1"))
+    assert [event.event for event in stale] == [RESYNC]
+    assert stale[0].id == f"{hub.instance}-{hub.seq}"
+    assert b"id: \n" not in stale[0].sse
+
+    hub.publish("someone", "streak_changed", {"current": 1})
+    resumed = drain(hub.subscribe("someone", stale[0].id))
+    assert [event.event for event in resumed] == ["streak_changed"]
+
+
+def test_an_expired_id_gets_a_resync():
+    hub = EventHub(history_size=2)
+    subscription = hub.subscribe("someone")
+    for index in range(4):
+        hub.publish("someone", "task_completed", {"task_id": index})
+    events = drain(subscription)
+
+    assert [event.event for event in drain(hub.subscribe("someone", events[0].id))] == [RESYNC]
+    assert [event.id for event in drain(hub.subscribe("someone", events[2].id))] == [events[3].id]
+
+
+def test_a_slow_subscriber_is_told_to_refetch():
+    hub = EventHub(buffer_size=2)
+    subscription = hub.subscribe("someone")
+    for index in range(3):
+        hub.publish("someone", "task_completed", {"task_id": index})
+
+    pending = drain(subscription)
+    assert [event.event for event in pending] == [RESYNC]
+    # The refetch covers the event that overflowed, so a reconnect starts after it.
+    hub.publish("someone", "task_completed", {"task_id": 3})
+    resumed = drain(hub.subscribe("someone", pending[0].id))
+    assert [event.data["task_id"] for event in resumed] == [3]
+
+
+def test_next_waits_for_a_publish_and_returns_none_on_timeout_or_close():
+    hub = EventHub()
+
+    async def run():
+        subscription = hub.subscribe("someone")
+        assert await subscription.next(0.01) is None
+        waiting = asyncio.ensure_future(subscription.next(5))
+        await asyncio.sleep(0)
+        hub.publish("someone", "task_completed", {"task_id": 1})
+        assert (await waiting).data == {"task_id": 1}
+
+        waiting = asyncio.ensure_future(subscription.next(5))
+        await asyncio.sleep(0)
+        subscription.close()
+        assert await waiting is None
+        hub.unsubscribe(subscription)
+        assert len(hub) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import httpx
+
+# The event routes never finish on their own, which the test clients wait
+# for, so these tests speak ASGI to the app directly. Everything runs on one
+# event loop, the one the hub's waiters belong to.
+
+
+def scope_for(kind, path, headers=(), query=None):
+    return {
+        "type": kind, "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": urlencode(query or {}).encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": ("127.0.0.1", 50000), "server": ("test", 80),
+    }
+
+
+class Connection:
+    def __init__(self, app, scope, first_message):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.incoming.put_nowait(first_message)
+        self.task = asyncio.ensure_future(app(scope, self.incoming.get, self.outgoing.put))
+
+    async def close(self, message):
+        await self.incoming.put(message)
+        try:
+            await asyncio.wait_for(self.task, 5)
+        except asyncio.TimeoutError:
+            self.task.cancel()
+
+
+class EventStream(Connection):
+    def __init__(self, app, user_id, last_event_id=None):
+        headers = [("last-event-id", last_event_id)] if last_event_id else []
+        super().__init__(app, scope_for("http", f"/api/events/{user_id}", headers),
+                         {"type": "http.request", "body": b"", "more_body": False})
+
+    async def opened(self):
+        # The stream subscribes before it sends the retry interval.
+        message = await asyncio.wait_for(self.outgoing.get(), 5)
+        assert message["status"] == 200
+        assert dict(message["headers"])[b"content-type"].startswith(b"text/event-stream")
+        message = await asyncio.wait_for(self.outgoing.get(), 5)
+        assert message["body"].startswith(b"retry: ")
+        return self
+
+    async def next(self):
+        while True:
+            message = await asyncio.wait_for(self.outgoing.get(), 5)
+            fields = dict(
+                line.split(": ", 1) for line in message["body"].decode().splitlines() if ": " in line
+            )
+            if "event" in fields:
+                return {"id": fields["id"], "event": fields["event"], "data": json.loads(fields["data"])}
+
+    async def close(self):
+        await super().close({"type": "http.disconnect"})
+
+
+class EventSocket(Connection):
+    def __init__(self, app, user_id, last_event_id=None):
+        query = {"last_event_id": last_event_id} if last_event_id else None
+        super().__init__(app, scope_for("websocket", f"/api/events/{user_id}/ws", query=query),
+                         {"type": "websocket.connect"})
+
+    async def opened(self):
+        # Accepted, then subscribed before the socket first waits.
+        assert (await asyncio.wait_for(self.outgoing.get(), 5))["type"] == "websocket.accept"
+        return self
+
+    async def next(self):
+        message = await asyncio.wait_for(self.outgoing.get(), 5)
+        assert message["type"] == "websocket.send"
+        return json.loads(message["text"])
+
+    async def close(self):
+        await super().close({"type": "websocket.disconnect", "code": 1000})
+
+
+def run_with_client(api, test):
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await test(client)
+
+    return asyncio.run(run())
+
+
+def test_completions_are_pushed_and_replayed_after_a_reconnect(api, user_id):
+    async def test(client):
+        task_ids = [task["task_id"] for task in (await client.get(f"/api/tasks/{user_id}")).json()["tasks"]]
+        stream = await EventStream(api.app, user_id).opened()
+        for task_id in task_ids[:2]:
+            assert (await client.post(f"/api/tasks/{user_id}/complete/{task_id}")).status_code == 200
+        first, second = await stream.next(), await stream.next()
+        await stream.close()
+
+        assert [first["event"], second["event"]] == ["task_completed", "task_completed"]
+        assert [first["data"]["task_id"], second["data"]["task_id"]] == task_ids[:2]
+        assert second["data"]["today_completed"] == 2
+
+        again = await EventStream(api.app, user_id, last_event_id=first["id"]).opened()
+        assert await again.next() == second
+        await again.close()
+        assert user_id not in api.event_hub.subscribers
+
+    run_with_client(api, test)
+
+
+def test_a_resync_carries_an_id_to_resume_from(api, user_id):
+    async def test(client):
+        task_id = (await client.get(f"/api/tasks/{user_id}")).json()["tasks"][0]["task_id"]
+        stream = await EventStream(api.app, user_id, last_event_id="deadbeef-1").opened()
+        resync = await stream.next()
+        await stream.close()
+        assert resync["event"] == "resync"
+        assert resync["id"].startswith(api.event_hub.instance + "-")
+
+        assert (await client.post(f"/api/tasks/{user_id}/complete/{task_id}")).status_code == 200
+        resumed = await EventStream(api.app, user_id, last_event_id=resync["id"]).opened()
+        assert (await resumed.next())["event"] == "task_completed"
+        await resumed.close()
+
+    run_with_client(api, test)
+
+
+def test_sockets_get_the_same_events(api, user_id):
+    async def test(client):
+        task_id = (await client.get(f"/api/tasks/{user_id}")).json()["tasks"][0]["task_id"]
+        stream = await EventStream(api.app, user_id).opened()
+        socket = await EventSocket(api.app, user_id).opened()
+        assert (await client.post(f"/api/tasks/{user_id}/complete/{task_id}")).status_code == 200
+
+        assert await socket.next() == await stream.next()
+        await socket.close()
+        await stream.close()
+        assert user_id not in api.event_hub.subscribers
+
+        resync = await EventSocket(api.app, user_id, last_event_id="deadbeef-1").opened()
+        message = await resync.next()
+        await resync.close()
+        assert message["event"] == "resync" and message["id"]
+
+    run_with_client(api, test)
+
+
+def test_likes_reach_the_notes_owner(api, user_id):
+    async def test(client):
+        response = await client.post("/api/notes/daily", json={"user_id": user_id, "message": "A calm walk this morning"})
+        note_id = response.json()["note"]["note_id"]
+        socket = await EventSocket(api.app, user_id).opened()
+        assert (await client.post(f"/api/notes/{note_id}/like", params={"user_id": f"{user_id}-fan"})).status_code == 200
+
+        message = await socket.next()
+        await socket.close()
+        assert message["event"] == "note_liked"
+        assert message["data"]["note_id"] == note_id
+        assert message["data"]["likes"] == 1
+
+    run_with_client(api, test)
@@ -0,0 +1,45 @@
+import pytest
+
+from http_cache import EncodedPayload, PayloadCache, accepts_gzip, etag_matches
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("gzip", True),
+    ("deflate, gzip;q=0.5", True),
+    ("br, *", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0.000", False),
+    ("gzip;q=", False),
+    ("gzip;q=x", False),
+    ("identity", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_etag_matches_weakly():
+    payload = EncodedPayload(b"{}")
+    assert etag_matches(payload.etag, (payload.etag,))
+    assert etag_matches(f"W/{payload.etag}, \"other\"", (payload.etag,))
+    assert etag_matches("*", (payload.etag,))
+    assert not etag_matches('"other"', (payload.etag, payload.gzip_etag))
+
+
+def test_small_payloads_are_not_gzipped():
+    assert EncodedPayload(b"{}").gzipped is None
+    assert EncodedPayload(b" " * 1024).gzipped is not None
+
+
+def test_payload_cache_rebuilds_on_new_version():
+    cache = PayloadCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"count": len(builds)}
+
+    first = cache.get("resource", 1, build)
+    assert cache.get("resource", 1, build) is first
+    assert cache.get("resource", 2, build).body == b'{"count":2}'
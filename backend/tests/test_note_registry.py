@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import pytest
+
+from note_registry import SYSTEM_USER, LikeSet, NoteRegistry
+
+
+def note(note_id, user_id, category=None, is_public=True):
+    return SimpleNamespace(
+        note_id=note_id, user_id=user_id, category=category, mood=None, is_public=is_public, likes=0,
+        liked_by=LikeSet(),
+    )
+
+
+@pytest.fixture
+def registry():
+    registry = NoteRegistry()
+    registry.add_all([note(i, SYSTEM_USER, "motivation") for i in range(1, 4)])
+    return registry
+
+
+def test_ids_continue_after_loaded_notes(registry):
+    assert registry.next_id() == 4
+    registry.add(note(10, "alice"))
+    registry.reserve_ids(10)
+    assert registry.next_id() == 11
+
+
+def test_shard_ids_stay_in_their_residue_class():
+    registry = NoteRegistry(id_offset=2, id_stride=4)
+    ids = [registry.next_id() for _ in range(3)]
+    registry.reserve_ids(20)
+    ids.append(registry.next_id())
+    assert ids == [2, 6, 10, 22]
+
+
+def test_sample_never_returns_own_note(registry):
+    registry.add(note(4, "alice"))
+    registry.add(note(5, "bob"))
+    for _ in range(50):
+        assert registry.sample("alice").user_id == "bob"
+
+
+def test_sample_falls_back_to_system_notes(registry):
+    registry.add(note(4, "alice"))
+    registry.add(note(5, "alice", is_public=False))
+    assert registry.sample("alice").user_id == SYSTEM_USER
+    assert registry.sample("alice", category="motivation").user_id == SYSTEM_USER
+
+
+def test_private_and_removed_notes_leave_the_pool(registry):
+    registry.add(note(4, "bob"))
+    registry.set_visibility(registry.get(4), False)
+    assert registry.sample("alice").user_id == SYSTEM_USER
+    registry.set_visibility(registry.get(4), True)
+    assert registry.sample("alice").note_id == 4
+    registry.remove(4)
+    assert registry.sample("alice").user_id == SYSTEM_USER
+
+
+def test_sample_prefers_unseen_notes(registry):
+    for note_id in range(4, 8):
+        registry.add(note(note_id, "bob"))
+    seen = set()
+    sampled = {registry.sample("alice", seen=seen).note_id for _ in range(4)}
+    assert sampled == {4, 5, 6, 7}
+
+
+def test_page_walks_newest_first_with_a_cursor(registry):
+    for note_id in range(10, 17):
+        registry.add(note(note_id, "alice", "gratitude" if note_id % 2 else None))
+
+    page, cursor = registry.page("alice", limit=3)
+    assert [n.note_id for n in page] == [16, 15, 14] and cursor == 14
+    page, cursor = registry.page("alice", limit=3, before=cursor)
+    assert [n.note_id for n in page] == [13, 12, 11] and cursor == 11
+    page, cursor = registry.page("alice", limit=3, before=cursor)
+    assert [n.note_id for n in page] == [10] and cursor is None
+
+    page, cursor = registry.page("alice", limit=2, category="gratitude")
+    assert [n.note_id for n in page] == [15, 13] and cursor == 13
+    page, _ = registry.page("alice", limit=2, offset=1)
+    assert [n.note_id for n in page] == [15, 14]
+
+
+def test_page_cursor_survives_deleting_the_cursor_note(registry):
+    for note_id in range(10, 15):
+        registry.add(note(note_id, "alice"))
+    registry.remove(12)
+    page, _ = registry.page("alice", limit=5, before=12)
+    assert [n.note_id for n in page] == [11, 10]
+
+
+def test_likes_are_counted_once_per_user(registry):
+    registry.add(note(4, "bob"))
+    target = registry.get(4)
+    assert registry.like(target, "alice")
+    assert not registry.like(target, "alice")
+    assert registry.like(target, "carol")
+    assert target.likes == 2 and registry.likers(target) == ["alice", "carol"]
+    assert registry.has_liked(target, "alice") and not registry.has_liked(target, "dave")
+    assert registry.stats_for("bob").total_likes == 2
+    assert registry.check_stats() == {}
+
+
+def test_like_set_stays_sorted():
+    likes = LikeSet([5, 1, 3])
+    assert likes.add(2) and likes.add(9) and not likes.add(3)
+    assert list(likes) == [1, 2, 3, 5, 9] and 9 in likes and 4 not in likes
@@ -0,0 +1,90 @@
+import pytest
+
+# A day apart whatever the server's clock says.
+TIMEZONES = ("Pacific/Kiritimati", "Pacific/Pago_Pago")
+
+
+@pytest.mark.parametrize("timezone", TIMEZONES)
+def test_notes_count_on_the_users_day(client, user_id, api, timezone):
+    assert client.post(f"/api/users/{user_id}/timezone", params={"timezone": timezone}).status_code == 200
+    today = api.user_now(user_id).date()
+
+    response = client.post("/api/notes/daily", json={"user_id": user_id, "message": "A calm walk this morning"})
+    assert response.status_code == 200
+    assert response.json()["note"]["created_at"][:10] == today.isoformat()
+
+    calendar = client.get(f"/api/activity/{user_id}/calendar").json()
+    assert calendar["notes"]["days"] == [today.isoformat()]
+    assert calendar["notes"]["current_streak"] == 1
+
+    again = client.post("/api/notes/daily", json={"user_id": user_id, "message": "Another note for today"})
+    assert again.status_code == 400
+    assert again.json()["detail"]["today_note"] == "A calm walk this morning"
+
+
+def test_deleting_the_days_only_note_clears_the_day(client, user_id, api):
+    response = client.post("/api/notes/daily", json={"user_id": user_id, "message": "A calm walk this morning"})
+    note_id = response.json()["note"]["note_id"]
+    assert api.user_progress[user_id].notes_shared == 1
+
+    deleted = client.delete(f"/api/notes/{note_id}", params={"user_id": user_id})
+    assert deleted.status_code == 200
+
+    calendar = client.get(f"/api/activity/{user_id}/calendar").json()
+    assert calendar["notes"]["days"] == []
+    assert calendar["notes"]["current_streak"] == 0
+    assert client.get(f"/api/notes/stats/{user_id}").json()["streak_days"] == 0
+    assert api.user_progress[user_id].notes_shared == 0
+
+    # The day is free for a new note again.
+    again = client.post("/api/notes/daily", json={"user_id": user_id, "message": "A second try at today"})
+    assert again.status_code == 200
+    assert api.user_progress[user_id].notes_shared == 1
+
+
+def test_notes_saved_with_liked_by_are_migrated(client, user_id, api):
+    note_id = max(api.note_registry.by_id, default=0) + 1000
+    api._load_collections({"notes": {str(note_id): {
+        "note_id": note_id, "user_id": user_id, "message": "A note from before likes moved out",
+        "created_at": "2025-01-01T09:00:00", "likes": 2, "liked_by": [f"{user_id}-a", f"{user_id}-b"],
+        "is_public": True,
+    }}})
+
+    stored = api.storage.collections
+    assert sorted(key for key in stored["note_likes"] if key.startswith(f"{note_id}/")) == [
+        f"{note_id}/{user_id}-a", f"{note_id}/{user_id}-b",
+    ]
+    assert "liked_by" not in stored["notes"][str(note_id)]
+
+    assert client.post(f"/api/notes/{note_id}/like", params={"user_id": f"{user_id}-a"}).status_code == 400
+    liked = client.post(f"/api/notes/{note_id}/like", params={"user_id": f"{user_id}-c"})
+    assert liked.status_code == 200
+    assert liked.json()["likes"] == 3
+
+
+def test_likers_never_appear_in_payloads(client, user_id):
+    created = client.post("/api/notes/daily", json={"user_id": user_id, "message": "A calm walk this morning"})
+    note_id = created.json()["note"]["note_id"]
+    fan = f"{user_id}-fan"
+
+    responses = [
+        created,
+        client.post(f"/api/notes/{note_id}/like", params={"user_id": fan}),
+        client.get(f"/api/notes/user/{user_id}"),
+        client.get(f"/api/notes/stats/{user_id}"),
+        client.post(f"/api/notes/{note_id}/visibility", params={"user_id": user_id, "is_public": False}),
+        client.get("/openapi.json"),
+    ]
+    for response in responses:
+        assert response.status_code == 200, response.url
+        assert "liked_by" not in response.text, response.url
+        assert fan not in response.text, response.url
+
+    # Requests made as the fan echo their id; the notes themselves don't.
+    notes = [
+        client.get("/api/notes/random", params={"user_id": fan}).json(),
+        client.get(f"/api/dashboard/{fan}", params={"sections": "note"}).json()["note"],
+    ]
+    for note in notes:
+        assert "liked_by" not in note
+        assert fan not in str(note)
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+INTERNAL_FIELDS = {"achievements_unlocked", "achievement_dates", "timezone", "current_day"}
+
+
+def select_tasks(client, user_id, count=2, first_id=100):
+    details = [
+        {
+            "task_id": first_id + index, "title": f"Task {index}", "description": "Something small",
+            "category": "mindfulness", "difficulty": "easy", "estimated_duration": "5 minutes",
+        }
+        for index in range(count)
+    ]
+    response = client.post(f"/api/tasks/{user_id}/select", json={
+        "user_id": user_id,
+        "task_ids": [detail["task_id"] for detail in details],
+        "selected_date": date.today().isoformat(),
+        "task_details": details,
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_progress_responses_keep_internal_fields_private(client, user_id, api):
+    responses = [
+        select_tasks(client, user_id),
+        client.post(f"/api/tasks/{user_id}/refresh-day").json(),
+        client.post(f"/api/progress/{user_id}/reset").json(),
+    ]
+    for body in responses:
+        progress = body["progress"]
+        assert not INTERNAL_FIELDS & set(progress)
+        assert set(progress["achievements"]) == set(api.achievement_engine.by_id)
+
+
+def test_achievements_mapping_follows_the_bitmask(client, user_id, api):
+    client.get(f"/api/tasks/{user_id}")
+    record = api.user_progress[user_id]
+    record.achievements_unlocked = api.achievement_engine.mask_for(["streak_5"])
+    record.achievement_dates["streak_5"] = "2024-01-05T08:00:00"
+
+    achievements = select_tasks(client, user_id)["progress"]["achievements"]
+
+    assert achievements["streak_5"]["completed"]
+    assert achievements["streak_5"]["completion_date"] == "2024-01-05T08:00:00"
+    assert not achievements["streak_7"]["completed"]
+    assert achievements["streak_7"]["completion_date"] is None
+
+
+def test_progress_record_round_trips_without_defaults(api):
+    record = api.ProgressRecord(user_id="someone", current_streak=3, timezone="Europe/Paris", current_day=19000)
+    record.categories_completed["mindfulness"] = 2
+
+    data = record.to_json()
+    assert data == {
+        "user_id": "someone", "current_streak": 3, "categories_completed": {"mindfulness": 2},
+        "timezone": "Europe/Paris", "current_day": 19000,
+    }
+    restored = api.ProgressRecord.from_json(data)
+    assert restored.to_json() == data
+    assert api.ProgressRecord(user_id="other").categories_completed == {}
+
+
+def test_progress_records_own_their_dicts(api):
+    stored = {"user_id": "someone", "categories_completed": {"mindfulness": 1}, "retired_field": 1}
+    record = api.ProgressRecord.from_json(stored)
+    record.categories_completed["mindfulness"] += 1
+    record.achievement_dates["streak_5"] = "2024-01-05"
+
+    assert stored["categories_completed"] == {"mindfulness": 1}
+    assert api.ProgressRecord(user_id="other").achievement_dates == {}
+    assert api.ProgressRecord.DEFAULTS["achievement_dates"] == {}
+    with pytest.raises(TypeError):
+        api.ProgressRecord(user_id="someone", retired_field=1)
+
+
+def complete(client, user_id, task_id):
+    response = client.post(f"/api/tasks/{user_id}/complete/{task_id}")
+    assert response.status_code == 200
+    return response.json()["progress"]
+
+
+def test_second_set_on_the_same_day_keeps_the_streak(client, user_id):
+    select_tasks(client, user_id)
+    complete(client, user_id, 100)
+    assert complete(client, user_id, 101)["current_streak"] == 1
+
+    select_tasks(client, user_id, first_id=200)
+    complete(client, user_id, 200)
+    progress = complete(client, user_id, 201)
+    assert progress["all_tasks_completed_today"]
+    assert progress["current_streak"] == 1
+    assert progress["longest_streak"] == 1
+
+
+def test_undoing_and_redoing_the_last_task_keeps_the_streak(client, user_id, api):
+    select_tasks(client, user_id)
+    record = api.user_progress[user_id]
+    record.current_streak = record.longest_streak = 3
+    record.last_completion_date = (api.user_now(user_id) - timedelta(days=1)).isoformat()
+
+    complete(client, user_id, 100)
+    assert complete(client, user_id, 101)["current_streak"] == 4
+    assert complete(client, user_id, 101)["current_streak"] == 3
+    progress = complete(client, user_id, 101)
+    assert progress["current_streak"] == 4
+    assert progress["longest_streak"] == 4
+
+
+def test_undoing_a_task_from_an_earlier_day_keeps_the_streak(client, user_id, api):
+    select_tasks(client, user_id, count=1)
+    record = api.user_progress[user_id]
+    record.current_streak = record.longest_streak = 3
+    yesterday = api.user_now(user_id) - timedelta(days=1)
+    record.last_completion_date = yesterday.isoformat()
+    task = api.user_tasks[user_id].get(100)[1]
+    api.user_tasks[user_id].add(record.current_day - 1, api.TaskRecord(
+        50, task.template_id, api.TaskStatus.COMPLETED, api.timestamp_us(yesterday), api.timestamp_us(yesterday)
+    ))
+    assert complete(client, user_id, 100)["current_streak"] == 4
+
+    progress = complete(client, user_id, 50)
+    assert progress["current_streak"] == 4
+    assert progress["all_tasks_completed_today"]
+    assert api.user_tasks[user_id].get(50)[1].status == api.TaskStatus.PENDING
+
+
+def test_undoing_and_redoing_a_first_day(client, user_id):
+    select_tasks(client, user_id, count=1)
+    assert complete(client, user_id, 100)["current_streak"] == 1
+    assert complete(client, user_id, 100)["current_streak"] == 0
+    assert complete(client, user_id, 100)["current_streak"] == 1
+
+
+def test_concurrent_completions_are_all_applied(client, user_id, api):
+    select_tasks(client, user_id, count=6)
+
+    async def complete_all():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as concurrent:
+            requests = [concurrent.post(f"/api/tasks/{user_id}/complete/{100 + index}") for index in range(6)]
+            requests += [concurrent.get(f"/api/tasks/{user_id}") for _ in range(6)]
+            return await asyncio.gather(*requests)
+
+    responses = asyncio.run(complete_all())
+    assert all(response.status_code == 200 for response in responses)
+
+    progress = client.get(f"/api/progress/{user_id}").json()
+    assert progress["today"] == {"completed": 6, "total": 6, "completion_percentage": 100.0, "all_completed": True}
+    assert progress["streak"]["current"] == 1
+    assert progress["total_stats"]["total_tasks_completed"] == 6
+
+
+def test_stored_records_are_filled_on_first_read(api):
+    stored = {"user_id": "someone", "current_streak": 3, "timezone": "Asia/Tokyo", "categories_completed": {"habits": 1}}
+    record = api.ProgressRecord.from_json(stored)
+    assert record.timezone == "Asia/Tokyo"
+
+    # A field set before anything is read keeps its new value.
+    record.longest_streak = 5
+    assert record.current_streak == 3
+    assert record.longest_streak == 5
+    assert record.to_json() == {**stored, "longest_streak": 5}
+    with pytest.raises(AttributeError):
+        record.retired_field
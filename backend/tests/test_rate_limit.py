@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from rate_limit import Rate, RateLimitMiddleware, RouteLimit, TokenBuckets
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_bucket_allows_a_burst_then_waits(clock):
+    buckets = TokenBuckets(clock=clock)
+    rate = Rate(3, 1.0)
+
+    assert [buckets.take("key", rate) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("key", rate) == pytest.approx(1.0)
+
+    clock.now = 1.0
+    assert buckets.take("key", rate) == 0.0
+    assert buckets.take("key", rate) > 0
+
+
+def test_refilled_buckets_are_dropped_from_the_cold_end(clock):
+    buckets = TokenBuckets(clock=clock)
+    rate = Rate(2, 1.0)
+    buckets.take("a", rate)
+    buckets.take("b", rate)
+
+    clock.now = 1.0
+    buckets.take("c", rate)
+
+    assert list(buckets.buckets) == ["c"]
+
+
+def test_refilling_buckets_are_kept_when_full(clock):
+    buckets = TokenBuckets(max_entries=2, clock=clock)
+    rate = Rate(2, 1.0)
+    for _ in range(2):
+        buckets.take("throttled", rate)
+    buckets.take("other", rate)
+
+    # Over the cap, but forgetting "throttled" would hand it a new burst.
+    buckets.take("new", rate)
+    assert "throttled" in buckets.buckets
+    assert buckets.take("throttled", rate) > 0
+
+
+def test_full_map_drops_refilled_buckets_behind_refilling_ones(clock):
+    buckets = TokenBuckets(max_entries=3, clock=clock)
+    slow, fast = Rate(1, 0.01), Rate(1, 10.0)
+    buckets.take("slow", slow)
+    buckets.take("fast-1", fast)
+    buckets.take("fast-2", fast)
+
+    clock.now = 1.0
+    buckets.take("new", fast)
+
+    assert list(buckets.buckets) == ["slow", "new"]
+
+
+def call(middleware, path, method="POST", client=("10.0.0.1", 1234), query=b""):
+    statuses = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    middleware.app = app
+    scope = {"type": "http", "method": method, "path": path, "client": client, "headers": [], "query_string": query}
+    asyncio.run(middleware(scope, None, send))
+    return statuses[0]
+
+
+def test_user_limit_is_checked_before_the_ip_limit(clock):
+    buckets = TokenBuckets(clock=clock)
+    limits = [RouteLimit("POST", "/api/tasks/{user_id}/go", per_user=Rate(1, 0.001), per_ip=Rate(2, 0.001))]
+    middleware = RateLimitMiddleware(None, limits, buckets=buckets)
+
+    assert call(middleware, "/api/tasks/alice/go") == 200
+    # Alice is over her own limit; her retries must not drain the address.
+    for _ in range(5):
+        assert call(middleware, "/api/tasks/alice/go") == 429
+    assert call(middleware, "/api/tasks/bob/go") == 200
+    assert call(middleware, "/api/tasks/carol/go") == 429
+
+
+def test_unmatched_routes_and_query_user_ids(clock):
+    limits = [RouteLimit("GET", "/api/notes/random", per_user=Rate(1, 0.001))]
+    middleware = RateLimitMiddleware(None, limits, buckets=TokenBuckets(clock=clock))
+
+    assert call(middleware, "/api/notes/random", "GET", query=b"user_id=alice") == 200
+    assert call(middleware, "/api/notes/random", "GET", query=b"user_id=alice") == 429
+    assert call(middleware, "/api/notes/random", "GET", query=b"user_id=bob") == 200
+    assert call(middleware, "/api/notes/random", "POST", query=b"user_id=alice") == 200
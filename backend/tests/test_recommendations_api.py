@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+
+def answers(seed):
+    # Answers no other test gives, so plans cached by earlier tests don't leak in.
+    rng = random.Random(seed)
+    return [{"question_id": question_id, "rating": rng.randint(0, 10)} for question_id in range(1, 11)]
+
+
+def submit(client, user_id, responses, description="I can't sleep at night and wake up exhausted"):
+    response = client.post("/api/assessment/submit", json={
+        "user_id": user_id, "responses": responses, "timestamp": "",
+    })
+    assert response.status_code == 200
+    response = client.post(f"/api/assessment/{user_id}/struggle", json={"description": description})
+    assert response.status_code == 200
+    return response.json()["recommendations"]
+
+
+def cached(api, user_id):
+    assessment = api.user_assessments[user_id]
+    return api.recommendation_key(assessment, assessment.struggle_description) in api.recommendation_cache
+
+
+def test_users_with_the_same_answers_share_a_plan(client, user_id, api):
+    responses = answers(user_id)
+    first = submit(client, user_id, responses)
+    hits = api.recommendation_cache.hits
+
+    assert submit(client, f"{user_id}-twin", responses) == first
+    assert api.recommendation_cache.hits == hits + 1
+
+
+def test_new_answers_leave_shared_plans_cached(client, user_id, api):
+    responses = answers(user_id)
+    submit(client, user_id, responses)
+    submit(client, f"{user_id}-twin", responses)
+
+    submit(client, user_id, answers(f"{user_id}-changed"))
+    assert cached(api, user_id)
+    assert cached(api, f"{user_id}-twin")
+    assert api.recommendation_key(api.user_assessments[user_id], None) != api.recommendation_key(
+        api.user_assessments[f"{user_id}-twin"], None
+    )
+
+
+def test_reloading_the_catalog_drops_cached_plans(client, user_id, api):
+    submit(client, user_id, answers(user_id))
+    assert cached(api, user_id)
+
+    assert client.post("/api/templates/reload").status_code == 200
+    assert not cached(api, user_id)
+
+
+@pytest.mark.parametrize("path", ["/api/assessment/questions", "/api/achievements"])
+def test_unchanged_payloads_are_not_sent_again(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+    assert client.get(path, headers={"If-None-Match": '"stale"'}).status_code == 200
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import httpx
+
+import sharding
+from sharding import HashRing, PoolPublisher, ShardConfig, note_shard, split_by_shard
+
+
+def test_ring_is_stable_and_spreads_users():
+    ring = HashRing(range(3))
+    users = [f"user-{i}" for i in range(300)]
+    groups = split_by_shard(ring, users)
+
+    assert sorted(groups) == [0, 1, 2]
+    assert all(len(group) > 30 for group in groups.values())
+    assert all(HashRing(range(3)).shard_for(user) == shard for shard, group in groups.items() for user in group)
+
+
+def test_notes_belong_to_the_shard_of_their_id():
+    config = ShardConfig(index=2, count=3)
+    assert config.owns_note(2 + sharding.NOTE_ID_STRIDE)
+    assert not config.owns_note(1)
+    assert note_shard(2 + sharding.NOTE_ID_STRIDE, 3) == 2
+
+
+def test_publisher_keeps_going_after_unexpected_errors(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        if len(requests) == 1:
+            return httpx.Response(200, content=b"not json")
+        return httpx.Response(200, json={"instance": "pool-1"})
+
+    client = httpx.AsyncClient
+    monkeypatch.setattr(
+        sharding.httpx, "AsyncClient", lambda **kwargs: client(transport=httpx.MockTransport(handler), **kwargs)
+    )
+
+    async def publish():
+        publisher = PoolPublisher("http://pool", lambda: [], retry_interval=0)
+        publisher.start()
+        publisher.put({"note_id": 1})
+        for _ in range(100):
+            await asyncio.sleep(0)
+            if not publisher.pending and publisher.pool_instance:
+                break
+        await publisher.stop()
+        return publisher
+
+    publisher = asyncio.run(publish())
+
+    assert not publisher.pending
+    assert publisher.pool_instance == "pool-1"
+    assert requests[0] == requests[1] == {"ops": [{"op": "put", "note": {"note_id": 1}}]}
@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from storage import JournalBackend, MemoryBackend, SQLiteBackend, Storage
+
+
+def open_storage(kind, tmp_path, **kwargs):
+    if kind == "journal":
+        backend = JournalBackend(str(tmp_path))
+    else:
+        backend = SQLiteBackend(str(tmp_path / "mindflow.db"))
+    storage = Storage(backend, **kwargs)
+    storage.load()
+    return storage
+
+
+@pytest.mark.parametrize("kind", ["journal", "sqlite"])
+def test_round_trip(kind, tmp_path):
+    storage = open_storage(kind, tmp_path)
+    storage.put("progress", "alice", {"current_streak": 3})
+    storage.put("progress", "bob", {"current_streak": 1})
+    storage.put("tasks", "alice/20000", [[1, 1, 0, 5, None]])
+    storage.delete("progress", "bob")
+    storage.close()
+
+    reopened = open_storage(kind, tmp_path)
+    assert reopened.collections == {
+        "progress": {"alice": {"current_streak": 3}},
+        "tasks": {"alice/20000": [[1, 1, 0, 5, None]]},
+    }
+    reopened.close()
+
+
+@pytest.mark.parametrize("kind", ["journal", "sqlite"])
+def test_round_trip_without_close(kind, tmp_path):
+    # What survives a crash: everything flushed, with no final snapshot.
+    storage = open_storage(kind, tmp_path)
+    for index in range(10):
+        storage.put("notes", str(index), {"note_id": index})
+    storage.delete("notes", "3")
+    storage.flush()
+
+    reopened = open_storage(kind, tmp_path)
+    assert sorted(reopened.collections["notes"], key=int) == [str(i) for i in range(10) if i != 3]
+    assert reopened.seq == storage.seq
+
+
+def test_journal_replays_only_entries_after_the_snapshot(tmp_path):
+    storage = open_storage("journal", tmp_path, snapshot_every=3)
+    for index in range(5):
+        storage.put("progress", f"user{index}", index)
+        storage.flush()
+    storage.put("progress", "user0", "changed")
+    storage.flush()
+
+    with open(os.path.join(tmp_path, "journal.log"), encoding="utf-8") as f:
+        assert len(f.readlines()) < 6
+    reopened = open_storage("journal", tmp_path)
+    assert reopened.collections["progress"] == {"user0": "changed", "user1": 1, "user2": 2, "user3": 3, "user4": 4}
+
+
+def test_journal_ignores_a_torn_final_line(tmp_path):
+    storage = open_storage("journal", tmp_path)
+    storage.put("progress", "alice", 1)
+    storage.flush()
+    with open(os.path.join(tmp_path, "journal.log"), "a", encoding="utf-8") as f:
+        f.write(json.dumps([2, "put", "progress", "bob", 2])[:-5])
+
+    assert open_storage("journal", tmp_path).collections == {"progress": {"alice": 1}}
+
+
+def test_memory_backend_keeps_nothing():
+    storage = Storage(MemoryBackend())
+    storage.put("progress", "alice", 1)
+    storage.close()
+    assert Storage(MemoryBackend()).load() == {}
+
+
+def test_flush_hooks_run_after_every_flush(tmp_path):
+    storage = open_storage("journal", tmp_path)
+    calls = []
+    storage.flush_hooks.append(lambda: calls.append(storage.pending_count))
+    storage.put("progress", "alice", 1)
+    storage.flush()
+    storage.close()
+    assert calls == [0, 0]
+
+
+def test_pending_count_drains_on_flush(tmp_path):
+    storage = open_storage("journal", tmp_path)
+    storage.put("progress", "alice", 1)
+    storage.delete("progress", "bob")
+    assert storage.pending_count == 2
+    storage.flush()
+    assert storage.pending_count == 0
+    storage.close()
+
+
+class FailingBackend(MemoryBackend):
+    def __init__(self, failures):
+        self.failures = failures
+        self.written = []
+
+    def write(self, ops):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.written.extend(ops)
+
+
+def test_failed_writes_are_kept_and_retried(caplog):
+    backend = FailingBackend(failures=2)
+    storage = Storage(backend, flush_interval=0.01)
+    storage.put("progress", "alice", 1)
+    storage.start()
+    for _ in range(200):
+        if backend.written:
+            break
+        time.sleep(0.01)
+    storage.put("progress", "bob", 2)
+    storage.close()
+
+    assert [op[3] for op in backend.written] == ["alice", "bob"]
+    assert "Storage flush failed" in caplog.text
+
+
+class BlockingBackend(JournalBackend):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.compacting = threading.Event()
+        self.release = threading.Event()
+
+    def compact(self, seq, collections):
+        self.compacting.set()
+        self.release.wait(5)
+        super().compact(seq, collections)
+
+
+def test_writes_do_not_wait_for_a_snapshot(tmp_path):
+    backend = BlockingBackend(str(tmp_path))
+    storage = Storage(backend)
+    storage.load()
+    storage.put("progress", "alice", 1)
+    snapshot = threading.Thread(target=storage.flush, kwargs={"compact": True})
+    snapshot.start()
+    assert backend.compacting.wait(5)
+
+    storage.put("progress", "alice", 2)
+    storage.delete("progress", "bob")
+    storage.put("progress", "carol", 3)
+    backend.release.set()
+    snapshot.join()
+    assert storage.collections == {"progress": {"alice": 2, "carol": 3}}
+    storage.flush()
+
+    reopened = open_storage("journal", tmp_path)
+    assert reopened.collections == {"progress": {"alice": 2, "carol": 3}}
+
+
+def test_sqlite_replays_rows_written_after_the_snapshot(tmp_path):
+    storage = open_storage("sqlite", tmp_path)
+    storage.put("progress", "alice", 1)
+    storage.put("progress", "bob", 1)
+    storage.put("progress", "carol", 1)
+    storage.flush(compact=True)
+    storage.put("progress", "alice", 2)
+    storage.delete("progress", "bob")
+    storage.delete("progress", "carol")
+    storage.put("progress", "carol", 3)
+    storage.flush()
+
+    reopened = open_storage("sqlite", tmp_path)
+    assert reopened.collections == {"progress": {"alice": 2, "carol": 3}}
+    assert reopened.seq == storage.seq
+
+
+def test_sqlite_without_snapshot_columns_still_loads(tmp_path):
+    path = str(tmp_path / "mindflow.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE kv (collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+        "PRIMARY KEY (collection, key))"
+    )
+    conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value INTEGER)")
+    conn.execute("INSERT INTO kv VALUES ('progress', 'alice', '1')")
+    conn.execute("INSERT INTO meta VALUES ('seq', 1)")
+    conn.commit()
+    conn.close()
+
+    storage = open_storage("sqlite", tmp_path)
+    assert storage.collections == {"progress": {"alice": 1}}
+    storage.put("progress", "bob", 2)
+    storage.close()
+    assert open_storage("sqlite", tmp_path).collections == {"progress": {"alice": 1, "bob": 2}}
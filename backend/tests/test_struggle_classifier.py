@@ -0,0 +1,42 @@
+import pytest
+
+from struggle_classifier import text_key
+
+
+@pytest.mark.parametrize("text, category", [
+    ("I can't sleep at night and wake up exhausted", "physical_health"),
+    ("I feel so anxious and my heart races before meetings", "emotions"),
+    ("I keep procrastinating and can't focus on work", "discipline"),
+    ("I feel lonely and have no friends to talk to", "social_influences"),
+])
+def test_descriptions_match_their_category(api, text, category):
+    assert api.struggle_classifier.classify(text).top_categories(1) == [category]
+
+
+@pytest.mark.parametrize("text", ["", "!!! ...", "the and of", "qqq xjx"])
+def test_text_without_known_features_matches_nothing(api, text):
+    classification = api.struggle_classifier.classify(text)
+    assert classification.top_categories(3) == []
+    assert classification.template_scores == {}
+
+
+def test_focus_falls_back_to_the_weakest_categories(api):
+    lowest = [("habits", 1.0), ("mindset", 2.0), ("environment", 3.0)]
+    assert api.focus_categories(lowest, "qqq xjx") == ["habits", "mindset", "environment"]
+    assert api.focus_categories(lowest, None) == ["habits", "mindset", "environment"]
+    assert api.focus_categories(lowest, "I can't sleep at night and wake up exhausted") == [
+        "physical_health", "habits", "mindset",
+    ]
+
+
+def test_rank_templates_keeps_the_order_without_a_description(api):
+    templates = api.task_catalog.query(categories=["physical_health"])
+    assert api.struggle_classifier.rank_templates("", templates) == templates
+    ranked = api.struggle_classifier.rank_templates("I can't sleep at night", templates)
+    assert sorted(template["id"] for template in ranked) == sorted(template["id"] for template in templates)
+
+
+def test_equivalent_descriptions_share_a_cache_entry(api):
+    assert text_key("I can't  SLEEP!") == text_key("i can t sleep")
+    first = api.struggle_classifier.classify("I can't  SLEEP!")
+    assert api.struggle_classifier.classify("i can t sleep") is first
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+from task_index import (
+    TaskRecord,
+    TaskTemplates,
+    UserTaskIndex,
+    date_from_epoch_day,
+    datetime_from_us,
+    epoch_day,
+    timestamp_us,
+)
+
+
+def record(task_id, template_id=1):
+    return TaskRecord(task_id, template_id, "pending", 0)
+
+
+def test_epoch_day_round_trip():
+    assert epoch_day(date(1970, 1, 2)) == 1
+    assert date_from_epoch_day(epoch_day(date(2024, 2, 29))) == date(2024, 2, 29)
+
+
+def test_timestamp_round_trip():
+    moment = datetime(2024, 5, 17, 8, 30, 12, 123456)
+    assert datetime_from_us(timestamp_us(moment)) == moment
+
+
+def test_templates_are_interned_by_content():
+    templates = TaskTemplates()
+    fields = dict(
+        title="Walk", description="Ten minutes outside", category="movement", difficulty="easy",
+        estimated_duration=10, energy_level=2, steps=["Shoes", "Door"], ai_generated=False,
+    )
+    first, created = templates.intern(**fields)
+    again, created_again = templates.intern(**fields)
+    other, _ = templates.intern(**{**fields, "title": "Run"})
+
+    assert created and not created_again
+    assert again is first
+    assert other.id != first.id
+    assert len(templates) == 2
+
+
+def test_get_returns_newest_task_with_a_reused_id():
+    index = UserTaskIndex()
+    index.extend(10, [record(1), record(2)])
+    index.extend(11, [record(1), record(3)])
+
+    day, task = index.get(1)
+    assert day == 11
+    assert index.get(2)[0] == 10
+    assert index.get(4) is None
+    assert len(index) == 4
+
+
+def test_clear_day_restores_ids_to_earlier_days():
+    index = UserTaskIndex()
+    index.extend(10, [record(1), record(2)])
+    index.extend(11, [record(1)])
+    index.extend(12, [record(1), record(3)])
+
+    removed = index.clear_day(12)
+
+    assert [task.task_id for task in removed] == [1, 3]
+    assert index.get(1)[0] == 11
+    assert index.get(3) is None
+    assert len(index) == 3
+
+    index.clear_day(10)
+    assert index.get(1)[0] == 11
+    assert index.get(2) is None
+    assert index.for_day(10) == []
+
+
+def test_clearing_an_older_day_keeps_the_newest():
+    index = UserTaskIndex()
+    index.extend(10, [record(1)])
+    index.extend(11, [record(1)])
+    index.extend(12, [record(1)])
+
+    index.clear_day(11)
+    assert index.get(1)[0] == 12
+    index.clear_day(12)
+    assert index.get(1)[0] == 10
+    index.clear_day(10)
+    assert index.get(1) is None
+    assert len(index) == 0
+
+
+def test_readding_a_day_makes_it_the_newest():
+    index = UserTaskIndex()
+    index.extend(10, [record(1)])
+    index.extend(11, [record(1)])
+    index.add(10, record(1, template_id=2))
+
+    day, task = index.get(1)
+    assert day == 10 and task.template_id == 2
+    index.clear_day(10)
+    assert index.get(1)[0] == 11
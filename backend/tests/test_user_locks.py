@@ -0,0 +1,26 @@
+import asyncio
+
+from user_locks import UserLocks, serialized
+
+
+def test_a_users_mutations_do_not_interleave_across_awaits():
+    locks = UserLocks()
+    log = []
+
+    @serialized(locks)
+    async def mutate(user_id: str, step: int):
+        log.append((user_id, step, "start"))
+        await asyncio.sleep(0)
+        log.append((user_id, step, "end"))
+
+    async def run():
+        await asyncio.gather(*[mutate(user_id=user_id, step=step) for step in range(3) for user_id in ("a", "b")])
+
+    asyncio.run(run())
+    for user_id in ("a", "b"):
+        assert [entry[1:] for entry in log if entry[0] == user_id] == [
+            (step, phase) for step in range(3) for phase in ("start", "end")
+        ]
+    # Different users are not held back by each other.
+    assert log[:2] == [("a", 0, "start"), ("b", 0, "start")]
+    assert len(locks) == 0
@@ -0,0 +1,48 @@
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+
+class UserLocks:
+    # One asyncio.Lock per user, created on first use and dropped as soon as
+    # nobody holds or waits for it, so idle users cost nothing. Mutations for
+    # the same user queue up; different users never wait on each other.
+
+    def __init__(self):
+        self.locks: Dict[str, List] = {}
+
+    def __len__(self) -> int:
+        return len(self.locks)
+
+    def busy(self, user_id: str) -> bool:
+        return user_id in self.locks
+
+    @asynccontextmanager
+    async def hold(self, user_id: str):
+        entry = self.locks.get(user_id)
+        if entry is None:
+            entry = self.locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[user_id]
+
+
+def serialized(locks: UserLocks, key: Callable[[Dict], Optional[str]] = lambda kwargs: kwargs["user_id"]):
+    # Runs an endpoint while holding the lock of the user that key() picks
+    # out of its arguments. functools.wraps keeps the signature FastAPI reads.
+    def decorate(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            user_id = key(kwargs)
+            if user_id is None:
+                return await endpoint(*args, **kwargs)
+            async with locks.hold(user_id):
+                return await endpoint(*args, **kwargs)
+        return wrapper
+    return decorate